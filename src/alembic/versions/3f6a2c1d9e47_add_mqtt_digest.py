@@ -0,0 +1,30 @@
+"""add mqtt_digest
+
+Revision ID: 3f6a2c1d9e47
+Revises: 7b9b4ed0b11c
+Create Date: 2026-10-18 14:02:47.518302
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3f6a2c1d9e47"
+down_revision = "7b9b4ed0b11c"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "mqtt_digest",
+        sa.Column("topic", sa.Text(), nullable=False),
+        sa.Column("digest", sa.Text(), nullable=False),
+        sa.Column("date", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("topic"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("mqtt_digest")
@@ -0,0 +1,39 @@
+"""add usage_point_id/date index
+
+Revision ID: 7b9b4ed0b11c
+Revises: e990284249e4
+Create Date: 2026-10-18 10:12:31.418215
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "7b9b4ed0b11c"
+down_revision = "e990284249e4"
+branch_labels = None
+depends_on = None
+
+# Columns stored in the PostgreSQL indexes (INCLUDE), so that the aggregates read only the index.
+TABLES = {
+    "consumption_detail": ["value", "interval"],
+    "production_detail": ["value", "interval"],
+    "consumption_daily": ["value"],
+    "production_daily": ["value"],
+    "consumption_daily_max_power": ["value"],
+}
+
+
+def upgrade() -> None:
+    for table, include in TABLES.items():
+        op.create_index(
+            op.f(f"ix_{table}_usage_point_id_date"),
+            table,
+            ["usage_point_id", "date"],
+            unique=False,
+            postgresql_include=include,
+        )
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        op.drop_index(op.f(f"ix_{table}_usage_point_id_date"), table_name=table)
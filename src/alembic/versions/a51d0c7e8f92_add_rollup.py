@@ -0,0 +1,37 @@
+"""add rollup
+
+Revision ID: a51d0c7e8f92
+Revises: 3f6a2c1d9e47
+Create Date: 2026-10-18 15:21:09.730514
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a51d0c7e8f92"
+down_revision = "3f6a2c1d9e47"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "rollup",
+        sa.Column("usage_point_id", sa.Text(), nullable=False),
+        sa.Column("measurement_direction", sa.Text(), nullable=False),
+        sa.Column("period", sa.Text(), nullable=False),
+        sa.Column("date", sa.DateTime(), nullable=False),
+        sa.Column("measure_type", sa.Text(), nullable=False),
+        sa.Column("value", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["usage_point_id"],
+            ["usage_points.usage_point_id"],
+        ),
+        sa.PrimaryKeyConstraint("usage_point_id", "measurement_direction", "period", "date", "measure_type"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("rollup")
@@ -1,7 +1,7 @@
 """Backend configuration."""
 import inspect
 
-from utils import edit_config
+from utils import edit_config, str2bool
 
 
 class Backend:
@@ -12,6 +12,9 @@ class Backend:
         self.write = write
         # LOCAL PROPERTIES
         self._uri: str = None
+        self._pool: bool = None
+        self._pool_size: int = None
+        self._max_overflow: int = None
         # PROPERTIES
         self.key = "backend"
         self.json: dict = {}
@@ -23,7 +26,7 @@ class Backend:
 
     def default(self) -> dict:
         """Return default configuration as dictionary."""
-        return {"uri": "sqlite:////data/myelectricaldata.db"}
+        return {"uri": "sqlite:////data/myelectricaldata.db", "pool": True, "pool_size": 5, "max_overflow": 10}
 
     def load(self):
         """Load configuration from file."""
@@ -32,6 +35,21 @@ class Backend:
             self.change(sub_key, self.config[self.key][sub_key], False)
         except Exception:
             self.change(sub_key, self.default()[sub_key], False)
+        try:
+            sub_key = "pool"
+            self.change(sub_key, str2bool(self.config[self.key][sub_key]), False)
+        except Exception:
+            self.change(sub_key, self.default()[sub_key], False)
+        try:
+            sub_key = "pool_size"
+            self.change(sub_key, max(int(self.config[self.key][sub_key]), 1), False)
+        except Exception:
+            self.change(sub_key, self.default()[sub_key], False)
+        try:
+            sub_key = "max_overflow"
+            self.change(sub_key, max(int(self.config[self.key][sub_key]), 0), False)
+        except Exception:
+            self.change(sub_key, self.default()[sub_key], False)
 
         # Save configuration
         if self.write:
@@ -52,3 +70,30 @@ class Backend:
     @uri.setter
     def uri(self, value):
         self.change(inspect.currentframe().f_code.co_name, value)
+
+    @property
+    def pool(self) -> bool:
+        """Keep the database connections open in a pool (a new connection per session otherwise)."""
+        return self._pool
+
+    @pool.setter
+    def pool(self, value):
+        self.change(inspect.currentframe().f_code.co_name, value)
+
+    @property
+    def pool_size(self) -> int:
+        """Number of connections kept open in the pool."""
+        return self._pool_size
+
+    @pool_size.setter
+    def pool_size(self, value):
+        self.change(inspect.currentframe().f_code.co_name, value)
+
+    @property
+    def max_overflow(self) -> int:
+        """Number of connections opened beyond pool_size when the pool is exhausted."""
+        return self._max_overflow
+
+    @max_overflow.setter
+    def max_overflow(self, value):
+        self.change(inspect.currentframe().f_code.co_name, value)
@@ -13,6 +13,8 @@ class Gateway:
         # LOCAL PROPERTIES
         self._url: str = None
         self._ssl: bool = None
+        self._workers: int = None
+        self._rate_limit: float = None
         # PROPERTIES
         self.key: str = "gateway"
         self.json: dict = {}
@@ -22,7 +24,7 @@ class Gateway:
 
     def default(self) -> dict:
         """Return default configuration as dictionary."""
-        return {"url": "myelectricaldata.fr", "ssl": True}
+        return {"url": "myelectricaldata.fr", "ssl": True, "workers": 4, "rate_limit": 5}
 
     def load(self):
         """Load configuration from file."""
@@ -36,6 +38,16 @@ class Gateway:
             self.change(sub_key, str2bool(self.config[self.key][sub_key]), False)
         except Exception:
             self.change(sub_key, self.default()[sub_key], False)
+        try:
+            sub_key = "workers"
+            self.change(sub_key, max(int(self.config[self.key][sub_key]), 1), False)
+        except Exception:
+            self.change(sub_key, self.default()[sub_key], False)
+        try:
+            sub_key = "rate_limit"
+            self.change(sub_key, float(self.config[self.key][sub_key]), False)
+        except Exception:
+            self.change(sub_key, self.default()[sub_key], False)
 
         # Save configuration
         if self.write:
@@ -65,3 +77,21 @@ class Gateway:
     @ssl.setter
     def ssl(self, value):
         self.change(inspect.currentframe().f_code.co_name, value)
+
+    @property
+    def workers(self) -> int:
+        """Number of usage points imported at the same time (1 imports them one after another)."""
+        return self._workers
+
+    @workers.setter
+    def workers(self, value):
+        self.change(inspect.currentframe().f_code.co_name, value)
+
+    @property
+    def rate_limit(self) -> float:
+        """Maximum number of gateway calls per second, shared by all the imports (0 disables the limit)."""
+        return self._rate_limit
+
+    @rate_limit.setter
+    def rate_limit(self, value):
+        self.change(inspect.currentframe().f_code.co_name, value)
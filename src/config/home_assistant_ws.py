@@ -20,6 +20,8 @@ class HomeAssistantWs:
         self._purge: bool = None
         self._batch_size: int = None
         self._max_date: str = None
+        self._incremental: bool = None
+        self._max_in_flight: int = None
         # PROPERTIES
         self.key: str = "home_assistant_ws"
         self.json: dict = {}
@@ -40,9 +42,11 @@ class HomeAssistantWs:
             "purge": False,
             "batch_size": 1000,
             "max_date": None,
+            "incremental": True,
+            "max_in_flight": 8,
         }
 
-    def load(self):  # noqa: PLR0912
+    def load(self):  # noqa: C901, PLR0912
         """Load configuration from file."""
         try:
             sub_key = "enable"
@@ -71,7 +75,7 @@ class HomeAssistantWs:
             self.change(sub_key, self.default()[sub_key], False)
         try:
             sub_key = "batch_size"
-            self.change(sub_key, int(self.config[self.key][sub_key], False))
+            self.change(sub_key, int(self.config[self.key][sub_key]), False)
         except Exception:
             self.change(sub_key, self.default()[sub_key], False)
         try:
@@ -79,6 +83,16 @@ class HomeAssistantWs:
             self.change(sub_key, self.config[self.key][sub_key], False)
         except Exception:
             self.change(sub_key, self.default()[sub_key], False)
+        try:
+            sub_key = "incremental"
+            self.change(sub_key, str2bool(self.config[self.key][sub_key]), False)
+        except Exception:
+            self.change(sub_key, self.default()[sub_key], False)
+        try:
+            sub_key = "max_in_flight"
+            self.change(sub_key, max(int(self.config[self.key][sub_key]), 1), False)
+        except Exception:
+            self.change(sub_key, self.default()[sub_key], False)
 
         # Save configuration
         if self.write:
@@ -157,3 +171,21 @@ class HomeAssistantWs:
     @max_date.setter
     def max_date(self, value):
         self.change(inspect.currentframe().f_code.co_name, value)
+
+    @property
+    def incremental(self) -> bool:
+        """Home assistant WS import only the hours after the last imported one."""
+        return self._incremental
+
+    @incremental.setter
+    def incremental(self, value):
+        self.change(inspect.currentframe().f_code.co_name, value)
+
+    @property
+    def max_in_flight(self) -> int:
+        """Home assistant WS number of messages sent before waiting for their answer."""
+        return self._max_in_flight
+
+    @max_in_flight.setter
+    def max_in_flight(self, value):
+        self.change(inspect.currentframe().f_code.co_name, value)
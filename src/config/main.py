@@ -28,7 +28,7 @@ from config.optel import OpTel
 from config.server import Server
 from const import URL_CONFIG_FILE
 from database.usage_points import DatabaseUsagePoints
-from utils import barcode_message, edit_config, load_config, logo, str2bool, title
+from utils import UsagePointFilter, barcode_message, edit_config, load_config, logo, str2bool, title
 
 try:
     locale.setlocale(locale.LC_ALL, "fr_FR.UTF-8")
@@ -205,6 +205,9 @@ class Config:
             lg.handlers[0].setFormatter(formatter)
             lg.setLevel(self.config.logging.log_level)
 
+        for handler in logging.getLogger().handlers:
+            handler.addFilter(UsagePointFilter())
+
         if self.config.logging.debug:
             logging.debug("   => Starting in Debug mode : %s", self.config.logging.debug)
 
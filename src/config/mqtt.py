@@ -23,6 +23,7 @@ class MQTT:
         self._retain: bool = None
         self._qos: int = None
         self._cert: str = None
+        self._full_refresh: int = None
         # PROPERTIES
         self.key = "mqtt"
         self.json: dict = {}
@@ -43,6 +44,7 @@ class MQTT:
             "retain": True,
             "qos": 0,
             "cert": False,
+            "full_refresh": 24,
         }
 
     def load(self):  # noqa: C901, PLR0912, PLR0915
@@ -97,6 +99,11 @@ class MQTT:
             self.change(sub_key, str2bool(self.config[self.key][sub_key]), False)
         except Exception:
             self.change(sub_key, self.default()[sub_key], False)
+        try:
+            sub_key = "full_refresh"
+            self.change(sub_key, int(self.config[self.key][sub_key]), False)
+        except Exception:
+            self.change(sub_key, self.default()[sub_key], False)
 
         # Save configuration
         if self.write:
@@ -202,3 +209,12 @@ class MQTT:
     @cert.setter
     def cert(self, value):
         self.change(inspect.currentframe().f_code.co_name, value)
+
+    @property
+    def full_refresh(self) -> int:
+        """Hours after which unchanged topics are published again (0 publishes every topic on each export)."""
+        return self._full_refresh
+
+    @full_refresh.setter
+    def full_refresh(self, value):
+        self.change(inspect.currentframe().f_code.co_name, value)
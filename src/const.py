@@ -17,6 +17,46 @@ CYCLE_MINIMUN = 3600
 DAILY_MAX_DAYS = 1094
 DETAIL_MAX_DAYS = 728
 
+# Rows per INSERT statement (SQLite < 3.32 limits a statement to 999 variables)
+BULK_INSERT_CHUNK_SIZE = 100
+
+# PRAGMA applied to each new SQLite connection: WAL journal (the readers don't wait for the writer), fsync at the
+# checkpoints only, 256 MiB memory map and 64 MiB page cache (negative size in KiB), temporary tables in memory, and
+# milliseconds to wait for a lock
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 268435456,
+    "cache_size": -65536,
+    "temp_store": "MEMORY",
+    "busy_timeout": 30000,
+}
+
+# MQTT messages awaiting their acknowledgement, and seconds to wait for an acknowledgement
+MQTT_MAX_INFLIGHT = 100
+MQTT_PUBLISH_TIMEOUT = 10
+
+# Gateway connections kept alive, timeouts in seconds (read timeouts by endpoint path) and retries of the temporary
+# errors, spaced by an exponential backoff of GATEWAY_RETRY_BACKOFF seconds with jitter
+GATEWAY_POOL_SIZE = 20
+GATEWAY_CONNECT_TIMEOUT = 10
+GATEWAY_READ_TIMEOUT = 60
+GATEWAY_READ_TIMEOUTS = {
+    "/ping": 10,
+    "/valid_access/": 30,
+    "/contracts/": 30,
+    "/addresses/": 30,
+    "_load_curve/": 120,
+}
+GATEWAY_MAX_RETRY = 3
+GATEWAY_RETRY_BACKOFF = 2
+GATEWAY_RETRY_STATUS = (502, 503, 504)
+
+# Gateway calls kept for the latest data (the ranges ending less than QUOTA_FRESH_DAYS days ago) when the quota of a
+# usage point runs low
+QUOTA_FRESH_RESERVE = 10
+QUOTA_FRESH_DAYS = 2
+
 TEMPO_BEGIN = 600
 TEMPO_END = 2200
 
@@ -4,12 +4,14 @@ import hashlib
 import logging
 from datetime import datetime, timedelta
 
-from sqlalchemy import asc, delete, desc, func, select, update
+from sqlalchemy import asc, case, delete, desc, extract, func, select, update
 
 from const import MAX_IMPORT_TRY, TIMEZONE
 from db_schema import ConsumptionDaily, ProductionDaily, UsagePoints
+from utils import day_ranges, search_filter, to_date
 
 from . import DB
+from .metadata import METADATA_CACHE
 
 
 class DatabaseDaily:
@@ -38,57 +40,81 @@ class DatabaseDaily:
         self.session.close()
         return data
 
-    def get_datatable(
+    def get_datatable(  # noqa: PLR0913
         self,
         order_column="date",
         order_dir="asc",
         search=None,
+        start=0,
+        length=None,
     ):
-        """Retrieve datatable for a given usage point, search term, and measurement direction.
+        """Retrieve a page of the datatable.
+
+        Only the rows of the page are read, with LIMIT/OFFSET.
 
         Args:
             order_column (str, optional): The column to order the datatable by. Defaults to "date".
             order_dir (str, optional): The direction to order the datatable. Defaults to "asc".
             search (str, optional): The search term. Defaults to None.
+            start (int, optional): The index of the first row. Defaults to 0.
+            length (int, optional): The number of rows, None or negative for all of them. Defaults to None.
 
         Returns:
-            list: The datatable.
+            list: The rows of the page.
         """
-        yesterday = datetime.combine(datetime.now(tz=TIMEZONE) - timedelta(days=1), datetime.max.time())
         sort = asc(order_column) if order_dir == "desc" else desc(order_column)
-        if search is not None and search != "":
-            result = self.session.scalars(
-                select(self.table)
-                .join(self.relation)
-                .where(UsagePoints.usage_point_id == self.usage_point_id)
-                .where((self.table.date.like(f"%{search}%")) | (self.table.value.like(f"%{search}%")))
-                .where(self.table.date <= yesterday)
-                .order_by(sort)
-            )
-        else:
-            result = self.session.scalars(
-                select(self.table)
-                .join(self.relation)
-                .where(UsagePoints.usage_point_id == self.usage_point_id)
-                .where(self.table.date <= yesterday)
-                .order_by(sort)
-            )
-        return result.all()
+        query = self.datatable_filter(select(self.table), search).order_by(sort, desc(self.table.date)).offset(start)
+        if length is not None and length >= 0:
+            query = query.limit(length)
+        return self.session.scalars(query).all()
+
+    def get_datatable_count(self, search=None):
+        """Count the rows of the datatable matching a search.
+
+        Args:
+            search (str, optional): The search term. Defaults to None.
+
+        Returns:
+            int: The number of rows.
+        """
+        query = self.datatable_filter(select(func.count()).select_from(self.table), search)
+        if search:
+            return self.session.scalar(query)
+        return self.get_metadata(
+            (
+                "datatable_count",
+                datetime.combine(datetime.now(tz=TIMEZONE) - timedelta(days=1), datetime.max.time()).date(),
+            ),
+            query,
+        )
+
+    def datatable_filter(self, query, search=None):
+        """Restrict a datatable query to the records of the usage point up to yesterday matching a search.
+
+        A search on a date prefix ("2024", "2024-03" or "2024-03-15") is a range on the indexed date column (a bare
+        year also matches the values), any other search matches the date and the value with LIKE.
+
+        Args:
+            query (Select): The query.
+            search (str, optional): The search term. Defaults to None.
+
+        Returns:
+            Select: The filtered query.
+        """
+        yesterday = datetime.combine(datetime.now(tz=TIMEZONE) - timedelta(days=1), datetime.max.time())
+        query = query.where(self.table.usage_point_id == self.usage_point_id).where(self.table.date <= yesterday)
+        if search:
+            query = query.where(search_filter(search, self.table.date, self.table.value))
+        return query
 
     def get_count(self):
-        """Retrieve the count of daily data for a given usage point and measurement direction.
+        """Retrieve the count of daily records for the usage point.
 
         Returns:
-            int: The count of daily data.
+            int: The count of records.
         """
-        data = self.session.scalars(
-            select([func.count()])
-            .select_from(self.table)
-            .join(self.relation)
-            .where(UsagePoints.usage_point_id == self.usage_point_id)
-        ).one_or_none()
-        self.session.close()
-        return data
+        query = select(func.count()).select_from(self.table).where(self.table.usage_point_id == self.usage_point_id)
+        return self.get_metadata("count", query)
 
     def get_date(self, date: datetime):
         """Retrieve the data for a given usage point, date, and measurement direction.
@@ -121,22 +147,16 @@ class DatabaseDaily:
         return False
 
     def get_last_date(self):
-        """Retrieve the last date for a given usage point and measurement direction.
+        """Get the oldest date of the daily records for the usage point (MIN aggregate).
 
         Returns:
-            str: The last date.
+            datetime: The oldest date, False if there is no record.
         """
-        current_data = self.session.scalars(
-            select(self.table)
-            .join(self.relation)
-            .where(self.table.usage_point_id == self.usage_point_id)
-            .order_by(self.table.date)
-        ).first()
-        self.session.flush()
-        self.session.close()
-        if current_data is None:
+        query = select(func.min(self.table.date)).where(self.table.usage_point_id == self.usage_point_id)
+        date = self.get_metadata("min_date", query)
+        if date is None:
             return False
-        return current_data.date
+        return date
 
     def get_last(self):
         """Retrieve the last data point for a given usage point and measurement direction.
@@ -158,22 +178,101 @@ class DatabaseDaily:
         return current_data
 
     def get_first_date(self):
-        """Retrieve the first date for a given usage point and measurement direction.
+        """Get the most recent date of the daily records for the usage point (MAX aggregate).
 
         Returns:
-            str: The first date.
+            datetime: The most recent date, False if there is no record.
+        """
+        query = select(func.max(self.table.date)).where(self.table.usage_point_id == self.usage_point_id)
+        date = self.get_metadata("max_date", query)
+        if date is None:
+            return False
+        return date
+
+    def get_month_count(self):
+        """Count the daily records of the usage point per month.
+
+        Returns:
+            dict: The counts indexed by (year, month). The dictionary is shared by the cache, don't modify it.
         """
         query = (
-            select(self.table)
-            .join(self.relation)
+            select(
+                extract("year", self.table.date).label("year"),
+                extract("month", self.table.date).label("month"),
+                func.count(),
+            )
             .where(self.table.usage_point_id == self.usage_point_id)
-            .order_by(self.table.date.desc())
+            .group_by("year", "month")
         )
+        return METADATA_CACHE.get(
+            self.table.__tablename__,
+            self.usage_point_id,
+            "month_count",
+            lambda: {(int(year), int(month)): count for year, month, count in self.session.execute(query)},
+        )
+
+    def get_month_signature(self, begin=None, end=None):
+        """Retrieve the number of records, the sum of the values and the last date of each month, in a single query.
+
+        Args:
+            begin (datetime, optional): The begin date. Defaults to None.
+            end (datetime, optional): The end date. Defaults to None.
+
+        Returns:
+            dict: The (count, sum, last date) indexed by (year, month).
+        """
+        year = extract("year", self.table.date).label("year")
+        month = extract("month", self.table.date).label("month")
+        query = select(
+            year, month, func.count(self.table.id), func.sum(self.table.value), func.max(self.table.date)
+        ).where(self.table.usage_point_id == self.usage_point_id)
+        if begin is not None:
+            query = query.where(self.table.date >= begin.astimezone(TIMEZONE))
+        if end is not None:
+            query = query.where(self.table.date <= end.astimezone(TIMEZONE))
+        query = query.group_by("year", "month")
         logging.debug(query.compile(compile_kwargs={"literal_binds": True}))
-        current_data = self.session.scalars(query).first()
-        if current_data is None:
-            return False
-        return current_data.date
+        return {
+            (int(row_year), int(row_month)): (row_count, row_sum or 0, row_last_date)
+            for row_year, row_month, row_count, row_sum, row_last_date in self.session.execute(query)
+        }
+
+    def get_batches(self, batch_size, begin=None, end=None):
+        """Stream the records of the usage point in batches, without loading the whole history.
+
+        Args:
+            batch_size (int): The number of records per batch.
+            begin (datetime, optional): The begin date. Defaults to None.
+            end (datetime, optional): The end date. Defaults to None.
+
+        Yields:
+            list: The records (date, value), in chronological order.
+        """
+        query = select(self.table.date, self.table.value).where(self.table.usage_point_id == self.usage_point_id)
+        if begin is not None:
+            query = query.where(self.table.date >= begin.astimezone(TIMEZONE))
+        if end is not None:
+            query = query.where(self.table.date <= end.astimezone(TIMEZONE))
+        query = query.order_by(self.table.date).execution_options(stream_results=True, yield_per=batch_size)
+        result = self.session.execute(query)
+        try:
+            yield from result.partitions(batch_size)
+        finally:
+            result.close()
+
+    def get_metadata(self, key, query):
+        """Run a scalar aggregate query, cached until the next write on the usage point records.
+
+        Args:
+            key (str): The cache key.
+            query (Select): The aggregate query.
+
+        Returns:
+            The query result.
+        """
+        return METADATA_CACHE.get(
+            self.table.__tablename__, self.usage_point_id, key, lambda: self.session.scalar(query)
+        )
 
     def get_fail_count(self, date: datetime):
         """Retrieve the fail count for a given usage point, date, and measurement direction.
@@ -230,8 +329,41 @@ class DatabaseDaily:
                 )
             )
         self.session.flush()
+        METADATA_CACHE.invalidate(self.table.__tablename__, self.usage_point_id)
         return fail_count
 
+    def fail_increment_bulk(self, dates):
+        """Increment the fail count of many daily records, blacklisting them after MAX_IMPORT_TRY failures.
+
+        Args:
+            dates (list): The dates of the records.
+        """
+        values = []
+        for date in dates:
+            date_tz = date.astimezone(TIMEZONE)
+            values.append(
+                {
+                    "id": hashlib.md5(f"{self.usage_point_id}/{date_tz}".encode("utf-8")).hexdigest(),  # noqa: S324
+                    "usage_point_id": self.usage_point_id,
+                    "date": date_tz,
+                    "value": 0,
+                    "blacklist": 0,
+                    "fail_count": 0,
+                }
+            )
+        fail_count = self.table.fail_count + 1
+        DB.upsert(
+            self.session,
+            self.table,
+            values,
+            {
+                "value": 0,
+                "blacklist": case((fail_count >= MAX_IMPORT_TRY, 1), else_=0),
+                "fail_count": case((fail_count >= MAX_IMPORT_TRY, 0), else_=fail_count),
+            },
+        )
+        METADATA_CACHE.invalidate(self.table.__tablename__, self.usage_point_id)
+
     def get_range(self, begin: datetime, end: datetime):
         """Retrieve the range of data for a given usage point, begin date, end date, and measurement direction.
 
@@ -259,36 +391,66 @@ class DatabaseDaily:
         else:
             return current_data
 
+    def get_sum_by_day(self, begin=None, end=None):
+        """Retrieve the sum of the values grouped by day, in a single query.
+
+        Args:
+            begin (datetime, optional): The begin date. Defaults to None.
+            end (datetime, optional): The end date. Defaults to None.
+
+        Returns:
+            dict: The sum of the values indexed by day (date).
+        """
+        day = func.date(self.table.date).label("day")
+        query = select(day, func.sum(self.table.value)).where(self.table.usage_point_id == self.usage_point_id)
+        if begin is not None:
+            query = query.where(self.table.date >= begin.astimezone(TIMEZONE))
+        if end is not None:
+            query = query.where(self.table.date <= end.astimezone(TIMEZONE))
+        query = query.group_by("day")
+        logging.debug(query.compile(compile_kwargs={"literal_binds": True}))
+        return {to_date(row_day): row_value or 0 for row_day, row_value in self.session.execute(query)}
+
     def get(self, begin: datetime, end: datetime):
         """Retrieve the data for a given usage point, begin date, end date, and measurement direction.
 
+        A day is missing when it has no record, or a zero value which isn't blacklisted yet.
+
         Args:
             begin (str): The begin date.
             end (str): The end date.
 
         Returns:
-            dict: A dictionary containing the retrieved data.
+            dict: A dictionary containing the retrieved data and the missing days, grouped in (begin, end) ranges of
+                consecutive days ("missing", end excluded).
         """
         begin = begin.astimezone(TIMEZONE)
         end = end.astimezone(TIMEZONE)
-        delta = end - begin
-        result = {"missing_data": False, "date": {}, "count": 0}
-        for i in range(delta.days + 1):
-            check_date = begin + timedelta(days=i)
-            check_date = datetime.combine(check_date, datetime.min.time())
-            query_result = self.get_date(check_date)
-            check_date = check_date.strftime("%Y-%m-%d")
-            if query_result is None:
+        result = {"missing_data": False, "date": {}, "count": 0, "missing": []}
+        days = [begin.date() + timedelta(days=i) for i in range((end - begin).days + 1)]
+        if not days:
+            return result
+        query = (
+            select(self.table.date, self.table.value, self.table.blacklist)
+            .where(self.table.usage_point_id == self.usage_point_id)
+            .where(self.table.date >= TIMEZONE.localize(datetime.combine(days[0], datetime.min.time())))
+            .where(self.table.date <= TIMEZONE.localize(datetime.combine(days[-1], datetime.max.time())))
+        )
+        logging.debug(query.compile(compile_kwargs={"literal_binds": True}))
+        records = {date.date(): (value, blacklist) for date, value, blacklist in self.session.execute(query)}
+        missing_days = []
+        for day in days:
+            check_date = day.strftime("%Y-%m-%d")
+            if day not in records:
                 # NEVER QUERY
                 result["date"][check_date] = {
                     "status": False,
                     "blacklist": 0,
                     "value": 0,
                 }
-                result["missing_data"] = True
+                missing_days.append(day)
             else:
-                consumption = query_result.value
-                blacklist = query_result.blacklist
+                consumption, blacklist = records[day]
                 if consumption == 0:
                     # ENEDIS RETURN NO DATA
                     result["date"][check_date] = {
@@ -296,7 +458,8 @@ class DatabaseDaily:
                         "blacklist": blacklist,
                         "value": consumption,
                     }
-                    result["missing_data"] = True
+                    if not blacklist:
+                        missing_days.append(day)
                 else:
                     # SUCCESS or BLACKLIST
                     result["date"][check_date] = {
@@ -304,6 +467,14 @@ class DatabaseDaily:
                         "blacklist": blacklist,
                         "value": consumption,
                     }
+        for first, last in day_ranges(missing_days):
+            result["missing"].append(
+                (
+                    TIMEZONE.localize(datetime.combine(first, datetime.min.time())),
+                    TIMEZONE.localize(datetime.combine(last + timedelta(days=1), datetime.min.time())),
+                )
+            )
+        result["missing_data"] = bool(result["missing"])
         return result
 
     def insert(
@@ -345,6 +516,42 @@ class DatabaseDaily:
                 )
             )
         self.session.flush()
+        METADATA_CACHE.invalidate(self.table.__tablename__, self.usage_point_id)
+
+    def insert_bulk(self, rows):
+        """Insert or update many daily records.
+
+        Args:
+            rows (list): The records, as dictionaries with the date and value keys and optionally the blacklist and
+                fail_count keys.
+        """
+        values = []
+        for row in rows:
+            date = row["date"].astimezone(TIMEZONE)
+            values.append(
+                {
+                    "id": hashlib.md5(f"{self.usage_point_id}/{date}".encode("utf-8")).hexdigest(),  # noqa: S324
+                    "usage_point_id": self.usage_point_id,
+                    "date": date,
+                    "value": row["value"],
+                    "blacklist": row.get("blacklist", 0),
+                    "fail_count": row.get("fail_count", 0),
+                }
+            )
+        DB.upsert(self.session, self.table, values)
+        METADATA_CACHE.invalidate(self.table.__tablename__, self.usage_point_id)
+
+    def insert_window(self, rows, fail_dates):
+        """Write the records and the failed dates of a gateway response in a single transaction.
+
+        Args:
+            rows (list): The records, as for insert_bulk.
+            fail_dates (list): The dates returned without value, as for fail_increment_bulk.
+        """
+        with self.session.begin():
+            self.insert_bulk(rows)
+            self.fail_increment_bulk(fail_dates)
+        METADATA_CACHE.invalidate(self.table.__tablename__, self.usage_point_id)
 
     def reset(
         self,
@@ -370,6 +577,7 @@ class DatabaseDaily:
             unique_id = hashlib.md5(f"{self.usage_point_id}/{date}".encode("utf-8")).hexdigest()  # noqa: S324
             self.session.execute(update(self.table, values=values).where(self.table.id == unique_id))
             self.session.flush()
+            METADATA_CACHE.invalidate(self.table.__tablename__, self.usage_point_id)
             return True
         return False
 
@@ -389,6 +597,7 @@ class DatabaseDaily:
         else:
             self.session.execute(delete(self.table).where(self.table.usage_point_id == self.usage_point_id))
         self.session.flush()
+        METADATA_CACHE.invalidate(self.table.__tablename__, self.usage_point_id)
         return True
 
     def blacklist(self, date, action=True):
@@ -419,6 +628,7 @@ class DatabaseDaily:
                 )
             )
         self.session.flush()
+        METADATA_CACHE.invalidate(self.table.__tablename__, self.usage_point_id)
         return True
 
     def get_date_range(self):
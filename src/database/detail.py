@@ -4,12 +4,14 @@ import hashlib
 import logging
 from datetime import datetime, timedelta
 
-from sqlalchemy import asc, delete, desc, func, select
+from sqlalchemy import and_, asc, case, delete, desc, extract, func, literal, or_, select
 
 from const import MAX_IMPORT_TRY, TIMEZONE
 from db_schema import ConsumptionDetail, ProductionDetail, UsagePoints
+from utils import search_filter, to_date
 
 from . import DB
+from .metadata import METADATA_CACHE
 
 
 class DatabaseDetail:
@@ -82,55 +84,108 @@ class DatabaseDetail:
                 .order_by(sort)
             ).all()
 
-    def get_datatable(
+    def get_batches(self, batch_size, begin=None, end=None):
+        """Stream the records of the usage point in batches, without loading the whole history.
+
+        The rows are read through a server-side cursor (PostgreSQL) or fetched incrementally (SQLite).
+
+        Args:
+            batch_size (int): The number of records per batch.
+            begin (datetime, optional): The begin date. Defaults to None.
+            end (datetime, optional): The end date. Defaults to None.
+
+        Yields:
+            list: The records (date, value, interval), in chronological order.
+        """
+        query = select(self.table.date, self.table.value, self.table.interval).where(
+            self.table.usage_point_id == self.usage_point_id
+        )
+        if begin is not None:
+            query = query.where(self.table.date >= begin.astimezone(TIMEZONE))
+        if end is not None:
+            query = query.where(self.table.date <= end.astimezone(TIMEZONE))
+        query = query.order_by(self.table.date).execution_options(stream_results=True, yield_per=batch_size)
+        result = self.session.execute(query)
+        try:
+            yield from result.partitions(batch_size)
+        finally:
+            result.close()
+
+    def get_datatable(  # noqa: PLR0913
         self,
         order_column="date",
         order_dir="asc",
         search=None,
+        start=0,
+        length=None,
     ):
-        """Retrieve datatable from the database.
+        """Retrieve a page of the datatable.
+
+        Only the rows of the page are read, with LIMIT/OFFSET.
 
         Args:
             order_column (str, optional): The column to order the datatable by. Defaults to "date".
-            order_dir (str, optional): The order direction. Defaults to "asc".
-            search (str, optional): The search query to filter the datatable. Defaults to None.
+            order_dir (str, optional): The direction to order the datatable. Defaults to "asc".
+            search (str, optional): The search term. Defaults to None.
+            start (int, optional): The index of the first row. Defaults to 0.
+            length (int, optional): The number of rows, None or negative for all of them. Defaults to None.
 
         Returns:
-            list: A list of datatable records.
+            list: The rows of the page.
         """
-        yesterday = datetime.combine(datetime.now(tz=TIMEZONE) - timedelta(days=1), datetime.max.time())
         sort = asc(order_column) if order_dir == "desc" else desc(order_column)
-        if search is not None and search != "":
-            result = self.session.scalars(
-                select(self.table)
-                .join(self.relation)
-                .where(UsagePoints.usage_point_id == self.usage_point_id)
-                .where((self.table.date.like(f"%{search}%")) | (self.table.value.like(f"%{search}%")))
-                .where(self.table.date <= yesterday)
-                .order_by(sort)
-            )
-        else:
-            result = self.session.scalars(
-                select(self.table)
-                .join(self.relation)
-                .where(UsagePoints.usage_point_id == self.usage_point_id)
-                .where(self.table.date <= yesterday)
-                .order_by(sort)
-            )
-        return result.all()
+        query = self.datatable_filter(select(self.table), search).order_by(sort, desc(self.table.date)).offset(start)
+        if length is not None and length >= 0:
+            query = query.limit(length)
+        return self.session.scalars(query).all()
+
+    def get_datatable_count(self, search=None):
+        """Count the rows of the datatable matching a search.
+
+        Args:
+            search (str, optional): The search term. Defaults to None.
+
+        Returns:
+            int: The number of rows.
+        """
+        query = self.datatable_filter(select(func.count()).select_from(self.table), search)
+        if search:
+            return self.session.scalar(query)
+        return self.get_metadata(
+            (
+                "datatable_count",
+                datetime.combine(datetime.now(tz=TIMEZONE) - timedelta(days=1), datetime.max.time()).date(),
+            ),
+            query,
+        )
+
+    def datatable_filter(self, query, search=None):
+        """Restrict a datatable query to the records of the usage point up to yesterday matching a search.
+
+        A search on a date prefix ("2024", "2024-03" or "2024-03-15") is a range on the indexed date column (a bare
+        year also matches the values), any other search matches the date and the value with LIKE.
+
+        Args:
+            query (Select): The query.
+            search (str, optional): The search term. Defaults to None.
+
+        Returns:
+            Select: The filtered query.
+        """
+        yesterday = datetime.combine(datetime.now(tz=TIMEZONE) - timedelta(days=1), datetime.max.time())
+        query = query.where(self.table.usage_point_id == self.usage_point_id).where(self.table.date <= yesterday)
+        if search:
+            query = query.where(search_filter(search, self.table.date, self.table.value))
+        return query
 
     def get_count(self):
-        """Retrieve the count of records for a specific usage point and measurement direction.
+        """Retrieve the count of detail records for the usage point.
 
         Returns:
             int: The count of records.
         """
-        return self.session.scalars(
-            select([func.count()])
-            .select_from(self.table)
-            .join(self.relation)
-            .where(UsagePoints.usage_point_id == self.usage_point_id)
-        ).one_or_none()
+        query = select(func.count()).select_from(self.table).where(self.table.usage_point_id == self.usage_point_id)
+        return self.get_metadata("count", query)
 
     def get_date(self, date: datetime):
         """Retrieve the data for a specific date from the database.
@@ -181,6 +236,96 @@ class DatabaseDetail:
             return False
         return current_data
 
+    def get_sum_by_day(self, offpeak_hours=None, begin=None, end=None, days=None):
+        """Retrieve the consumption grouped by day and measure type (HP/HC), in a single query.
+
+        The HP/HC classification is pushed into the query as a CASE expression built from the off-peak ranges.
+
+        Args:
+            offpeak_hours (dict, optional): The off-peak ranges indexed by weekday (0 = monday), as lists of
+                (begin, end) minutes of the day. Defaults to None (everything is HP).
+            begin (datetime, optional): The begin date. Defaults to None.
+            end (datetime, optional): The end date. Defaults to None.
+            days (list, optional): Only these days (date), as ranges of the date index. Defaults to None.
+
+        Returns:
+            dict: The (raw value, Wh) sums indexed by (day, measure type).
+        """
+        if days is not None and not days:
+            return {}
+        day = func.date(self.table.date).label("day")
+        interval = case((self.table.interval == 0, 1), else_=self.table.interval)
+        minute_of_day = extract("hour", self.table.date) * 60 + extract("minute", self.table.date)
+        conditions = []
+        for weekday, ranges in (offpeak_hours or {}).items():
+            for range_begin, range_end in ranges:
+                if range_end < range_begin:
+                    in_range = or_(minute_of_day >= range_begin, minute_of_day < range_end)
+                else:
+                    in_range = and_(minute_of_day >= range_begin, minute_of_day < range_end)
+                # SQL day of week starts on sunday
+                conditions.append(and_(extract("dow", self.table.date) == (weekday + 1) % 7, in_range))
+        if conditions:
+            measure_type = case((or_(*conditions), "HC"), else_="HP").label("hc_hp")
+            group_by = ("day", "hc_hp")
+        else:
+            measure_type = literal("HP").label("hc_hp")
+            group_by = ("day",)
+        query = select(
+            day,
+            measure_type,
+            func.sum(self.table.value),
+            func.sum(self.table.value * interval / 60.0),
+        ).where(self.table.usage_point_id == self.usage_point_id)
+        if begin is not None:
+            query = query.where(self.table.date >= begin.astimezone(TIMEZONE))
+        if end is not None:
+            query = query.where(self.table.date <= end.astimezone(TIMEZONE))
+        if days is not None:
+            query = query.where(
+                or_(
+                    *(
+                        and_(
+                            self.table.date >= datetime.combine(day, datetime.min.time()),
+                            self.table.date < datetime.combine(day + timedelta(days=1), datetime.min.time()),
+                        )
+                        for day in sorted(set(days))
+                    )
+                )
+            )
+        query = query.group_by(*group_by)
+        logging.debug(query.compile(compile_kwargs={"literal_binds": True}))
+        return {
+            (to_date(row_day), row_measure_type): (row_value or 0, row_wh or 0)
+            for row_day, row_measure_type, row_value, row_wh in self.session.execute(query)
+        }
+
+    def get_month_signature(self, begin=None, end=None):
+        """Retrieve the number of records, the sum of the values and the last date of each month, in a single query.
+
+        Args:
+            begin (datetime, optional): The begin date. Defaults to None.
+            end (datetime, optional): The end date. Defaults to None.
+
+        Returns:
+            dict: The (count, sum, last date) indexed by (year, month).
+        """
+        year = extract("year", self.table.date).label("year")
+        month = extract("month", self.table.date).label("month")
+        query = select(
+            year, month, func.count(self.table.id), func.sum(self.table.value), func.max(self.table.date)
+        ).where(self.table.usage_point_id == self.usage_point_id)
+        if begin is not None:
+            query = query.where(self.table.date >= begin.astimezone(TIMEZONE))
+        if end is not None:
+            query = query.where(self.table.date <= end.astimezone(TIMEZONE))
+        query = query.group_by("year", "month")
+        logging.debug(query.compile(compile_kwargs={"literal_binds": True}))
+        return {
+            (int(row_year), int(row_month)): (row_count, row_sum or 0, row_last_date)
+            for row_year, row_month, row_count, row_sum, row_last_date in self.session.execute(query)
+        }
+
     def get(self, begin: datetime, end: datetime):
         """Retrieve data for a specific range from the database.
 
@@ -189,34 +334,62 @@ class DatabaseDetail:
             end (datetime): The end of the range.
 
         Returns:
-            dict: A dictionary containing the retrieved data.
+            dict: A dictionary containing the retrieved data, or the spans missing in the range ("missing").
         """
         begin = begin.astimezone(TIMEZONE)
         end = end.astimezone(TIMEZONE)
-        delta = end - begin
-        result = {"missing_data": False, "date": {}, "count": 0}
-        for _ in range(delta.days + 1):
-            query_result = self.get_all(
-                begin=begin,
-                end=end,
+        result = {"missing_data": False, "date": {}, "count": 0, "missing": self.get_gaps(begin, end)}
+        if result["missing"]:
+            total_time = sum(
+                int((gap_end - gap_begin).total_seconds() / 60) for gap_begin, gap_end in result["missing"]
             )
-            time_delta = abs(int((begin - end).total_seconds() / 60))
-            total_internal = 0
-            for query in query_result:
-                total_internal = total_internal + query.interval
-            total_time = abs(total_internal - time_delta)
-            if total_time > self.min_entry:
-                logging.info(f" - {total_time}m absente du relevé.")
-                result["missing_data"] = True
-            else:
-                for query in query_result:
-                    result["date"][query.date] = {
-                        "value": query.value,
-                        "interval": query.interval,
-                        "measure_type": query.measure_type,
-                        "blacklist": query.blacklist,
-                    }
-            return result
+            logging.info(f" - {total_time}m absente du relevé.")
+            result["missing_data"] = True
+        else:
+            for query in self.get_all(begin=begin, end=end):
+                result["date"][query.date] = {
+                    "value": query.value,
+                    "interval": query.interval,
+                    "measure_type": query.measure_type,
+                    "blacklist": query.blacklist,
+                }
+        return result
+
+    def get_gaps(self, begin: datetime, end: datetime):
+        """Find the spans of a range which are not covered by the records.
+
+        A record covers its interval from its date, and failed records (interval 0) don't cover anything. The
+        records are read with one ordered (date, interval) query, the holes shorter than min_entry minutes (a missing
+        slot, a daylight saving time change) are ignored.
+
+        Args:
+            begin (datetime): The start of the range.
+            end (datetime): The end of the range.
+
+        Returns:
+            list: The uncovered spans, as (begin, end) datetimes.
+        """
+        begin = begin.astimezone(TIMEZONE)
+        end = end.astimezone(TIMEZONE)
+        query = (
+            select(self.table.date, self.table.interval)
+            .where(self.table.usage_point_id == self.usage_point_id)
+            .where(self.table.date >= begin)
+            .where(self.table.date <= end)
+            .where(self.table.interval > 0)
+            .order_by(self.table.date)
+        )
+        logging.debug(query.compile(compile_kwargs={"literal_binds": True}))
+        end = end.replace(tzinfo=None)
+        cursor = begin.replace(tzinfo=None)
+        gaps = []
+        for date, interval in self.session.execute(query):
+            if (date - cursor).total_seconds() / 60 > self.min_entry:
+                gaps.append((cursor, date))
+            cursor = max(cursor, date + timedelta(minutes=interval))
+        if (end - cursor).total_seconds() / 60 > self.min_entry:
+            gaps.append((cursor, end))
+        return [(TIMEZONE.localize(gap_begin), TIMEZONE.localize(gap_end)) for gap_begin, gap_end in gaps]
 
     def get_state(self, date: datetime):
         """Get the state of a specific data record in the database.
@@ -280,6 +453,44 @@ class DatabaseDetail:
                 )
             )
         self.session.flush()
+        METADATA_CACHE.invalidate(self.table.__tablename__, self.usage_point_id)
+
+    def insert_bulk(self, rows):
+        """Insert or update many records for the given consumption or production detail.
+
+        Args:
+            rows (list): The records, as dictionaries with the date, value and interval keys and optionally the
+                blacklist and fail_count keys.
+        """
+        values = []
+        for row in rows:
+            date = row["date"].astimezone(TIMEZONE)
+            values.append(
+                {
+                    "id": hashlib.md5(f"{self.usage_point_id}/{date}".encode("utf-8")).hexdigest(),  # noqa: S324
+                    "usage_point_id": self.usage_point_id,
+                    "date": date,
+                    "value": row["value"],
+                    "interval": row["interval"],
+                    "measure_type": self.measurement_direction,
+                    "blacklist": row.get("blacklist", 0),
+                    "fail_count": row.get("fail_count", 0),
+                }
+            )
+        DB.upsert(self.session, self.table, values)
+        METADATA_CACHE.invalidate(self.table.__tablename__, self.usage_point_id)
+
+    def insert_window(self, rows, fail_dates):
+        """Write the records and the failed dates of a gateway response in a single transaction.
+
+        Args:
+            rows (list): The records, as for insert_bulk.
+            fail_dates (list): The dates returned without value, as for fail_increment_bulk.
+        """
+        with self.session.begin():
+            self.insert_bulk(rows)
+            self.fail_increment_bulk(fail_dates)
+        METADATA_CACHE.invalidate(self.table.__tablename__, self.usage_point_id)
 
     def reset(self, date=None):
         """Reset the values of a consumption or production detail record.
@@ -299,6 +510,7 @@ class DatabaseDetail:
             detail.blacklist = 0
             detail.fail_count = 0
             self.session.flush()
+            METADATA_CACHE.invalidate(self.table.__tablename__, self.usage_point_id)
             return True
         return False
 
@@ -322,6 +534,7 @@ class DatabaseDetail:
                 row.blacklist = 0
                 row.fail_count = 0
             self.session.flush()
+            METADATA_CACHE.invalidate(self.table.__tablename__, self.usage_point_id)
             return True
         return False
 
@@ -341,6 +554,7 @@ class DatabaseDetail:
         else:
             self.session.execute(delete(self.table).where(self.table.usage_point_id == self.usage_point_id))
         self.session.flush()
+        METADATA_CACHE.invalidate(self.table.__tablename__, self.usage_point_id)
         return True
 
     def delete_range(self, date: datetime):
@@ -359,6 +573,7 @@ class DatabaseDetail:
         else:
             self.session.execute(delete(self.table).where(self.table.usage_point_id == self.usage_point_id))
         self.session.flush()
+        METADATA_CACHE.invalidate(self.table.__tablename__, self.usage_point_id)
         return True
 
     def get_ratio_hc_hp(self, begin: datetime, end: datetime):
@@ -442,44 +657,105 @@ class DatabaseDetail:
                 )
             )
         self.session.flush()
+        METADATA_CACHE.invalidate(self.table.__tablename__, self.usage_point_id)
         self.session.close()
         return fail_count
 
+    def fail_increment_bulk(self, dates):
+        """Increment the fail count of many records, blacklisting them after MAX_IMPORT_TRY failures.
+
+        Args:
+            dates (list): The dates of the records.
+        """
+        values = []
+        for date in dates:
+            date_tz = date.astimezone(TIMEZONE)
+            values.append(
+                {
+                    "id": hashlib.md5(f"{self.usage_point_id}/{date_tz}".encode("utf-8")).hexdigest(),  # noqa: S324
+                    "usage_point_id": self.usage_point_id,
+                    "date": date_tz,
+                    "value": 0,
+                    "interval": 0,
+                    "measure_type": "HP",
+                    "blacklist": 0,
+                    "fail_count": 0,
+                }
+            )
+        fail_count = self.table.fail_count + 1
+        DB.upsert(
+            self.session,
+            self.table,
+            values,
+            {
+                "value": 0,
+                "interval": 0,
+                "measure_type": "HP",
+                "blacklist": case((fail_count >= MAX_IMPORT_TRY, 1), else_=0),
+                "fail_count": case((fail_count >= MAX_IMPORT_TRY, 0), else_=fail_count),
+            },
+        )
+        METADATA_CACHE.invalidate(self.table.__tablename__, self.usage_point_id)
+
     def get_last_date(self):
-        """Get the last date for a specific usage point and measurement type.
+        """Get the oldest date of the detail records for the usage point (MIN aggregate).
 
         Returns:
-            datetime: The last date for the specified usage point and measurement type.
+            datetime: The oldest date, False if there is no record.
         """
-        current_data = self.session.scalars(
-            select(self.table)
-            .join(self.relation)
-            .where(self.table.usage_point_id == self.usage_point_id)
-            .order_by(self.table.date)
-        ).first()
-        if current_data is None:
+        query = select(func.min(self.table.date)).where(self.table.usage_point_id == self.usage_point_id)
+        date = self.get_metadata("min_date", query)
+        if date is None:
             return False
-        else:
-            return current_data.date
+        return date
 
     def get_first_date(self):
-        """Get the first date for a specific usage point and measurement type.
+        """Get the most recent date of the detail records for the usage point (MAX aggregate).
+
+        Returns:
+            datetime: The most recent date, False if there is no record.
+        """
+        query = select(func.max(self.table.date)).where(self.table.usage_point_id == self.usage_point_id)
+        date = self.get_metadata("max_date", query)
+        if date is None:
+            return False
+        return date
+
+    def get_month_count(self):
+        """Count the detail records of the usage point per month.
 
         Returns:
-            datetime: The first date for the specified usage point and measurement type.
+            dict: The counts indexed by (year, month). The dictionary is shared by the cache, don't modify it.
         """
         query = (
-            select(self.table)
-            .join(self.relation)
+            select(
+                extract("year", self.table.date).label("year"),
+                extract("month", self.table.date).label("month"),
+                func.count(),
+            )
             .where(self.table.usage_point_id == self.usage_point_id)
-            .order_by(self.table.date.desc())
+            .group_by("year", "month")
+        )
+        return METADATA_CACHE.get(
+            self.table.__tablename__,
+            self.usage_point_id,
+            "month_count",
+            lambda: {(int(year), int(month)): count for year, month, count in self.session.execute(query)},
+        )
+
+    def get_metadata(self, key, query):
+        """Run a scalar aggregate query, cached until the next write on the usage point records.
+
+        Args:
+            key (str): The cache key.
+            query (Select): The aggregate query.
+
+        Returns:
+            The query result.
+        """
+        return METADATA_CACHE.get(
+            self.table.__tablename__, self.usage_point_id, key, lambda: self.session.scalar(query)
         )
-        logging.debug(query.compile(compile_kwargs={"literal_binds": True}))
-        current_data = self.session.scalars(query).first()
-        if current_data is None:
-            return False
-        else:
-            return current_data.date
 
     def get_date_range(self):
         """Get the date range (begin and end dates) for a specific usage point.
@@ -520,4 +796,5 @@ class DatabaseDetail:
                 )
             )
         self.session.flush()
+        METADATA_CACHE.invalidate(self.table.__tablename__, self.usage_point_id)
         return True
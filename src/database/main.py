@@ -3,18 +3,37 @@ import logging
 import subprocess
 import sys
 import traceback
+from contextlib import nullcontext
 from datetime import datetime
 from pathlib import Path
 
-from sqlalchemy import create_engine, inspect, select
+from sqlalchemy import create_engine, event, inspect, select
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import scoped_session, sessionmaker
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import NullPool, QueuePool
 
-from const import TIMEZONE
+from config.backend import Backend
+from const import BULK_INSERT_CHUNK_SIZE, SQLITE_PRAGMAS, TIMEZONE
 from db_schema import (
     Config as ConfigSchema,
 )
-from utils import get_version, load_config
+from utils import chunks_list, get_version, load_config
+
+# Value of PRAGMA auto_vacuum for the incremental mode
+SQLITE_AUTO_VACUUM_INCREMENTAL = 2
+
+
+def on_sqlite_connect(dbapi_connection, _connection_record):
+    """Apply the SQLITE_PRAGMAS profile to a new SQLite connection.
+
+    Args:
+        dbapi_connection (sqlite3.Connection): The new connection.
+        _connection_record (ConnectionRecord): The pool record of the connection.
+    """
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
 
 
 class Database:
@@ -52,10 +71,11 @@ class Database:
         self.engine = create_engine(
             self.uri,
             echo=False,
-            query_cache_size=0,
             isolation_level="READ UNCOMMITTED",
-            poolclass=NullPool,
+            **self.get_pool_options(Backend(self.config.config, write=False)),
         )
+        if self.engine.dialect.name == "sqlite":
+            event.listen(self.engine, "connect", on_sqlite_connect)
 
         subprocess.run(
             f"cd {self.application_path}; DB_URL='{self.uri}' alembic upgrade head",
@@ -68,6 +88,33 @@ class Database:
         self.inspector = inspect(self.engine)
         self.lock_file = f"{self.application_path_data}/.lock"
 
+    def get_pool_options(self, backend):
+        """Get the connection pool options of the engine.
+
+        With pooling enabled, the connections are kept open in a QueuePool and reused by the sessions of all the
+        threads (pre-pinged for PostgreSQL, as the server may close them), otherwise every session opens its own
+        connection.
+
+        Args:
+            backend (Backend): The backend configuration.
+
+        Returns:
+            dict: The create_engine options.
+        """
+        if not backend.pool:
+            return {"poolclass": NullPool}
+        options = {
+            "poolclass": QueuePool,
+            "pool_size": backend.pool_size,
+            "max_overflow": backend.max_overflow,
+        }
+        if self.uri.startswith("sqlite"):
+            options["connect_args"] = {"check_same_thread": False}
+        else:
+            options["pool_pre_ping"] = True
+            options["pool_recycle"] = 3600
+        return options
+
     def init_database(self):
         """Initialize the database with default values."""
         try:
@@ -149,6 +196,58 @@ class Database:
             Path(self.lock_file).unlink()
         return self.lock_status()
 
+    def upsert(self, session, table, values, set_=None, key="id"):  # noqa: PLR0913
+        """Insert or update rows with INSERT ... ON CONFLICT (key) DO UPDATE statements.
+
+        The rows are written in chunks of BULK_INSERT_CHUNK_SIZE, one statement per chunk, inside a single
+        transaction (the transaction already begun on the session, if any).
+
+        Args:
+            session (Session): The session to use.
+            table (Base): The table.
+            values (list): The rows to write, as dictionaries of columns (the id included).
+            set_ (dict, optional): The columns to update on conflict. Defaults to None (all the inserted columns
+                but the key).
+            key (str, optional): The primary key column. Defaults to "id".
+        """
+        if not values:
+            return
+        # The same row can't be updated twice by one statement, keep the last occurrence.
+        values = list({row[key]: row for row in values}.values())
+        insert = postgresql.insert if self.engine.dialect.name == "postgresql" else sqlite.insert
+        with nullcontext() if session.in_transaction() else session.begin():
+            for chunk in chunks_list(values, BULK_INSERT_CHUNK_SIZE):
+                statement = insert(table).values(chunk)
+                if set_ is None:
+                    chunk_set = {column: getattr(statement.excluded, column) for column in chunk[0] if column != key}
+                else:
+                    chunk_set = set_
+                session.execute(statement.on_conflict_do_update(index_elements=[getattr(table, key)], set_=chunk_set))
+
+    def optimize(self):
+        """Refresh the statistics of the SQLite query planner (ANALYZE of the tables that changed a lot)."""
+        if self.engine.dialect.name != "sqlite":
+            return
+        with self.engine.connect() as connection:
+            connection.exec_driver_sql("PRAGMA optimize").close()
+
+    def vacuum(self):
+        """Give the free pages of the SQLite file back to the file system and truncate the WAL file.
+
+        The free pages are released by an incremental vacuum, which doesn't rewrite the database. The first run
+        switches the file to incremental auto vacuum with a full VACUUM.
+        """
+        if self.engine.dialect.name != "sqlite":
+            return
+        with self.engine.connect() as connection:
+            if connection.exec_driver_sql("PRAGMA auto_vacuum").scalar() != SQLITE_AUTO_VACUUM_INCREMENTAL:
+                logging.info(" => Passage en auto vacuum incrémental")
+                connection.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL").close()
+                connection.exec_driver_sql("VACUUM").close()
+            else:
+                connection.exec_driver_sql("PRAGMA incremental_vacuum").fetchall()
+            connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").close()
+
     def refresh_object(self):
         """Refresh the ORM objects."""
         self.session().expire_all()
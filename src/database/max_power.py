@@ -5,12 +5,14 @@ import logging
 from datetime import datetime, timedelta
 
 import pytz
-from sqlalchemy import asc, delete, desc, func, select
+from sqlalchemy import asc, delete, desc, extract, func, select
 
 from const import MAX_IMPORT_TRY
 from db_schema import ConsumptionDailyMaxPower, UsagePoints
+from utils import search_filter
 
 from . import DB
+from .metadata import METADATA_CACHE
 
 
 class DatabaseMaxPower:
@@ -77,14 +79,21 @@ class DatabaseMaxPower:
         Returns:
             dict: A dictionary containing the power data for each date within the range.
         """
-        delta = end - begin
+        days = [
+            datetime.combine(begin + timedelta(days=i), datetime.min.time()) for i in range((end - begin).days + 1)
+        ]
+        query = (
+            select(ConsumptionDailyMaxPower.date, ConsumptionDailyMaxPower.value, ConsumptionDailyMaxPower.blacklist)
+            .where(ConsumptionDailyMaxPower.usage_point_id == self.usage_point_id)
+            .where(ConsumptionDailyMaxPower.date >= days[0])
+            .where(ConsumptionDailyMaxPower.date <= datetime.combine(days[-1], datetime.max.time()))
+        )
+        logging.debug(query.compile(compile_kwargs={"literal_binds": True}))
+        records = {date.date(): (value, blacklist) for date, value, blacklist in self.session.execute(query)}
         result = {"missing_data": False, "date": {}, "count": 0}
-        for i in range(delta.days + 1):
-            check_date = begin + timedelta(days=i)
-            check_date = datetime.combine(check_date, datetime.min.time())
-            query_result = self.get_date(check_date)
-            check_date = check_date.strftime("%Y-%m-%d")
-            if query_result is None:
+        for day in days:
+            check_date = day.strftime("%Y-%m-%d")
+            if day.date() not in records:
                 # NEVER QUERY
                 result["date"][check_date] = {
                     "status": False,
@@ -93,8 +102,7 @@ class DatabaseMaxPower:
                 }
                 result["missing_data"] = True
             else:
-                consumption = query_result.value
-                blacklist = query_result.blacklist
+                consumption, blacklist = records[day.date()]
                 if consumption == 0:
                     # ENEDIS RETURN NO DATA
                     result["date"][check_date] = {
@@ -113,21 +121,68 @@ class DatabaseMaxPower:
         return result
 
     def get_last_date(self):
-        """Retrieve the last date of consumption daily max power record from the database.
+        """Get the oldest date of the daily max power records for the usage point (MIN aggregate).
 
         Returns:
-            datetime: The last date of consumption daily max power record.
+            datetime: The oldest date, False if there is no record.
         """
-        current_data = self.session.scalars(
-            select(ConsumptionDailyMaxPower)
-            .join(UsagePoints.relation_consumption_daily_max_power)
-            .where(ConsumptionDailyMaxPower.usage_point_id == self.usage_point_id)
-            .order_by(ConsumptionDailyMaxPower.date)
-        ).first()
-        if current_data is None:
+        query = select(func.min(ConsumptionDailyMaxPower.date)).where(
+            ConsumptionDailyMaxPower.usage_point_id == self.usage_point_id
+        )
+        date = self.get_metadata("min_date", query)
+        if date is None:
             return False
-        else:
-            return current_data.date
+        return date
+
+    def get_first_date(self):
+        """Get the most recent date of the daily max power records for the usage point (MAX aggregate).
+
+        Returns:
+            datetime: The most recent date, False if there is no record.
+        """
+        query = select(func.max(ConsumptionDailyMaxPower.date)).where(
+            ConsumptionDailyMaxPower.usage_point_id == self.usage_point_id
+        )
+        date = self.get_metadata("max_date", query)
+        if date is None:
+            return False
+        return date
+
+    def get_month_count(self):
+        """Count the daily max power records of the usage point per month.
+
+        Returns:
+            dict: The counts indexed by (year, month). The dictionary is shared by the cache, don't modify it.
+        """
+        query = (
+            select(
+                extract("year", ConsumptionDailyMaxPower.date).label("year"),
+                extract("month", ConsumptionDailyMaxPower.date).label("month"),
+                func.count(),
+            )
+            .where(ConsumptionDailyMaxPower.usage_point_id == self.usage_point_id)
+            .group_by("year", "month")
+        )
+        return METADATA_CACHE.get(
+            ConsumptionDailyMaxPower.__tablename__,
+            self.usage_point_id,
+            "month_count",
+            lambda: {(int(year), int(month)): count for year, month, count in self.session.execute(query)},
+        )
+
+    def get_metadata(self, key, query):
+        """Run a scalar aggregate query, cached until the next write on the usage point records.
+
+        Args:
+            key (str): The cache key.
+            query (Select): The aggregate query.
+
+        Returns:
+            The query result.
+        """
+        return METADATA_CACHE.get(
+            ConsumptionDailyMaxPower.__tablename__, self.usage_point_id, key, lambda: self.session.scalar(query)
+        )
 
     def get_date(self, date):
         """Retrieve the consumption daily max power record for a given date.
@@ -176,54 +231,93 @@ class DatabaseMaxPower:
                 )
             )
         self.session.flush()
+        METADATA_CACHE.invalidate(ConsumptionDailyMaxPower.__tablename__, self.usage_point_id)
 
     def get_daily_count(self):
-        """Retrieve the count of consumption daily max power records from the database.
+        """Retrieve the count of daily max power records for the usage point.
 
         Returns:
-            int: The count of consumption daily max power records.
+            int: The count of records.
         """
-        return self.session.scalars(
-            select([func.count()])
+        query = (
+            select(func.count())
             .select_from(ConsumptionDailyMaxPower)
-            .join(UsagePoints.relation_consumption_daily_max_power)
-            .where(UsagePoints.usage_point_id == self.usage_point_id)
-        ).one_or_none()
+            .where(ConsumptionDailyMaxPower.usage_point_id == self.usage_point_id)
+        )
+        return self.get_metadata("count", query)
+
+    def get_daily_datatable(  # noqa: PLR0913
+        self,
+        order_column="date",
+        order_dir="asc",
+        search=None,
+        start=0,
+        length=None,
+    ):
+        """Retrieve a page of the datatable.
 
-    def get_daily_datatable(self, order_column="date", order_dir="asc", search=None):
-        """Retrieve the datatable of consumption daily max power records from the database.
+        Only the rows of the page are read, with LIMIT/OFFSET.
 
         Args:
             order_column (str, optional): The column to order the datatable by. Defaults to "date".
-            order_dir (str, optional): The direction to order the datatable in. Defaults to "asc".
-            search (str, optional): The search term to filter the datatable. Defaults to None.
+            order_dir (str, optional): The direction to order the datatable. Defaults to "asc".
+            search (str, optional): The search term. Defaults to None.
+            start (int, optional): The index of the first row. Defaults to 0.
+            length (int, optional): The number of rows, None or negative for all of them. Defaults to None.
 
         Returns:
-            list: The datatable of consumption daily max power records.
+            list: The rows of the page.
         """
-        yesterday = datetime.combine(datetime.now(pytz.utc) - timedelta(days=1), datetime.max.time())
         sort = asc(order_column) if order_dir == "desc" else desc(order_column)
-        if search is not None and search != "":
-            result = self.session.scalars(
-                select(ConsumptionDailyMaxPower)
-                .join(UsagePoints.relation_consumption_daily_max_power)
-                .where(UsagePoints.usage_point_id == self.usage_point_id)
-                .where(
-                    (ConsumptionDailyMaxPower.date.like(f"%{search}%"))
-                    | (ConsumptionDailyMaxPower.value.like(f"%{search}%"))
-                )
-                .where(ConsumptionDailyMaxPower.date <= yesterday)
-                .order_by(sort)
-            )
-        else:
-            result = self.session.scalars(
-                select(ConsumptionDailyMaxPower)
-                .join(UsagePoints.relation_consumption_daily_max_power)
-                .where(UsagePoints.usage_point_id == self.usage_point_id)
-                .where(ConsumptionDailyMaxPower.date <= yesterday)
-                .order_by(sort)
-            )
-        return result.all()
+        query = (
+            self.datatable_filter(select(ConsumptionDailyMaxPower), search)
+            .order_by(sort, desc(ConsumptionDailyMaxPower.date))
+            .offset(start)
+        )
+        if length is not None and length >= 0:
+            query = query.limit(length)
+        return self.session.scalars(query).all()
+
+    def get_daily_datatable_count(self, search=None):
+        """Count the rows of the datatable matching a search.
+
+        Args:
+            search (str, optional): The search term. Defaults to None.
+
+        Returns:
+            int: The number of rows.
+        """
+        query = self.datatable_filter(select(func.count()).select_from(ConsumptionDailyMaxPower), search)
+        if search:
+            return self.session.scalar(query)
+        return self.get_metadata(
+            (
+                "datatable_count",
+                datetime.combine(datetime.now(pytz.utc) - timedelta(days=1), datetime.max.time()).date(),
+            ),
+            query,
+        )
+
+    def datatable_filter(self, query, search=None):
+        """Restrict a datatable query to the records of the usage point up to yesterday matching a search.
+
+        A search on a date prefix ("2024", "2024-03" or "2024-03-15") is a range on the indexed date column (a bare
+        year also matches the values), any other search matches the date and the value with LIKE.
+
+        Args:
+            query (Select): The query.
+            search (str, optional): The search term. Defaults to None.
+
+        Returns:
+            Select: The filtered query.
+        """
+        yesterday = datetime.combine(datetime.now(pytz.utc) - timedelta(days=1), datetime.max.time())
+        query = query.where(ConsumptionDailyMaxPower.usage_point_id == self.usage_point_id).where(
+            ConsumptionDailyMaxPower.date <= yesterday
+        )
+        if search:
+            query = query.where(search_filter(search, ConsumptionDailyMaxPower.date, ConsumptionDailyMaxPower.value))
+        return query
 
     def daily_fail_increment(self, date):
         """Increment the fail count for a specific date in the consumption daily max power records.
@@ -264,6 +358,7 @@ class DatabaseMaxPower:
                 )
             )
         self.session.flush()
+        METADATA_CACHE.invalidate(ConsumptionDailyMaxPower.__tablename__, self.usage_point_id)
         return fail_count
 
     def reset_daily(self, date=None):
@@ -282,6 +377,7 @@ class DatabaseMaxPower:
             daily.blacklist = 0
             daily.fail_count = 0
             self.session.flush()
+            METADATA_CACHE.invalidate(ConsumptionDailyMaxPower.__tablename__, self.usage_point_id)
             return True
         else:
             return False
@@ -303,6 +399,7 @@ class DatabaseMaxPower:
                 delete(ConsumptionDailyMaxPower).where(ConsumptionDailyMaxPower.usage_point_id == self.usage_point_id)
             )
         self.session.flush()
+        METADATA_CACHE.invalidate(ConsumptionDailyMaxPower.__tablename__, self.usage_point_id)
         return True
 
     def blacklist_daily(self, date, action=True):
@@ -331,6 +428,7 @@ class DatabaseMaxPower:
                 )
             )
         self.session.flush()
+        METADATA_CACHE.invalidate(ConsumptionDailyMaxPower.__tablename__, self.usage_point_id)
         return True
 
     def get_fail_count(self, date):
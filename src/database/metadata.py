@@ -0,0 +1,60 @@
+"""Cache of the aggregate metadata of the measurement tables."""
+
+import threading
+
+
+class MetadataCache:
+    """Per-usage-point cache of the date bounds and record counts of the measurement tables.
+
+    The values are computed with aggregate queries on first use and kept until a write on the same table and usage
+    point invalidates them.
+    """
+
+    def __init__(self):
+        """Initialize an empty cache."""
+        self.data = {}
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def get(self, table, usage_point_id, key, compute):
+        """Return a cached value, computing it on a miss.
+
+        Args:
+            table (str): The table name.
+            usage_point_id (str): The usage point ID.
+            key (str): The metadata name.
+            compute (callable): Called without argument to compute the value on a miss.
+
+        Returns:
+            The cached value.
+        """
+        with self.lock:
+            entry = self.data.get((table, usage_point_id))
+            if entry is not None and key in entry:
+                return entry[key]
+            generation = self.generation
+        value = compute()
+        with self.lock:
+            # Don't keep a value computed while a write was invalidating the cache.
+            if generation == self.generation:
+                self.data.setdefault((table, usage_point_id), {})[key] = value
+        return value
+
+    def invalidate(self, table=None, usage_point_id=None):
+        """Drop the cached values of a table and usage point.
+
+        Args:
+            table (str, optional): The table name. Defaults to None (all the tables).
+            usage_point_id (str, optional): The usage point ID. Defaults to None (all the usage points).
+        """
+        with self.lock:
+            self.generation += 1
+            for cache_table, cache_usage_point_id in list(self.data):
+                if table is not None and cache_table != table:
+                    continue
+                if usage_point_id is not None and cache_usage_point_id != usage_point_id:
+                    continue
+                del self.data[(cache_table, cache_usage_point_id)]
+
+
+METADATA_CACHE = MetadataCache()
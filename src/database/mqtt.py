@@ -0,0 +1,46 @@
+"""Manage MqttDigest table in database."""
+
+from sqlalchemy import delete, select
+
+from db_schema import MqttDigest
+
+from . import DB
+
+
+class DatabaseMqtt:
+    """Manage the digests of the payloads published on the MQTT topics."""
+
+    def __init__(self):
+        """Initialize DatabaseMqtt."""
+        self.session = DB.session()
+
+    def get(self):
+        """Retrieve the digests of all the published topics.
+
+        Returns:
+            dict: The (digest, publication date) indexed by topic.
+        """
+        return {
+            topic: (digest, date)
+            for topic, digest, date in self.session.execute(
+                select(MqttDigest.topic, MqttDigest.digest, MqttDigest.date)
+            )
+        }
+
+    def set(self, digests, date):
+        """Save the digests of published topics.
+
+        Args:
+            digests (dict): The digests indexed by topic.
+            date (datetime): The publication date.
+        """
+        DB.upsert(
+            self.session,
+            MqttDigest,
+            [{"topic": topic, "digest": digest, "date": date} for topic, digest in digests.items()],
+            key="topic",
+        )
+
+    def delete(self):
+        """Delete all the digests, the next export publishes every topic."""
+        self.session.execute(delete(MqttDigest))
@@ -0,0 +1,86 @@
+"""Manage Rollup table in database."""
+
+from sqlalchemy import delete, insert, select
+
+from const import BULK_INSERT_CHUNK_SIZE
+from db_schema import Rollup
+from utils import chunks_list
+
+from . import DB
+
+
+class DatabaseRollup:
+    """Manage the period sums of a usage point."""
+
+    def __init__(self, usage_point_id, measurement_direction="consumption"):
+        """Initialize DatabaseRollup."""
+        self.session = DB.session()
+        self.usage_point_id = usage_point_id
+        self.measurement_direction = measurement_direction
+
+    def get(self, period=None, begin=None, end=None):
+        """Retrieve the sums, in a single query.
+
+        Args:
+            period (str, optional): The period (day, week, month or year). Defaults to None (all the periods).
+            begin (datetime, optional): The first period start. Defaults to None.
+            end (datetime, optional): The last period start. Defaults to None.
+
+        Returns:
+            dict: The sums indexed by (period, period start (date), measure type).
+        """
+        query = (
+            select(Rollup.period, Rollup.date, Rollup.measure_type, Rollup.value)
+            .where(Rollup.usage_point_id == self.usage_point_id)
+            .where(Rollup.measurement_direction == self.measurement_direction)
+        )
+        if period is not None:
+            query = query.where(Rollup.period == period)
+        if begin is not None:
+            query = query.where(Rollup.date >= begin)
+        if end is not None:
+            query = query.where(Rollup.date <= end)
+        return {
+            (row_period, row_date.date(), row_measure_type): row_value
+            for row_period, row_date, row_measure_type, row_value in self.session.execute(query)
+        }
+
+    def set(self, period, begin, end, values):
+        """Replace the sums of a period between two dates, in a single transaction.
+
+        Args:
+            period (str): The period (day, week, month or year).
+            begin (datetime): The first period start to replace.
+            end (datetime): The last period start to replace.
+            values (dict): The new sums indexed by (period start (datetime), measure type).
+        """
+        rows = [
+            {
+                "usage_point_id": self.usage_point_id,
+                "measurement_direction": self.measurement_direction,
+                "period": period,
+                "date": date,
+                "measure_type": measure_type,
+                "value": value,
+            }
+            for (date, measure_type), value in values.items()
+        ]
+        with self.session.begin():
+            self.session.execute(
+                delete(Rollup)
+                .where(Rollup.usage_point_id == self.usage_point_id)
+                .where(Rollup.measurement_direction == self.measurement_direction)
+                .where(Rollup.period == period)
+                .where(Rollup.date >= begin)
+                .where(Rollup.date <= end)
+            )
+            for chunk in chunks_list(rows, BULK_INSERT_CHUNK_SIZE):
+                self.session.execute(insert(Rollup), chunk)
+
+    def delete(self):
+        """Delete the sums of the usage point and measurement direction."""
+        self.session.execute(
+            delete(Rollup)
+            .where(Rollup.usage_point_id == self.usage_point_id)
+            .where(Rollup.measurement_direction == self.measurement_direction)
+        )
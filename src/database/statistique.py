@@ -40,6 +40,13 @@ class DatabaseStatistique:
         self.session.flush()
         return True
 
-    def delete(self):
-        """Delete the statistics associated with the usage point."""
-        self.session.execute(delete(Statistique).where(Statistique.usage_point_id == self.usage_point_id))
+    def delete(self, key=None):
+        """Delete the statistics associated with the usage point.
+
+        Args:
+            key (str, optional): Only delete this key. Defaults to None (all the keys).
+        """
+        query = delete(Statistique).where(Statistique.usage_point_id == self.usage_point_id)
+        if key is not None:
+            query = query.where(Statistique.key == key)
+        self.session.execute(query)
@@ -15,11 +15,13 @@ from db_schema import (
     Contracts,
     ProductionDaily,
     ProductionDetail,
+    Rollup,
     Statistique,
     UsagePoints,
 )
 
 from . import DB
+from .metadata import METADATA_CACHE
 
 
 class UsagePointsConfig:  # pylint: disable=R0902
@@ -177,10 +179,12 @@ class DatabaseUsagePoints:
         self.session.execute(delete(ConsumptionDaily).where(ConsumptionDaily.usage_point_id == self.usage_point_id))
         self.session.execute(delete(ProductionDetail).where(ProductionDetail.usage_point_id == self.usage_point_id))
         self.session.execute(delete(ProductionDaily).where(ProductionDaily.usage_point_id == self.usage_point_id))
+        self.session.execute(delete(Rollup).where(Rollup.usage_point_id == self.usage_point_id))
         self.session.execute(delete(UsagePoints).where(UsagePoints.usage_point_id == self.usage_point_id))
         self.session.execute(delete(Statistique).where(Statistique.usage_point_id == self.usage_point_id))
         self.session.flush()
         self.session.close()
+        METADATA_CACHE.invalidate(usage_point_id=self.usage_point_id)
         return True
 
     def get_error_log(self):
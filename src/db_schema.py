@@ -2,7 +2,7 @@
 
 import typing
 
-from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Integer, String, Text
+from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, String, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -219,6 +219,9 @@ class ConsumptionDaily(Base):
     """Represents the ConsumptionDaily class."""
 
     __tablename__ = "consumption_daily"
+    __table_args__: typing.ClassVar[tuple] = (
+        Index("ix_consumption_daily_usage_point_id_date", "usage_point_id", "date", postgresql_include=["value"]),
+    )
 
     id = Column(String, primary_key=True, index=True, unique=True)
     usage_point_id = Column(Text, ForeignKey("usage_points.usage_point_id"), nullable=False, index=True)
@@ -247,6 +250,14 @@ class ConsumptionDetail(Base):
     """Represents the ConsumptionDetail class."""
 
     __tablename__ = "consumption_detail"
+    __table_args__: typing.ClassVar[tuple] = (
+        Index(
+            "ix_consumption_detail_usage_point_id_date",
+            "usage_point_id",
+            "date",
+            postgresql_include=["value", "interval"],
+        ),
+    )
 
     id = Column(String, primary_key=True, index=True, unique=True)
     usage_point_id = Column(Text, ForeignKey("usage_points.usage_point_id"), nullable=False, index=True)
@@ -279,6 +290,9 @@ class ProductionDaily(Base):
     """Represents the ProductionDaily class."""
 
     __tablename__ = "production_daily"
+    __table_args__: typing.ClassVar[tuple] = (
+        Index("ix_production_daily_usage_point_id_date", "usage_point_id", "date", postgresql_include=["value"]),
+    )
 
     id = Column(String, primary_key=True, index=True, unique=True)
     usage_point_id = Column(Text, ForeignKey("usage_points.usage_point_id"), nullable=False, index=True)
@@ -307,6 +321,14 @@ class ProductionDetail(Base):
     """Represents the ProductionDetail class."""
 
     __tablename__ = "production_detail"
+    __table_args__: typing.ClassVar[tuple] = (
+        Index(
+            "ix_production_detail_usage_point_id_date",
+            "usage_point_id",
+            "date",
+            postgresql_include=["value", "interval"],
+        ),
+    )
 
     id = Column(String, primary_key=True, index=True, unique=True)
     usage_point_id = Column(Text, ForeignKey("usage_points.usage_point_id"), nullable=False, index=True)
@@ -364,6 +386,14 @@ class ConsumptionDailyMaxPower(Base):
     """Represents the ConsumptionDailyMaxPower class."""
 
     __tablename__ = "consumption_daily_max_power"
+    __table_args__: typing.ClassVar[tuple] = (
+        Index(
+            "ix_consumption_daily_max_power_usage_point_id_date",
+            "usage_point_id",
+            "date",
+            postgresql_include=["value"],
+        ),
+    )
 
     id = Column(String, primary_key=True, index=True, unique=True)
     usage_point_id = Column(Text, ForeignKey("usage_points.usage_point_id"), nullable=False, index=True)
@@ -440,3 +470,43 @@ class Ecowatt(Base):
             f"detail={self.detail!r}, "
             f")"
         )
+
+
+class MqttDigest(Base):
+    """Represents the digest of the last payload published on a MQTT topic."""
+
+    __tablename__ = "mqtt_digest"
+
+    topic = Column(Text, primary_key=True)
+    digest = Column(Text, nullable=False)
+    date = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        """Return the string representation of the MqttDigest object."""
+        return f"MqttDigest(topic={self.topic!r}, digest={self.digest!r}, date={self.date!r})"
+
+
+class Rollup(Base):
+    """Represents the sum of the measurements of a usage point over a day, week, month or year."""
+
+    __tablename__ = "rollup"
+
+    usage_point_id = Column(Text, ForeignKey("usage_points.usage_point_id"), primary_key=True)
+    measurement_direction = Column(Text, primary_key=True)
+    period = Column(Text, primary_key=True)
+    date = Column(DateTime, primary_key=True)
+    measure_type = Column(Text, primary_key=True)
+    value = Column(Float, nullable=False)
+
+    def __repr__(self):
+        """Return the string representation of the Rollup object."""
+        return (
+            f"Rollup("
+            f"usage_point_id={self.usage_point_id!r}, "
+            f"measurement_direction={self.measurement_direction!r}, "
+            f"period={self.period!r}, "
+            f"date={self.date!r}, "
+            f"measure_type={self.measure_type!r}, "
+            f"value={self.value!r}"
+            f")"
+        )
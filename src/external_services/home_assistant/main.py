@@ -25,11 +25,13 @@ from utils import convert_kw, convert_kw_to_euro, convert_price, get_version
 class HomeAssistant:  # pylint: disable=R0902
     """Represents a Home Assistant instance."""
 
-    def __init__(self, usage_point_id):
+    def __init__(self, usage_point_id, mqtt=None):
         self.usage_point_id = usage_point_id
         self.usage_point: UsagePointId = APP_CONFIG.myelectricaldata.usage_point_config[self.usage_point_id]
         self.contract: Contracts = DatabaseContracts(self.usage_point_id).get()
-        self.mqtt = Mqtt()
+        # A connection shared by the caller is left open, the MQTT client id allows a single connection at a time.
+        self.shared_mqtt = mqtt is not None
+        self.mqtt = mqtt if self.shared_mqtt else Mqtt()
         self.date_format = "%Y-%m-%d"
         self.date_format_detail = "%Y-%m-%d %H:%M:%S"
         self.tempo_color = None
@@ -806,7 +808,7 @@ class HomeAssistant:  # pylint: disable=R0902
 
     def cleanup(self):
         """Cleanup MQTT connection."""
-        if hasattr(self, "mqtt"):
+        if hasattr(self, "mqtt") and not self.shared_mqtt:
             self.mqtt.disconnect()
 
     def __del__(self):
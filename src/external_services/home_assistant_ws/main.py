@@ -5,7 +5,7 @@ import json
 import logging
 import ssl
 import traceback
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 import websocket
 
@@ -16,9 +16,29 @@ from database.config import DatabaseConfig
 from database.detail import DatabaseDetail
 from database.tempo import DatabaseTempo
 from database.usage_points import DatabaseUsagePoints
-from models.stat import Stat
+from models.offpeak import get_offpeak_calendar
+from models.tempo_calendar import TEMPO_CALENDAR
 from utils import chunks_list
 
+# Detail records read at once
+BATCH_SIZE = 1000
+# Suffix of the euro statistics, by measurement direction
+COST_SUFFIX = {"consumption": "cost", "production": "revenue"}
+
+
+def parse_start(start):
+    """Parse the start of a statistic returned by the recorder.
+
+    Args:
+        start (float | str): A timestamp in milliseconds (recent Home Assistant) or an ISO date.
+
+    Returns:
+        datetime: The start, timezone aware.
+    """
+    if isinstance(start, (int, float)):
+        return datetime.fromtimestamp(start / 1000, tz=timezone.utc)
+    return datetime.fromisoformat(start)
+
 
 class HomeAssistantWs:
     """Class to interact with Home Assistant WebSocket API."""
@@ -35,6 +55,8 @@ class HomeAssistantWs:
         self.id = 1
         self.purge_force = False
         self.current_stats = []
+        self.last_statistics = {}
+        self.pending = {}
         if self.connect():
             self.import_data()
         else:
@@ -91,7 +113,9 @@ class HomeAssistantWs:
             return False
 
     def send(self, data):
-        """Send data to the Home Assistant WebSocket server.
+        """Send data to the Home Assistant WebSocket server and wait for its answer.
+
+        The answers of the messages still in flight are received meanwhile.
 
         Args:
             data (dict): The data to send
@@ -99,14 +123,48 @@ class HomeAssistantWs:
             dict: The output from the server
         """
         with APP_CONFIG.tracer.start_as_current_span(f"{__name__}.{inspect.currentframe().f_code.co_name}"):
-            self.websocket.send(json.dumps(data))
-            self.id = self.id + 1
-            output = json.loads(self.websocket.recv())
-            if "type" in output and output["type"] == "result":
-                if not output["success"]:
-                    logging.error(f"Erreur d'envoi : {data}")
-                    logging.error(output)
-            return output
+            if "id" not in data:
+                self.websocket.send(json.dumps(data))
+                return json.loads(self.websocket.recv())
+            self.send_pipelined(data)
+            while True:
+                output = self.receive()
+                if output.get("id") == data["id"]:
+                    return output
+
+    def send_pipelined(self, data):
+        """Send data to the Home Assistant WebSocket server without waiting for its answer.
+
+        At most max_in_flight messages wait for their answer: once reached, the answers are received first.
+
+        Args:
+            data (dict): The data to send, with its id.
+        """
+        while len(self.pending) >= APP_CONFIG.home_assistant_ws.max_in_flight:
+            self.receive()
+        self.websocket.send(json.dumps(data))
+        self.id = self.id + 1
+        self.pending[data["id"]] = data
+
+    def receive(self):
+        """Receive a message from the Home Assistant WebSocket server, matching a result to its message by id.
+
+        Returns:
+            dict: The output from the server
+        """
+        output = json.loads(self.websocket.recv())
+        if "type" in output and output["type"] == "result":
+            data = self.pending.pop(output.get("id"), None)
+            if not output["success"]:
+                logging.error(f"Erreur d'envoi : {data}")
+                logging.error(output)
+        return output
+
+    def flush(self):
+        """Wait for the answers of all the messages in flight."""
+        with APP_CONFIG.tracer.start_as_current_span(f"{__name__}.{inspect.currentframe().f_code.co_name}"):
+            while self.pending:
+                self.receive()
 
     def list_data(self):
         """List the data already cached in Home Assistant.
@@ -149,13 +207,15 @@ class HomeAssistantWs:
             clear_stat = self.send(clear_statistics)
             return clear_stat
 
-    def get_data(self, statistic_ids, begin: datetime, end: datetime):
+    def get_data(self, statistic_ids, begin: datetime, end: datetime, period="hour"):
         """Get the data for a given period.
 
         Args:
             statistic_ids (list): The list of statistic ids
             begin (datetime): The start of the period
             end (datetime): The end of the period
+            period (str, optional): The period of the statistics. Defaults to "hour".
+
         Returns:
             dict: The data for the period
         """
@@ -165,344 +225,336 @@ class HomeAssistantWs:
                 "type": "recorder/statistics_during_period",
                 "start_time": begin.isoformat(),
                 "end_time": end.isoformat(),
-                "statistic_ids": [statistic_ids],
-                "period": "hour",
+                "statistic_ids": statistic_ids,
+                "period": period,
+                "types": ["sum"],
             }
             stat_period = self.send(statistics_during_period)
             return stat_period
 
-    def import_data(self):  # noqa: C901, PLR0915
+    def get_last_statistics(self, measurement_direction):
+        """Get the last hour imported in Home Assistant for each statistic of a measurement direction.
+
+        The recorder is first asked for the monthly sums since the oldest data, which gives the last month of each
+        statistic, then for the hourly sums of these months only.
+
+        Args:
+            measurement_direction (str): The measurement direction (consumption or production).
+
+        Returns:
+            dict: The (start, sum) of the last imported hour, by statistic id.
+        """
+        with APP_CONFIG.tracer.start_as_current_span(f"{__name__}.{inspect.currentframe().f_code.co_name}"):
+            if not self.current_stats:
+                self.list_data()
+            prefix = f"myelectricaldata:{self.usage_point_id}_"
+            statistic_ids = [
+                statistic_id
+                for statistic_id in self.current_stats
+                if statistic_id.startswith(prefix) and f"_{measurement_direction}" in statistic_id
+            ]
+            begin = DatabaseDetail(self.usage_point_id, measurement_direction).get_last_date()
+            if not statistic_ids or not begin:
+                return {}
+            end = datetime.now(tz=timezone.utc)
+            months = self.get_data(statistic_ids, TIMEZONE.localize(begin), end, "month").get("result") or {}
+            last_months = {}
+            for statistic_id, rows in months.items():
+                if rows:
+                    last_months.setdefault(parse_start(rows[-1]["start"]), []).append(statistic_id)
+            last_statistics = {}
+            for month, month_statistic_ids in last_months.items():
+                hours = self.get_data(month_statistic_ids, month, min(month + timedelta(days=32), end))
+                for statistic_id, rows in (hours.get("result") or {}).items():
+                    if rows:
+                        last_statistics[statistic_id] = (parse_start(rows[-1]["start"]), rows[-1]["sum"] or 0)
+            return last_statistics
+
+    def get_begin(self, measurement_direction):
+        """Prepare the import of a measurement direction and return the date to read the detail from.
+
+        In incremental mode, only the hours after the last one imported in Home Assistant are read. When a statistic
+        of the plan is not there yet (new Tempo color, plan change), the whole detail is read again: the statistics
+        already there only get their new hours and the missing ones are imported from their first hour.
+
+        Args:
+            measurement_direction (str): The measurement direction (consumption or production).
+
+        Returns:
+            datetime: The date to read the detail from, None for the whole history.
+        """
+        begin = None
+        max_date = APP_CONFIG.home_assistant_ws.max_date
+        if max_date is not None:
+            logging.warning("Max date détectée %s", max_date)
+            begin = TIMEZONE.localize(datetime.strptime(max_date, "%Y-%m-%d"))  # noqa: DTZ007
+        self.last_statistics = {}
+        if APP_CONFIG.home_assistant_ws.incremental and not (APP_CONFIG.home_assistant_ws.purge or self.purge_force):
+            self.last_statistics = self.get_last_statistics(measurement_direction)
+        if self.last_statistics:
+            cost_suffix = COST_SUFFIX[measurement_direction]
+            series = self.get_series(measurement_direction, self.get_plan(measurement_direction))
+            expected_ids = [
+                expected_id
+                for statistic_id, _, _ in series.values()
+                for expected_id in (statistic_id, f"{statistic_id}_{cost_suffix}")
+            ]
+            missing = [statistic_id for statistic_id in expected_ids if statistic_id not in self.last_statistics]
+            if missing:
+                logging.info(" => Nouvelles statistiques %s, lecture de tout l'historique", ", ".join(missing))
+                return begin
+            if expected_ids:
+                last_date = min(self.last_statistics[statistic_id][0] for statistic_id in expected_ids)
+                logging.info(" => Reprise de l'import après le %s", last_date.astimezone(TIMEZONE))
+                begin = last_date if begin is None else max(begin, last_date)
+        return begin
+
+    def get_plan(self, measurement_direction):
+        """Get the plan of a measurement direction, the production is always BASE.
+
+        Args:
+            measurement_direction (str): The measurement direction (consumption or production).
+
+        Returns:
+            str: The plan (BASE, HC/HP or TEMPO).
+        """
+        if measurement_direction == "consumption":
+            return DatabaseUsagePoints(self.usage_point_id).get_plan()
+        return "BASE"
+
+    def get_series(self, measurement_direction, plan):
+        """Get the statistics of a measurement direction, one for each tag (plan, HC/HP and Tempo color).
+
+        Args:
+            measurement_direction (str): The measurement direction (consumption or production).
+            plan (str): The plan of the usage point.
+
+        Returns:
+            dict: The (statistic id, name, price) by tag.
+        """
+        prefix = f"MyElectricalData - {self.usage_point_id}"
+        if measurement_direction == "production":
+            return {
+                "base": (
+                    f"myelectricaldata:{self.usage_point_id}_production",
+                    f"{prefix} production",
+                    self.usage_point_id_config.production_price,
+                )
+            }
+        if plan == "BASE":
+            prices = {"BASE": self.usage_point_id_config.consumption_price_base}
+        elif plan == "HC/HP":
+            prices = {
+                "HC": self.usage_point_id_config.consumption_price_hc,
+                "HP": self.usage_point_id_config.consumption_price_hp,
+            }
+        elif plan == "TEMPO":
+            db_tempo_price = DatabaseTempo().get_config("price")
+            prices = {
+                f"{color}{hour_type}": float(db_tempo_price[f"{color.lower()}_{hour_type.lower()}"])
+                for color in ("BLUE", "WHITE", "RED")
+                for hour_type in ("HC", "HP")
+            }
+        else:
+            logging.error(f"Plan {plan} inconnu.")
+            return {}
+        return {
+            label.lower(): (
+                f"myelectricaldata:{self.usage_point_id}_{label.lower()}_consumption",
+                f"{prefix} {label} consumption",
+                price,
+            )
+            for label, price in prices.items()
+        }
+
+    def get_tags(self, rows, plan, offpeak_calendar, missing_colors):
+        """Get the tag (plan, HC/HP and Tempo color) of a batch of detail rows.
+
+        Args:
+            rows (list): The detail rows, in date order.
+            plan (str): The plan of the usage point.
+            offpeak_calendar (OffpeakCalendar): The off-peak calendar of the usage point.
+            missing_colors (set): The days without Tempo color, filled in.
+
+        Returns:
+            list: The tags, None for the rows without Tempo color, in the same order as the rows.
+        """
+        if plan == "BASE":
+            return ["base"] * len(rows)
+        measure_types = offpeak_calendar.classify(row.date for row in rows)
+        if plan == "HC/HP":
+            return [measure_type.lower() for measure_type in measure_types]
+        days = [
+            row.date.date() - timedelta(days=1)
+            if row.date.hour * 100 + row.date.minute < TEMPO_BEGIN
+            else row.date.date()
+            for row in rows
+        ]
+        tags = []
+        for day, color, measure_type in zip(days, TEMPO_CALENDAR.get_colors(days), measure_types):
+            if color is None:
+                missing_colors.add(day)
+                tags.append(None)
+            else:
+                tags.append(f"{color}{measure_type}".lower())
+        return tags
+
+    def build_statistics(self, measurement_direction, begin=None):  # noqa: C901, PLR0915
+        """Build the hourly statistics of a measurement direction, in a single pass over the detail.
+
+        The detail is streamed in date order as (date, value, interval) rows and each batch is tagged at once. The
+        consecutive rows of a same hour and tag are summed, then the hour is appended to its kWh and euro statistics
+        with their running sums, which resume from the last sums imported in Home Assistant. In incremental mode,
+        the import stops at the first row without Tempo color, so that its hours are sent once the color is known.
+
+        Args:
+            measurement_direction (str): The measurement direction (consumption or production).
+            begin (datetime, optional): The date to read the detail from. Defaults to None.
+
+        Returns:
+            tuple: The kWh and euro statistics, by statistic id.
+        """
+        plan = self.get_plan(measurement_direction)
+        series = self.get_series(measurement_direction, plan)
+        cost_suffix = COST_SUFFIX[measurement_direction]
+        stats_kwh = {}
+        stats_euro = {}
+        last_hours = {
+            statistic_id: (start.astimezone(TIMEZONE).replace(tzinfo=None), total)
+            for statistic_id, (start, total) in self.last_statistics.items()
+        }
+
+        def append(stats, metadata, hour, start, value):
+            statistic_id, name, tag = metadata
+            last_hour = last_hours.get(statistic_id)
+            if last_hour is not None and hour <= last_hour[0]:
+                return
+            if statistic_id not in stats:
+                total = 0 if last_hour is None else last_hour[1]
+                stats[statistic_id] = {"name": name, "tag": tag, "sum": total, "hour": None, "data": []}
+            statistic = stats[statistic_id]
+            statistic["sum"] += value
+            if statistic["hour"] == hour:
+                statistic["data"][-1]["state"] += value
+                statistic["data"][-1]["sum"] = statistic["sum"]
+            else:
+                statistic["hour"] = hour
+                statistic["data"].append({"start": start, "state": value, "sum": statistic["sum"]})
+
+        def hour_start(hour):
+            # The UTC offset only changes on the DST days: it is computed once for the other days.
+            day = hour.date()
+            if day not in offsets:
+                first = TIMEZONE.localize(datetime.combine(day, datetime.min.time())).isoformat()[19:]
+                last = TIMEZONE.localize(datetime.combine(day, datetime.max.time())).isoformat()[26:]
+                offsets[day] = first if first == last else None
+            if offsets[day] is None:
+                return TIMEZONE.localize(hour).isoformat()
+            return f"{hour.isoformat()}{offsets[day]}"
+
+        def flush(tag, hour, kwh):
+            statistic_id, name, price = series[tag]
+            start = hour_start(hour)
+            append(stats_kwh, (statistic_id, name, tag), hour, start, kwh)
+            euro = (f"{statistic_id}_{cost_suffix}", f"{name} {cost_suffix.capitalize()}", tag)
+            append(stats_euro, euro, hour, start, kwh * price)
+
+        if not series:
+            return stats_kwh, stats_euro
+        offpeak_calendar = get_offpeak_calendar(
+            tuple(getattr(self.usage_point_id_config, f"offpeak_hours_{weekday}") for weekday in range(0, 7))
+        )
+        missing_colors = set()
+        offsets = {}
+        current = None
+        kwh = 0
+        detail = DatabaseDetail(self.usage_point_id, measurement_direction)
+        stop = False
+        for rows in detail.get_batches(BATCH_SIZE, begin):
+            for row, tag in zip(rows, self.get_tags(rows, plan, offpeak_calendar, missing_colors)):
+                if tag is None:
+                    stop = APP_CONFIG.home_assistant_ws.incremental
+                    if stop:
+                        break
+                    continue
+                key = (tag, row.date.replace(minute=0, second=0, microsecond=0))
+                if key != current:
+                    if current is not None:
+                        flush(*current, kwh)
+                    current = key
+                    kwh = 0
+                kwh += row.value / (60 / (row.interval or 1)) / 1000
+            if stop:
+                break
+        if current is not None:
+            flush(*current, kwh)
+        for day in sorted(missing_colors):
+            logging.error(f"Import impossible, pas de donnée tempo sur la date du {day}")
+        return stats_kwh, stats_euro
+
+    def import_statistics(self, statistic_id, statistic, unit_of_measurement):
+        """Send the hours of a statistic to the recorder, in chunks of batch_size hours.
+
+        Args:
+            statistic_id (str): The statistic id.
+            statistic (dict): The statistic built by build_statistics.
+            unit_of_measurement (str): The unit of the statistic.
+        """
+        metadata = {
+            "has_mean": False,
+            "has_sum": True,
+            "name": statistic["name"],
+            "source": "myelectricaldata",
+            "statistic_id": statistic_id,
+            "unit_of_measurement": unit_of_measurement,
+        }
+        chunks = list(chunks_list(statistic["data"], APP_CONFIG.home_assistant_ws.batch_size))
+        for i, chunk in enumerate(chunks):
+            logging.info(
+                "   * %s : %s => %s (%s/%s) ",
+                statistic["tag"].upper(),
+                chunk[0]["start"],
+                chunk[-1]["start"],
+                i + 1,
+                len(chunks),
+            )
+            self.send_pipelined(
+                {
+                    "id": self.id,
+                    "type": "recorder/import_statistics",
+                    "metadata": metadata,
+                    "stats": chunk,
+                }
+            )
+
+    def import_data(self):
         """Import the data for the usage point into Home Assistant."""
         with APP_CONFIG.tracer.start_as_current_span(f"{__name__}.{inspect.currentframe().f_code.co_name}"):
             logging.info(f"Point de livraison : {self.usage_point_id}")
             try:
-                plan = DatabaseUsagePoints(self.usage_point_id).get_plan()
-                if self.usage_point_id_config.consumption_detail:
-                    logging.info(" => Préparation des données de consommation...")
-                    measurement_direction = "consumption"
-                    max_date = APP_CONFIG.home_assistant_ws.max_date
-                    if max_date is not None:
-                        logging.warning("Max date détectée %s", max_date)
-                        begin = datetime.strptime(max_date, "%Y-%m-%d").replace(tzinfo=TIMEZONE)
-                        detail = DatabaseDetail(self.usage_point_id).get_all(begin=begin, order_dir="desc")
-                    else:
-                        detail = DatabaseDetail(self.usage_point_id).get_all(order_dir="desc")
-
-                    cost = 0
-                    last_year = None
-                    last_month = None
-
-                    stats_kwh = {}
-                    stats_euro = {}
-
-                    db_tempo_price = DatabaseTempo().get_config("price")
-                    tempo_color_ref = {}
-                    for tempo_data in DatabaseTempo().get():
-                        tempo_color_ref[tempo_data.date] = tempo_data.color
-
-                    stats = Stat(usage_point_id=self.usage_point_id, measurement_direction="consumption")
-
-                    for data in detail:
-                        year = int(f"{data.date.strftime('%Y')}")
-                        if last_year is None or year != last_year:
-                            logging.info(f"  - {year} :")
-                        month = int(f"{data.date.strftime('%m')}")
-                        if last_month is None or month != last_month:
-                            logging.info(f"    * {month}")
-                        last_year = year
-                        last_month = month
-                        hour_minute = int(f"{data.date.strftime('%H')}{data.date.strftime('%M')}")
-                        name = f"MyElectricalData - {self.usage_point_id}"
-                        statistic_id = f"myelectricaldata:{self.usage_point_id}"
-                        day_interval = data.interval if hasattr(data, "interval") and data.interval != 0 else 1
-                        value = data.value / (60 / day_interval)
-                        tag = None
-                        if plan == "BASE":
-                            name = f"{name} {plan} {measurement_direction}"
-                            statistic_id = f"{statistic_id}_{plan.lower()}_{measurement_direction}"
-                            cost = value * self.usage_point_id_config.consumption_price_base / 1000
-                            tag = "base"
-                        elif plan == "HC/HP":
-                            measure_type = stats.get_mesure_type(data.date)
-                            if measure_type == "HC":
-                                name = f"{name} HC {measurement_direction}"
-                                statistic_id = f"{statistic_id}_hc_{measurement_direction}"
-                                cost = value * self.usage_point_id_config.consumption_price_hc / 1000
-                                tag = "hc"
-                            else:
-                                name = f"{name} HP {measurement_direction}"
-                                statistic_id = f"{statistic_id}_hp_{measurement_direction}"
-                                cost = value * self.usage_point_id_config.consumption_price_hp / 1000
-                                tag = "hp"
-                        elif plan.upper() == "TEMPO":
-                            hour_type = stats.get_mesure_type(data.date)
-                            max_time = 2359
-                            if TEMPO_BEGIN <= hour_minute <= max_time:
-                                date = datetime.combine(data.date, datetime.min.time())
-                            else:
-                                date = datetime.combine(data.date - timedelta(days=1), datetime.min.time())
-
-                            if date not in tempo_color_ref:
-                                logging.error(f"Import impossible, pas de donnée tempo sur la date du {data.date}")
-                            else:
-                                day_color = tempo_color_ref[date]
-                                tempo_color = f"{day_color}{hour_type}"
-                                tempo_color_price_key = f"{day_color.lower()}_{hour_type.lower()}"
-                                tempo_price = float(db_tempo_price[tempo_color_price_key])
-                                cost = value / 1000 * tempo_price
-                                name = f"{name} {tempo_color} {measurement_direction}"
-                                statistic_id = f"{statistic_id}_{tempo_color.lower()}_{measurement_direction}"
-                                tag = tempo_color.lower()
-                        else:
-                            logging.error(f"Plan {plan} inconnu.")
-
-                        date = TIMEZONE.localize(data.date, "%Y-%m-%d %H:%M:%S")
-                        date = date.replace(minute=0, second=0, microsecond=0)
-                        key = date.strftime("%Y-%m-%d %H:%M:%S")
-
-                        # KWH
-                        if statistic_id not in stats_kwh:
-                            stats_kwh[statistic_id] = {"name": name, "sum": 0, "data": {}}
-                        if key not in stats_kwh[statistic_id]["data"]:
-                            stats_kwh[statistic_id]["data"][key] = {
-                                "start": date.isoformat(),
-                                "state": 0,
-                                "sum": 0,
-                            }
-                        value = value / 1000
-                        stats_kwh[statistic_id]["data"][key]["state"] = (
-                            stats_kwh[statistic_id]["data"][key]["state"] + value
-                        )
-                        stats_kwh[statistic_id]["tag"] = tag
-                        stats_kwh[statistic_id]["sum"] += value
-                        stats_kwh[statistic_id]["data"][key]["sum"] = stats_kwh[statistic_id]["sum"]
-
-                        # EURO
-                        statistic_id = f"{statistic_id}_cost"
-                        if statistic_id not in stats_euro:
-                            stats_euro[statistic_id] = {
-                                "name": f"{name} Cost",
-                                "sum": 0,
-                                "data": {},
-                            }
-                        if key not in stats_euro[statistic_id]["data"]:
-                            stats_euro[statistic_id]["data"][key] = {
-                                "start": date.isoformat(),
-                                "state": 0,
-                                "sum": 0,
-                            }
-                        stats_euro[statistic_id]["tag"] = tag
-                        stats_euro[statistic_id]["data"][key]["state"] += cost
-                        stats_euro[statistic_id]["sum"] += cost
-                        stats_euro[statistic_id]["data"][key]["sum"] = stats_euro[statistic_id]["sum"]
+                for measurement_direction, label in (("consumption", "Consommation"), ("production", "Production")):
+                    if not getattr(self.usage_point_id_config, f"{measurement_direction}_detail"):
+                        continue
+                    logging.info(f" => Préparation des données de {label.lower()}...")
+                    begin = self.get_begin(measurement_direction)
+                    stats_kwh, stats_euro = self.build_statistics(measurement_direction, begin)
 
                     # CLEAN OLD DATA
                     if APP_CONFIG.home_assistant_ws.purge or self.purge_force:
                         logging.info(f"Clean old data import In Home Assistant Recorder {self.usage_point_id}")
-                        list_statistic_ids = []
-                        for statistic_id, _ in stats_kwh.items():
-                            list_statistic_ids.append(statistic_id)
-                        self.clear_data(list_statistic_ids)
+                        self.clear_data(list(stats_kwh))
                         APP_CONFIG.home_assistant_ws.purge = False
                         DatabaseConfig().set("purge", False)
 
                     logging.info(" => Envoie des données...")
-                    logging.info(" - Consommation :")
+                    logging.info(f" - {label} :")
                     for statistic_id, data in stats_kwh.items():
-                        metadata = {
-                            "has_mean": False,
-                            "has_sum": True,
-                            "name": data["name"],
-                            "source": "myelectricaldata",
-                            "statistic_id": statistic_id,
-                            "unit_of_measurement": "kWh",
-                        }
-                        chunks = list(
-                            chunks_list(list(data["data"].values()), APP_CONFIG.home_assistant_ws.batch_size)
-                        )
-                        chunks_len = len(chunks)
-                        for i, chunk in enumerate(chunks):
-                            current_plan = data["tag"].upper()
-                            logging.info(
-                                "   * %s : %s => %s (%s/%s) ",
-                                current_plan,
-                                chunk[-1]["start"],
-                                chunk[0]["start"],
-                                i + 1,
-                                chunks_len,
-                            )
-                            self.send(
-                                {
-                                    "id": self.id,
-                                    "type": "recorder/import_statistics",
-                                    "metadata": metadata,
-                                    "stats": chunk,
-                                }
-                            )
-
-                    logging.info(" - Coût :")
+                        self.import_statistics(statistic_id, data, "kWh")
+                    logging.info(" - Coût :" if measurement_direction == "consumption" else " - Revenus :")
                     for statistic_id, data in stats_euro.items():
-                        metadata = {
-                            "has_mean": False,
-                            "has_sum": True,
-                            "name": data["name"],
-                            "source": "myelectricaldata",
-                            "statistic_id": statistic_id,
-                            "unit_of_measurement": "EURO",
-                        }
-                        chunks = list(
-                            chunks_list(list(data["data"].values()), APP_CONFIG.home_assistant_ws.batch_size)
-                        )
-                        chunks_len = len(chunks)
-                        for i, chunk in enumerate(chunks):
-                            current_plan = data["tag"].upper()
-                            logging.info(
-                                "   * %s : %s => %s (%s/%s) ",
-                                current_plan,
-                                chunk[-1]["start"],
-                                chunk[0]["start"],
-                                i + 1,
-                                chunks_len,
-                            )
-                            self.send(
-                                {
-                                    "id": self.id,
-                                    "type": "recorder/import_statistics",
-                                    "metadata": metadata,
-                                    "stats": list(chunk),
-                                }
-                            )
-
-                if self.usage_point_id_config.production_detail:
-                    logging.info(" => Préparation des données de production...")
-                    measurement_direction = "production"
-                    max_date = APP_CONFIG.home_assistant_ws.max_date
-                    if max_date is not None:
-                        logging.warning("Max date détectée %s", max_date)
-                        begin = datetime.strptime(max_date, "%Y-%m-%d").replace(tzinfo=TIMEZONE)
-                        detail = DatabaseDetail(self.usage_point_id, "production")
-                        detail = detail.get_all(begin=begin, order_dir="desc")
-                    else:
-                        detail = DatabaseDetail(self.usage_point_id, "production").get_all(order_dir="desc")
-
-                    cost = 0
-                    last_year = None
-                    last_month = None
-
-                    stats_kwh = {}
-                    stats_euro = {}
-                    for data in detail:
-                        year = int(f"{data.date.strftime('%Y')}")
-                        if last_year is None or year != last_year:
-                            logging.info(f"{year} :")
-                        month = int(f"{data.date.strftime('%m')}")
-                        if last_month is None or month != last_month:
-                            logging.info(f"- {month}")
-                        last_year = year
-                        last_month = month
-                        hour_minute = int(f"{data.date.strftime('%H')}{data.date.strftime('%M')}")
-                        name = f"MyElectricalData - {self.usage_point_id} {measurement_direction}"
-                        statistic_id = f"myelectricaldata:{self.usage_point_id}_{measurement_direction}"
-                        day_interval = data.interval if hasattr(data, "interval") and data.interval != 0 else 1
-                        value = data.value / (60 / day_interval)
-                        cost = value * self.usage_point_id_config.production_price / 1000
-                        date = TIMEZONE.localize(data.date, "%Y-%m-%d %H:%M:%S")
-                        date = date.replace(minute=0, second=0, microsecond=0)
-                        key = date.strftime("%Y-%m-%d %H:%M:%S")
-
-                        # KWH
-                        if statistic_id not in stats_kwh:
-                            stats_kwh[statistic_id] = {"name": name, "sum": 0, "data": {}}
-                        if key not in stats_kwh[statistic_id]["data"]:
-                            stats_kwh[statistic_id]["data"][key] = {
-                                "start": date.isoformat(),
-                                "state": 0,
-                                "sum": 0,
-                            }
-                        value = value / 1000
-                        stats_kwh[statistic_id]["data"][key]["state"] = (
-                            stats_kwh[statistic_id]["data"][key]["state"] + value
-                        )
-                        stats_kwh[statistic_id]["sum"] += value
-                        stats_kwh[statistic_id]["data"][key]["sum"] = stats_kwh[statistic_id]["sum"]
-
-                        # EURO
-                        statistic_id = f"{statistic_id}_revenue"
-                        if statistic_id not in stats_euro:
-                            stats_euro[statistic_id] = {
-                                "name": f"{name} Revenue",
-                                "sum": 0,
-                                "data": {},
-                            }
-                        if key not in stats_euro[statistic_id]["data"]:
-                            stats_euro[statistic_id]["data"][key] = {
-                                "start": date.isoformat(),
-                                "state": 0,
-                                "sum": 0,
-                            }
-                        stats_euro[statistic_id]["data"][key]["state"] += cost
-                        stats_euro[statistic_id]["sum"] += cost
-                        stats_euro[statistic_id]["data"][key]["sum"] = stats_euro[statistic_id]["sum"]
+                        self.import_statistics(statistic_id, data, "EURO")
 
-                    if APP_CONFIG.home_assistant_ws.purge or self.purge_force:
-                        list_statistic_ids = []
-                        for statistic_id, _ in stats_kwh.items():
-                            list_statistic_ids.append(statistic_id)
-                        self.clear_data(list_statistic_ids)
-                        APP_CONFIG.home_assistant_ws.purge = False
-                        DatabaseConfig().set("purge", False)
-
-                    logging.info(" => Envoie des données de production...")
-                    logging.info(" - Production :")
-
-                    for statistic_id, data in stats_kwh.items():
-                        metadata = {
-                            "has_mean": False,
-                            "has_sum": True,
-                            "name": data["name"],
-                            "source": "myelectricaldata",
-                            "statistic_id": statistic_id,
-                            "unit_of_measurement": "kWh",
-                        }
-                        chunks = list(
-                            chunks_list(list(data["data"].values()), APP_CONFIG.home_assistant_ws.batch_size)
-                        )
-                        chunks_len = len(chunks)
-                        for i, chunk in enumerate(chunks):
-                            current_plan = data["tag"].upper()
-                            logging.info(
-                                "   * %s : %s => %s (%s/%s) ",
-                                current_plan,
-                                chunk[-1]["start"],
-                                chunk[0]["start"],
-                                i + 1,
-                                chunks_len,
-                            )
-                            self.send(
-                                {
-                                    "id": self.id,
-                                    "type": "recorder/import_statistics",
-                                    "metadata": metadata,
-                                    "stats": chunk,
-                                }
-                            )
-
-                    for statistic_id, data in stats_euro.items():
-                        metadata = {
-                            "has_mean": False,
-                            "has_sum": True,
-                            "name": data["name"],
-                            "source": "myelectricaldata",
-                            "statistic_id": statistic_id,
-                            "unit_of_measurement": "EURO",
-                        }
-                        import_statistics = {
-                            "id": self.id,
-                            "type": "recorder/import_statistics",
-                            "metadata": metadata,
-                            "stats": list(data["data"].values()),
-                        }
-                        self.send(import_statistics)
+                self.flush()
 
             except Exception as _e:
                 self.websocket.close()
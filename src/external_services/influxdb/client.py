@@ -11,6 +11,7 @@ from influxdb_client.client.write_api import ASYNCHRONOUS, SYNCHRONOUS
 
 from config.main import APP_CONFIG
 from const import TIMEZONE_UTC, URL_CONFIG_FILE
+from database.statistique import DatabaseStatistique
 from utils import separator, separator_warning, title
 
 
@@ -114,6 +115,9 @@ class InfluxDB:
                 self.delete_api.delete(
                     start, stop, f'_measurement="{mesure}"', APP_CONFIG.influxdb.bucket, org=APP_CONFIG.influxdb.org
                 )
+                # The next export has to send everything again.
+                for usage_point_id in APP_CONFIG.myelectricaldata.usage_point_config:
+                    DatabaseStatistique(usage_point_id).delete(f"influxdb_{mesure}_state")
             logging.warning(" => Data reset")
 
     def get_list_retention_policies(self):
@@ -234,3 +238,16 @@ class InfluxDB:
                     for key, value in fields.items():
                         record["fields"][key] = value
                 self.write_api.write(bucket=APP_CONFIG.influxdb.bucket, org=APP_CONFIG.influxdb.org, record=record)
+
+    def write_batch(self, records):
+        """Write a batch of records to the InfluxDB database with a single write call.
+
+        Args:
+            records (list): The records, as dictionaries with the measurement, time, tags and fields keys.
+        """
+        with APP_CONFIG.tracer.start_as_current_span(f"{__name__}.{inspect.currentframe().f_code.co_name}"):
+            if self.retention != 0:
+                date_max = self.max_retention.replace(tzinfo=None)
+                records = [record for record in records if record["time"].replace(tzinfo=None) > date_max]
+            if records:
+                self.write_api.write(bucket=APP_CONFIG.influxdb.bucket, org=APP_CONFIG.influxdb.org, record=records)
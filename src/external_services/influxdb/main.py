@@ -1,18 +1,22 @@
 """Class for exporting data to InfluxDB."""
 import ast
+import calendar
 import inspect
+import json
 import logging
 import traceback
-from datetime import datetime
+from datetime import date, datetime, timedelta
 
 import pytz
 
+from config.influxdb import Method
 from config.main import APP_CONFIG
 from config.myelectricaldata import UsagePointId
-from const import TIMEZONE_UTC
+from const import TIMEZONE, TIMEZONE_UTC
 from database.daily import DatabaseDaily
 from database.detail import DatabaseDetail
 from database.ecowatt import DatabaseEcowatt
+from database.statistique import DatabaseStatistique
 from database.tempo import DatabaseTempo
 from external_services.influxdb.client import InfluxDB
 from models.stat import Stat
@@ -67,54 +71,59 @@ class ExportInfluxDB:
             measurement_direction (str, optional): The measurement direction. Defaults to "consumption".
         """
         with APP_CONFIG.tracer.start_as_current_span(f"{__name__}.{inspect.currentframe().f_code.co_name}"):
-            current_month = ""
             if measurement_direction == "consumption":
                 price = self.usage_point_config.consumption_price_base
             else:
                 price = self.usage_point_config.production_price
             logging.info(f'Envoi des données "{measurement_direction.upper()}" dans influxdb')
-            get_daily_all = DatabaseDaily(self.usage_point_id).get_all()
-            get_daily_all_count = len(get_daily_all)
-            last_data = DatabaseDaily(self.usage_point_id, measurement_direction).get_last_date()
-            first_data = DatabaseDaily(self.usage_point_id, measurement_direction).get_first_date()
-            if last_data and first_data:
-                start = datetime.strftime(last_data, self.time_format)
-                end = datetime.strftime(first_data, self.time_format)
-                influxdb_data = self.influxdb_client.count(start, end, measurement_direction)
-                count = 1
-                for data in influxdb_data:
-                    for record in data.records:
-                        count += record.get_value()
-                if get_daily_all_count != count:
-                    logging.info(f" Cache : {get_daily_all_count} / InfluxDb : {count}")
-                    for daily in get_daily_all:
-                        date = daily.date
-                        if current_month != date.strftime("%m"):
-                            logging.info(f" - {date.strftime('%Y')}-{date.strftime('%m')}")
-                        # if len(INFLUXDB.get(start, end, measurement_direction)) == 0:
-                        watt = daily.value
-                        kwatt = watt / 1000
-                        euro = kwatt * price
-                        self.influxdb_client.write(
-                            measurement=measurement_direction,
-                            date=self.tz.localize(date),
-                            tags={
-                                "usage_point_id": self.usage_point_id,
-                                "year": daily.date.strftime("%Y"),
-                                "month": daily.date.strftime("%m"),
-                            },
-                            fields={
-                                "Wh": float(watt),
-                                "kWh": float(force_round(kwatt, 5)),
-                                "price": float(force_round(euro, 5)),
-                            },
-                        )
-                        current_month = date.strftime("%m")
-                    logging.info(" => OK")
-                else:
-                    logging.info(f" => Données synchronisées ({count} valeurs)")
-            else:
+            database_daily = DatabaseDaily(self.usage_point_id, measurement_direction)
+            count = database_daily.get_count()
+            if not count:
                 logging.info(" => Aucune donnée")
+                return
+            if self.sync(
+                measurement_direction,
+                database_daily,
+                {"price": price},
+                lambda rows: self.daily_records(rows, measurement_direction, price),
+            ):
+                logging.info(" => OK")
+            else:
+                logging.info(f" => Données synchronisées ({count} valeurs)")
+
+    def daily_records(self, rows, measurement_direction, price):
+        """Build the InfluxDB records of a batch of daily rows.
+
+        Args:
+            rows (list): The daily rows (date, value).
+            measurement_direction (str): The measurement direction.
+            price (float): The price of a kWh.
+
+        Returns:
+            list: The records.
+        """
+        records = []
+        for daily in rows:
+            watt = daily.value
+            kwatt = watt / 1000
+            euro = kwatt * price
+            records.append(
+                {
+                    "measurement": measurement_direction,
+                    "time": self.tz.localize(daily.date),
+                    "tags": {
+                        "usage_point_id": self.usage_point_id,
+                        "year": daily.date.strftime("%Y"),
+                        "month": daily.date.strftime("%m"),
+                    },
+                    "fields": {
+                        "Wh": float(watt),
+                        "kWh": float(force_round(kwatt, 5)),
+                        "price": float(force_round(euro, 5)),
+                    },
+                }
+            )
+        return records
 
     def detail(self, measurement_direction="consumption"):
         """Export detailed data to InfluxDB.
@@ -123,67 +132,145 @@ class ExportInfluxDB:
             measurement_direction (str, optional): The measurement direction. Defaults to "consumption".
         """
         with APP_CONFIG.tracer.start_as_current_span(f"{__name__}.{inspect.currentframe().f_code.co_name}"):
-            current_month = ""
             measurement = f"{measurement_direction}_detail"
             logging.info(f'Envoi des données "{measurement.upper()}" dans influxdb')
-            get_detail_all = DatabaseDetail(self.usage_point_id, measurement_direction).get_all()
-            get_detail_all_count = len(get_detail_all)
-            last_data = DatabaseDetail(self.usage_point_id, measurement_direction).get_last_date()
-            first_data = DatabaseDetail(self.usage_point_id, measurement_direction).get_first_date()
-            if last_data and first_data:
-                start = datetime.strftime(last_data, self.time_format)
-                end = datetime.strftime(first_data, self.time_format)
-                influxdb_data = self.influxdb_client.count(start, end, measurement)
-                count = 1
-                for data in influxdb_data:
-                    for record in data.records:
-                        count += record.get_value()
-
-                if get_detail_all_count != count:
-                    logging.info(f" Cache : {get_detail_all_count} / InfluxDb : {count}")
-                    for _, detail in enumerate(get_detail_all):
-                        date = detail.date
-                        if current_month != date.strftime("%m"):
-                            logging.info(f" - {date.strftime('%Y')}-{date.strftime('%m')}")
-                        watt = detail.value
-                        kwatt = watt / 1000
-                        interval = getattr(detail, "interval", 1)
-                        interval = 1 if interval == 0 else interval
-                        watth = watt / (60 / interval)
-                        kwatth = watth / 1000
-                        if measurement_direction == "consumption":
-                            measure_type = self.stat.get_mesure_type(date)
-                            if measure_type == "HP":
-                                euro = kwatth * self.usage_point_config.consumption_price_hp
-                            else:
-                                euro = kwatth * self.usage_point_config.consumption_price_hc
-                        else:
-                            measure_type = "BASE"
-                            euro = kwatth * self.usage_point_config.production_price
-                        self.influxdb_client.write(
-                            measurement=measurement,
-                            date=self.tz.localize(date),
-                            tags={
-                                "usage_point_id": self.usage_point_id,
-                                "year": detail.date.strftime("%Y"),
-                                "month": detail.date.strftime("%m"),
-                                "internal": interval,
-                                "measure_type": measure_type,
-                            },
-                            fields={
-                                "W": float(watt),
-                                "kW": float(force_round(kwatt, 5)),
-                                "Wh": float(watth),
-                                "kWh": float(force_round(kwatth, 5)),
-                                "price": float(force_round(euro, 5)),
-                            },
-                        )
-                        current_month = date.strftime("%m")
-                    logging.info(" => OK")
+            database_detail = DatabaseDetail(self.usage_point_id, measurement_direction)
+            count = database_detail.get_count()
+            if not count:
+                logging.info(" => Aucune donnée")
+                return
+            if measurement_direction == "consumption":
+                settings = {
+                    "price_hp": self.usage_point_config.consumption_price_hp,
+                    "price_hc": self.usage_point_config.consumption_price_hc,
+                    "offpeak_hours": [getattr(self.usage_point_config, f"offpeak_hours_{day}") for day in range(7)],
+                }
+            else:
+                settings = {"price": self.usage_point_config.production_price}
+            if self.sync(
+                measurement,
+                database_detail,
+                settings,
+                lambda rows: self.detail_records(rows, measurement_direction),
+            ):
+                logging.info(" => OK")
+            else:
+                logging.info(f" => Données synchronisées ({count} valeurs)")
+
+    def detail_records(self, rows, measurement_direction):
+        """Build the InfluxDB records of a batch of detail rows.
+
+        Args:
+            rows (list): The detail rows (date, value, interval).
+            measurement_direction (str): The measurement direction.
+
+        Returns:
+            list: The records.
+        """
+        measurement = f"{measurement_direction}_detail"
+        price_hp = self.usage_point_config.consumption_price_hp
+        price_hc = self.usage_point_config.consumption_price_hc
+        price = self.usage_point_config.production_price
+        records = []
+        measure_types = self.stat.get_mesure_types(row.date for row in rows)
+        for detail, hc_hp in zip(rows, measure_types):
+            date = detail.date
+            watt = detail.value
+            kwatt = watt / 1000
+            interval = 1 if detail.interval == 0 else detail.interval
+            watth = watt / (60 / interval)
+            kwatth = watth / 1000
+            if measurement_direction == "consumption":
+                measure_type = hc_hp
+                if measure_type == "HP":
+                    euro = kwatth * price_hp
                 else:
-                    logging.info(f" => Données synchronisées ({count} valeurs)")
+                    euro = kwatth * price_hc
             else:
-                logging.info(" => Aucune donnée")
+                measure_type = "BASE"
+                euro = kwatth * price
+            records.append(
+                {
+                    "measurement": measurement,
+                    "time": self.tz.localize(date),
+                    "tags": {
+                        "usage_point_id": self.usage_point_id,
+                        "year": date.strftime("%Y"),
+                        "month": date.strftime("%m"),
+                        "internal": interval,
+                        "measure_type": measure_type,
+                    },
+                    "fields": {
+                        "W": float(watt),
+                        "kW": float(force_round(kwatt, 5)),
+                        "Wh": float(watth),
+                        "kWh": float(force_round(kwatth, 5)),
+                        "price": float(force_round(euro, 5)),
+                    },
+                }
+            )
+        return records
+
+    def sync(self, measurement, database, settings, build_records):
+        """Export the records changed since the last export of a measurement.
+
+        The export state (statistique table) keeps the number of records, the sum of the values and the last date
+        exported of each month. Unchanged months are skipped, a month whose exported records are unchanged only gets
+        the records added after its last date, any other month is sent again. A change of the settings or of the
+        InfluxDB target sends everything again.
+
+        The state is only saved with the synchronous method: the asynchronous and batching methods report the write
+        errors in the background, so a month sent with them is never recorded as exported and is sent again on the
+        next export.
+
+        Args:
+            measurement (str): The InfluxDB measurement.
+            database (DatabaseDaily | DatabaseDetail): The records of the measurement.
+            settings (dict): The settings the records depend on (prices, off-peak hours).
+            build_records (callable): Called with a batch of rows to build their InfluxDB records.
+
+        Returns:
+            int: The number of months exported.
+        """
+        state_key = f"influxdb_{measurement}_state"
+        target = {
+            "url": f"{APP_CONFIG.influxdb.hostname}:{APP_CONFIG.influxdb.port}",
+            "org": APP_CONFIG.influxdb.org,
+            "bucket": APP_CONFIG.influxdb.bucket,
+            "timezone": str(self.tz),
+        }
+        settings = json.dumps({**settings, **target}, sort_keys=True, default=str)
+        statistique = DatabaseStatistique(self.usage_point_id)
+        state = statistique.get(state_key)
+        state = json.loads(state[0].value) if state else {}
+        months = state.get("months", {}) if state.get("settings") == settings else {}
+        batch_size = APP_CONFIG.influxdb.batching_options.batch_size
+        synchronous = APP_CONFIG.influxdb.method.lower() == Method().synchronous
+        exported = 0
+        for (year, month), (count, total, last_date) in sorted(database.get_month_signature().items()):
+            month_key = f"{year}-{month:02d}"
+            signature = {"count": count, "sum": int(total), "last_date": last_date.isoformat()}
+            cached = months.get(month_key)
+            if cached == signature:
+                continue
+            logging.info(f" - {month_key}")
+            begin = TIMEZONE.localize(datetime.combine(date(year, month, 1), datetime.min.time()))
+            end = TIMEZONE.localize(
+                datetime.combine(date(year, month, calendar.monthrange(year, month)[1]), datetime.max.time())
+            )
+            if cached is not None:
+                # Only send the records added since the last export if the exported ones are unchanged.
+                cached_last_date = TIMEZONE.localize(datetime.fromisoformat(cached["last_date"]))
+                previous = database.get_month_signature(begin, cached_last_date).get((year, month), (0, 0))
+                if previous[:2] == (cached["count"], cached["sum"]):
+                    begin = cached_last_date + timedelta(seconds=1)
+            for rows in database.get_batches(batch_size, begin, end):
+                self.influxdb_client.write_batch(build_records(rows))
+            if synchronous:
+                months[month_key] = signature
+                statistique.set(state_key, json.dumps({"settings": settings, "months": months}))
+            exported += 1
+        return exported
 
     def tempo(self):
         """Export tempo data to InfluxDB."""
@@ -1,13 +1,18 @@
 """MQTT Client."""
 
+import hashlib
 import inspect
 import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
 
 from paho.mqtt import client as mqtt
-from paho.mqtt import publish
 
 from config.main import APP_CONFIG
-from const import URL_CONFIG_FILE
+from const import MQTT_MAX_INFLIGHT, MQTT_PUBLISH_TIMEOUT, TIMEZONE, URL_CONFIG_FILE
+from database.mqtt import DatabaseMqtt
 from utils import separator
 
 
@@ -17,6 +22,8 @@ class Mqtt:
     def __init__(self):
         self.client: mqtt.Client = {}
         self.valid: bool = False
+        self.connected = threading.Event()
+        self.digests = None
         self.connect()
 
     def connect(self) -> None:
@@ -31,8 +38,14 @@ class Mqtt:
                 if APP_CONFIG.mqtt.cert:
                     logging.info(f"Using ca_cert: {APP_CONFIG.mqtt.cert}")
                     self.client.tls_set(ca_certs=APP_CONFIG.mqtt.cert)
+                self.client.max_inflight_messages_set(MQTT_MAX_INFLIGHT)
+                self.client.on_connect = self.on_connect
                 self.client.connect(APP_CONFIG.mqtt.hostname, APP_CONFIG.mqtt.port)
                 self.client.loop_start()
+                # Messages published before the broker acknowledged the connection would be dropped (QoS 0).
+                if not self.connected.wait(MQTT_PUBLISH_TIMEOUT):
+                    self.client.loop_stop()
+                    raise ConnectionError("MQTT broker connection timeout")
                 self.valid = True
                 logging.info(" => Connection success")
             except Exception:
@@ -45,6 +58,13 @@ class Mqtt:
 """
                 )
 
+    def on_connect(self, client, userdata, flags, rc):
+        """Flag the connection as established once the broker accepted it."""
+        if rc == mqtt.MQTT_ERR_SUCCESS:
+            self.connected.set()
+        else:
+            logging.error(f"Connexion MQTT refusée : {mqtt.connack_string(rc)}")
+
     def disconnect(self) -> None:
         """Disconnect from MQTT broker and cleanup resources."""
         if self.valid and hasattr(self, "client") and isinstance(self.client, mqtt.Client):
@@ -89,34 +109,108 @@ class Mqtt:
                     logging.info(f" - Failed to send message to topic {prefix}/{topic}")
 
     def publish_multiple(self, data, prefix=None):
-        """Public multiple message."""
+        """Publish multiple messages on the broker connection.
+
+        Only the topics whose payload changed since their last publication, or published more than
+        APP_CONFIG.mqtt.full_refresh hours ago, are sent. The messages are pipelined on the connection opened by
+        connect(), with at most MQTT_MAX_INFLIGHT messages waiting for their acknowledgement.
+
+        Args:
+            data (dict): The payloads indexed by topic.
+            prefix (str, optional): The topics prefix. Defaults to the configured prefix.
+
+        Returns:
+            dict: The number of messages published, skipped and failed, and the duration of the batch in seconds.
+        """
         with APP_CONFIG.tracer.start_as_current_span(f"{__name__}.{inspect.currentframe().f_code.co_name}"):
-            if self.valid:
-                if data:
-                    payload = []
-                    if prefix is None:
-                        prefix = APP_CONFIG.mqtt.prefix
-                    else:
-                        prefix = f"{prefix}"
-                    for topics, value in data.items():
-                        payload.append(
-                            {
-                                "topic": f"{prefix}/{topics}",
-                                "payload": value,
-                                "qos": APP_CONFIG.mqtt.qos,
-                                "retain": APP_CONFIG.mqtt.retain,
-                            }
-                        )
-                    username = None if not APP_CONFIG.mqtt.username else APP_CONFIG.mqtt.username
-                    password = None if not APP_CONFIG.mqtt.password else APP_CONFIG.mqtt.password
-                    if username is None and password is None:
-                        auth = None
-                    else:
-                        auth = {"username": username, "password": password}
-                    publish.multiple(
-                        payload,
-                        hostname=APP_CONFIG.mqtt.hostname,
-                        port=APP_CONFIG.mqtt.port,
-                        client_id=APP_CONFIG.mqtt.client_id,
-                        auth=auth,
+            result = {"published": 0, "skipped": 0, "failed": 0, "duration": 0}
+            if self.valid and data:
+                if prefix is None:
+                    prefix = APP_CONFIG.mqtt.prefix
+                start = time.monotonic()
+                messages = {f"{prefix}/{topic}": value for topic, value in data.items()}
+                digests = self.get_changed(messages)
+                inflight = deque()
+                failed = []
+                for topic in digests:
+                    if len(inflight) >= MQTT_MAX_INFLIGHT:
+                        self.wait_for_publish(*inflight.popleft(), failed)
+                    message = self.client.publish(
+                        topic, messages[topic], qos=APP_CONFIG.mqtt.qos, retain=APP_CONFIG.mqtt.retain
                     )
+                    inflight.append((topic, message))
+                while inflight:
+                    self.wait_for_publish(*inflight.popleft(), failed)
+                for topic in failed:
+                    del digests[topic]
+                self.set_published(digests)
+                result["duration"] = time.monotonic() - start
+                result["failed"] = len(failed)
+                result["published"] = len(digests)
+                result["skipped"] = len(messages) - len(digests) - len(failed)
+                logging.debug(
+                    f" MQTT Send : {result['published']} messages en {result['duration']:.3f}s "
+                    f"({result['skipped']} inchangés)"
+                )
+                if failed:
+                    logging.error(f" - Echec de l'envoi de {len(failed)} message(s) : {', '.join(failed)}")
+            return result
+
+    def get_changed(self, messages):
+        """Select the messages to publish.
+
+        Args:
+            messages (dict): The payloads indexed by topic.
+
+        Returns:
+            dict: The digests of the payloads to publish, indexed by topic.
+        """
+        if self.digests is None:
+            self.digests = DatabaseMqtt().get()
+        refresh_date = datetime.now(tz=TIMEZONE) - timedelta(hours=APP_CONFIG.mqtt.full_refresh)
+        server = f"{APP_CONFIG.mqtt.hostname}:{APP_CONFIG.mqtt.port}/{APP_CONFIG.mqtt.retain}"
+        digests = {}
+        for topic, value in messages.items():
+            digest = hashlib.md5(f"{server}/{value}".encode("utf-8")).hexdigest()  # noqa: S324
+            previous = self.digests.get(topic)
+            if (
+                APP_CONFIG.mqtt.full_refresh
+                and previous is not None
+                and previous[0] == digest
+                and TIMEZONE.localize(previous[1]) > refresh_date
+            ):
+                continue
+            digests[topic] = digest
+        return digests
+
+    def set_published(self, digests):
+        """Save the digests of the published payloads.
+
+        Args:
+            digests (dict): The digests indexed by topic.
+        """
+        if digests:
+            date = datetime.now(tz=TIMEZONE).replace(tzinfo=None)
+            DatabaseMqtt().set(digests, date)
+            self.digests.update({topic: (digest, date) for topic, digest in digests.items()})
+
+    @staticmethod
+    def wait_for_publish(topic, message, failed):
+        """Wait for the acknowledgement of a message.
+
+        Args:
+            topic (str): The message topic.
+            message (mqtt.MQTTMessageInfo): The message returned by publish.
+            failed (list): The failed topics, the topic is appended on failure.
+        """
+        # is_published() raises as well when the message was not queued (no connection, queue full).
+        if message.rc != mqtt.MQTT_ERR_SUCCESS:
+            failed.append(topic)
+            return
+        try:
+            message.wait_for_publish(MQTT_PUBLISH_TIMEOUT)
+            published = message.is_published()
+        except (RuntimeError, ValueError):
+            published = False
+        if not published:
+            failed.append(topic)
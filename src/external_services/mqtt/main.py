@@ -20,18 +20,23 @@ from database.statistique import DatabaseStatistique
 from database.tempo import DatabaseTempo
 from database.usage_points import DatabaseUsagePoints
 from external_services.mqtt.client import Mqtt
+from models.rollup import Rollup, day_range, month_range, week_range, year_range
 from models.stat import Stat
+from models.tempo_calendar import TEMPO_CALENDAR
 
 
 class ExportMqtt:
     """A class for exporting MQTT data."""
 
-    def __init__(self, usage_point_id):
+    def __init__(self, usage_point_id, mqtt_client=None):
         self.usage_point_id = usage_point_id
         self.usage_point_config = APP_CONFIG.myelectricaldata.usage_point_config[self.usage_point_id]
         self.date_format = "%Y-%m-%d"
         self.date_format_detail = "%Y-%m-%d %H:%M:%S"
-        self.mqtt_client = Mqtt()
+        self.rollups = {}
+        # A connection shared by the caller is left open, the MQTT client id allows a single connection at a time.
+        self.shared_client = mqtt_client is not None
+        self.mqtt_client = mqtt_client if self.shared_client else Mqtt()
         self.bootstrap()
 
     def bootstrap(self):
@@ -127,24 +132,68 @@ class ExportMqtt:
             else:
                 logging.info(" => ERREUR")
 
+    def get_rollups(self, measurement_direction):
+        """Get the period sums of a measurement direction, read once per export.
+
+        Args:
+            measurement_direction (str): The measurement direction.
+
+        Returns:
+            dict: The sums indexed by (period, period start (date), measure type).
+        """
+        if measurement_direction not in self.rollups:
+            self.rollups[measurement_direction] = Rollup(self.usage_point_id, measurement_direction).get()
+        return self.rollups[measurement_direction]
+
+    def get_period(self, measurement_direction, period, bounds, measure_type="BASE"):
+        """Get the sum of a period.
+
+        Args:
+            measurement_direction (str): The measurement direction.
+            period (str): The period (day, week, month or year).
+            bounds (tuple): The first and last days of the period.
+            measure_type (str, optional): The measure type. Defaults to "BASE".
+
+        Returns:
+            dict: A dictionary containing the sum, begin date, and end date.
+        """
+        begin, end = bounds
+        value = self.get_rollups(measurement_direction).get((period, begin, measure_type), 0)
+        if measure_type == "BASE":
+            value = int(value)
+        return {
+            "value": value,
+            "begin": begin.strftime(self.date_format),
+            "end": end.strftime(self.date_format),
+        }
+
+    def get_years(self, measurement_direction, measure_types):
+        """Get the years with data, most recent first.
+
+        Args:
+            measurement_direction (str): The measurement direction.
+            measure_types (tuple): The measure types.
+
+        Returns:
+            list: The years.
+        """
+        years = {
+            day.year
+            for period, day, measure_type in self.get_rollups(measurement_direction)
+            if period == "year" and measure_type in measure_types
+        }
+        return sorted(years, reverse=True)
+
     def daily_annual(self, price, measurement_direction="consumption"):
         """Get the daily annual data."""
         with APP_CONFIG.tracer.start_as_current_span(f"{__name__}.{inspect.currentframe().f_code.co_name}"):
             logging.info("Génération des données annuelles")
-            date_range = DatabaseDaily(self.usage_point_id).get_date_range()
-            stat = Stat(self.usage_point_id, measurement_direction)
-            if date_range["begin"] and date_range["end"]:
-                date_begin = datetime.combine(date_range["begin"], datetime.min.time()).astimezone(TIMEZONE_UTC)
-                date_end = datetime.combine(date_range["end"], datetime.max.time()).astimezone(TIMEZONE_UTC)
-                date_begin_current = datetime.combine(
-                    date_end.replace(month=1).replace(day=1), datetime.min.time()
-                ).astimezone(TIMEZONE_UTC)
-                finish = False
-                while not finish:
-                    year = int(date_begin_current.strftime("%Y"))
-                    get_daily_year = stat.get_year(year=year)
-                    get_daily_month = stat.get_month(year=year)
-                    get_daily_week = stat.get_week(year=year)
+            years = self.get_years(measurement_direction, ("BASE",))
+            if years:
+                for year in years:
+                    get_daily_year = self.get_period(measurement_direction, "year", year_range(year))
+                    get_daily_month = self.get_period(measurement_direction, "month", month_range(year))
+                    get_daily_week = self.get_period(measurement_direction, "week", week_range(year))
                     if year == int(datetime.now(tz=TIMEZONE_UTC).strftime("%Y")):
                         sub_prefix = f"{self.usage_point_id}/{measurement_direction}/annual/current"
                     else:
@@ -171,14 +220,11 @@ class ExportMqtt:
                     }
 
                     for week in range(7):
-                        begin = stat.daily(week)["begin"]
-                        begin_day = (
-                            datetime.strptime(stat.daily(week)["begin"], self.date_format)
-                            .astimezone(TIMEZONE_UTC)
-                            .strftime("%A")
-                        )
-                        end = stat.daily(week)["end"]
-                        value = stat.daily(week)["value"]
+                        get_daily_day = self.get_period(measurement_direction, "day", day_range(week))
+                        begin = get_daily_day["begin"]
+                        begin_day = datetime.strptime(begin, self.date_format).astimezone(TIMEZONE_UTC).strftime("%A")
+                        end = get_daily_day["end"]
+                        value = get_daily_day["value"]
                         mqtt_data[f"{sub_prefix}/week/{begin_day}/dateBegin"] = begin
                         mqtt_data[f"{sub_prefix}/week/{begin_day}/dateEnd"] = end
                         mqtt_data[f"{sub_prefix}/week/{begin_day}/base/Wh"] = value
@@ -186,7 +232,7 @@ class ExportMqtt:
                         mqtt_data[f"{sub_prefix}/week/{begin_day}/base/euro"] = round(value / 1000 * price, 2)
 
                     for month in range(1, 13):
-                        get_daily_month = stat.get_month(year=year, month=month)
+                        get_daily_month = self.get_period(measurement_direction, "month", month_range(year, month))
                         mqtt_data[f"{sub_prefix}/month/{month}/dateBegin"] = get_daily_month["begin"]
                         mqtt_data[f"{sub_prefix}/month/{month}/dateEnd"] = get_daily_month["end"]
                         mqtt_data[f"{sub_prefix}/month/{month}/base/Wh"] = get_daily_month["value"]
@@ -195,11 +241,6 @@ class ExportMqtt:
                             get_daily_month["value"] / 1000 * price, 2
                         )
 
-                    if date_begin_current == date_begin:
-                        finish = True
-                    date_begin_current = date_begin_current - relativedelta(years=1)
-                    if date_begin_current < date_begin:
-                        date_begin_current = date_begin
                     self.mqtt_client.publish_multiple(mqtt_data)
 
                 logging.info(" => OK")
@@ -264,35 +305,24 @@ class ExportMqtt:
             else:
                 logging.info(" => Pas de donnée")
 
-    def detail_annual(self, price_hp, price_hc=0, measurement_direction="consumption"):  # noqa: PLR0915
+    def detail_annual(self, price_hp, price_hc=0, measurement_direction="consumption"):
         """Get the detailed annual data."""
         with APP_CONFIG.tracer.start_as_current_span(f"{__name__}.{inspect.currentframe().f_code.co_name}"):
             logging.info("Génération des données annuelles détaillé.")
-            date_range = DatabaseDetail(self.usage_point_id).get_date_range()
-            stat = Stat(self.usage_point_id, measurement_direction)
-            if date_range["begin"] and date_range["end"]:
-                date_begin = datetime.combine(date_range["begin"], datetime.min.time()).astimezone(TIMEZONE_UTC)
-                date_end = datetime.combine(date_range["end"], datetime.max.time()).astimezone(TIMEZONE_UTC)
-                date_begin_current = datetime.combine(date_end.replace(month=1).replace(day=1), datetime.min.time())
-                finish = False
-                while not finish:
-                    year = int(date_begin_current.strftime("%Y"))
+            years = self.get_years(measurement_direction, ("HP", "HC"))
+            if years:
+                for year in years:
                     month = int(datetime.now(tz=TIMEZONE_UTC).strftime("%m"))
-                    get_detail_year_hp = stat.get_year(year=year, measure_type="HP")
-                    get_detail_year_hc = stat.get_year(year=year, measure_type="HC")
-                    get_detail_month_hp = stat.get_month(year=year, month=month, measure_type="HP")
-                    get_detail_month_hc = stat.get_month(year=year, month=month, measure_type="HC")
-                    get_detail_week_hp = stat.get_week(
-                        year=year,
-                        month=month,
-                        measure_type="HP",
+                    get_detail_year_hp = self.get_period(measurement_direction, "year", year_range(year), "HP")
+                    get_detail_year_hc = self.get_period(measurement_direction, "year", year_range(year), "HC")
+                    get_detail_month_hp = self.get_period(
+                        measurement_direction, "month", month_range(year, month), "HP"
                     )
-                    get_detail_week_hc = stat.get_week(
-                        year=year,
-                        month=month,
-                        measure_type="HC",
+                    get_detail_month_hc = self.get_period(
+                        measurement_direction, "month", month_range(year, month), "HC"
                     )
-
+                    get_detail_week_hp = self.get_period(measurement_direction, "week", week_range(year, month), "HP")
+                    get_detail_week_hc = self.get_period(measurement_direction, "week", week_range(year, month), "HC")
                     if year == int(datetime.now(tz=TIMEZONE_UTC).strftime("%Y")):
                         sub_prefix = f"{self.usage_point_id}/{measurement_direction}/annual/current"
                     else:
@@ -326,23 +356,25 @@ class ExportMqtt:
 
                     for week in range(7):
                         # HP
+                        get_detail_day_hp = self.get_period(measurement_direction, "day", day_range(week), "HP")
                         begin_hp_day = (
-                            datetime.strptime(stat.detail(week, "HP")["begin"], self.date_format)
+                            datetime.strptime(get_detail_day_hp["begin"], self.date_format)
                             .astimezone(TIMEZONE_UTC)
                             .strftime("%A")
                         )
-                        value_hp = stat.detail(week, "HP")["value"]
+                        value_hp = get_detail_day_hp["value"]
                         prefix = f"{sub_prefix}/week/{begin_hp_day}/hp"
                         mqtt_data[f"{prefix}/Wh"] = value_hp
                         mqtt_data[f"{prefix}/kWh"] = round(value_hp / 1000, 2)
                         mqtt_data[f"{prefix}/euro"] = round(value_hp / 1000 * price_hp, 2)
                         # HC
+                        get_detail_day_hc = self.get_period(measurement_direction, "day", day_range(week), "HC")
                         begin_hc_day = (
-                            datetime.strptime(stat.detail(week, "HC")["begin"], self.date_format)
+                            datetime.strptime(get_detail_day_hc["begin"], self.date_format)
                             .astimezone(TIMEZONE_UTC)
                             .strftime("%A")
                         )
-                        value_hc = stat.detail(week, "HC")["value"]
+                        value_hc = get_detail_day_hc["value"]
                         prefix = f"{sub_prefix}/week/{begin_hc_day}/hc"
                         mqtt_data[f"{prefix}/Wh"] = value_hc
                         mqtt_data[f"{prefix}/kWh"] = round(value_hc / 1000, 2)
@@ -351,26 +383,21 @@ class ExportMqtt:
                     for month in range(12):
                         current_month = month + 1
                         # HP
-                        get_detail_month_hp = stat.get_month(year=year, month=current_month, measure_type="HP")
+                        get_detail_month_hp = self.get_period(
+                            measurement_direction, "month", month_range(year, current_month), "HP"
+                        )
                         prefix = f"{sub_prefix}/month/{current_month}/hp"
                         mqtt_data[f"{prefix}/Wh"] = get_detail_month_hp["value"]
                         mqtt_data[f"{prefix}/kWh"] = round(get_detail_month_hp["value"] / 1000, 2)
                         mqtt_data[f"{prefix}/euro"] = round(get_detail_month_hp["value"] / 1000 * price_hp, 2)
                         # HC
-                        get_detail_month_hc = stat.get_month(year=year, month=current_month, measure_type="HC")
+                        get_detail_month_hc = self.get_period(
+                            measurement_direction, "month", month_range(year, current_month), "HC"
+                        )
                         prefix = f"{sub_prefix}/month/{current_month}/hc"
                         mqtt_data[f"{prefix}/Wh"] = get_detail_month_hc["value"]
                         mqtt_data[f"{prefix}/kWh"] = round(get_detail_month_hc["value"] / 1000, 2)
                         mqtt_data[f"{prefix}/euro"] = round(get_detail_month_hc["value"] / 1000 * price_hc, 2)
-                    if date_begin_current == date_begin:
-                        finish = True
-                    date_end = datetime.combine(
-                        (date_end - relativedelta(years=1)).replace(month=12, day=31),
-                        datetime.max.time(),
-                    )
-                    date_begin_current = date_begin_current - relativedelta(years=1)
-                    if date_begin_current.astimezone(TIMEZONE_UTC) < date_begin.astimezone(TIMEZONE_UTC):
-                        date_begin_current = date_begin
 
                     self.mqtt_client.publish_multiple(mqtt_data)
 
@@ -531,13 +558,13 @@ class ExportMqtt:
                 for color, days in tempo_days.items():
                     mqtt_data[f"tempo/days/{color}"] = days
             today = datetime.combine(datetime.now(tz=TIMEZONE_UTC), datetime.min.time())
-            tempo_color = DatabaseTempo().get_range(today, today)
+            tempo_color = TEMPO_CALENDAR.get_color(today)
             if tempo_color:
-                mqtt_data["tempo/color/today"] = tempo_color[0].color
+                mqtt_data["tempo/color/today"] = tempo_color
             tomorrow = today + timedelta(days=1)
-            tempo_color = DatabaseTempo().get_range(tomorrow, tomorrow)
+            tempo_color = TEMPO_CALENDAR.get_color(tomorrow)
             if tempo_color:
-                mqtt_data["tempo/color/tomorrow"] = tempo_color[0].color
+                mqtt_data["tempo/color/tomorrow"] = tempo_color
             if tempo_data:
                 for year, data in ast.literal_eval(tempo_data[0].value).items():
                     select_year = year
@@ -583,7 +610,7 @@ class ExportMqtt:
 
     def cleanup(self):
         """Cleanup MQTT connection."""
-        if hasattr(self, "mqtt_client"):
+        if hasattr(self, "mqtt_client") and not self.shared_client:
             self.mqtt_client.disconnect()
 
     def __del__(self):
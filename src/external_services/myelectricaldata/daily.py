@@ -12,6 +12,8 @@ from const import (
     CODE_200_SUCCESS,
     CODE_403_FORBIDDEN,
     CODE_404_NOT_FOUND,
+    CODE_409_CONFLICT,
+    CODE_429_TOO_MANY_REQUEST,
     CODE_500_INTERNAL_SERVER_ERROR,
     DAILY_MAX_DAYS,
     TIMEZONE,
@@ -21,6 +23,7 @@ from database.contracts import DatabaseContracts
 from database.daily import DatabaseDaily
 from database.usage_points import DatabaseUsagePoints
 from models.query import Query
+from models.quota import GATEWAY_QUOTAS, is_fresh
 from models.stat import Stat
 from utils import daterange, is_json
 
@@ -121,85 +124,52 @@ class Daily:
         elif hasattr(self.usage_point_config, "production_price"):
             self.base_price = self.usage_point_config.production_price
 
-    def run(self, begin, end):  # noqa: C901, PLR0915
-        """Retrieves and stores daily data for a specified date range."""
+    def run(self, begin, end):
+        """Retrieves and stores daily data for a date range, requesting only the days missing in the cache."""
         with APP_CONFIG.tracer.start_as_current_span(f"{__name__}.{inspect.currentframe().f_code.co_name}"):
             begin_str = begin.strftime(self.date_format)
             end_str = end.strftime(self.date_format)
             logging.info(f"Récupération des données : {begin_str} => {end_str}")
-            endpoint = f"daily_{self.measure_type}/{self.usage_point_id}/start/{begin_str}/end/{end_str}"
-            if hasattr(self.usage_point_config, "cache") and self.usage_point_config.cache:
-                endpoint += "/cache"
             try:
-                current_data = DatabaseDaily(self.usage_point_id, self.measure_type).get(begin, end)
+                # The daily data is published up to yesterday.
+                yesterday = datetime.combine(datetime.now(tz=TIMEZONE) - timedelta(days=1), datetime.min.time())
+                current_data = self.daily.get(begin, min(end, TIMEZONE.localize(yesterday)))
+                output = []
+                for date, data in current_data["date"].items():
+                    if data["status"]:
+                        output.append({"date": date, "value": data["value"]})
                 if not current_data["missing_data"]:
                     logging.info(" => Toutes les données sont déjà en cache.")
-                    output = []
-                    for date, data in current_data["date"].items():
-                        output.append({"date": date, "value": data["value"]})
                     return output
-                else:
-                    logging.info(f" Chargement des données depuis MyElectricalData {begin_str} => {end_str}")
-                    data = Query(endpoint=f"{self.url}/{endpoint}/", headers=self.headers).get()
-                    if data.status_code == CODE_403_FORBIDDEN:
-                        if hasattr(data, "text"):
-                            description = json.loads(data.text)["detail"]
-                        else:
-                            description = data
-                        if hasattr(data, "status_code"):
-                            status_code = data.status_code
-                        else:
-                            status_code = CODE_500_INTERNAL_SERVER_ERROR
-                        return {
-                            "error": True,
-                            "description": description,
-                            "status_code": status_code,
-                            "exit": True,
-                        }
-                    blacklist = 0
-                    max_histo = datetime.combine(datetime.now(tz=TIMEZONE), datetime.max.time()) - timedelta(days=1)
-                    if hasattr(data, "status_code"):
-                        if data.status_code == CODE_200_SUCCESS:
-                            meter_reading = json.loads(data.text)["meter_reading"]
-                            if meter_reading is not None and "interval_reading" in meter_reading:
-                                interval_reading = meter_reading["interval_reading"]
-                                interval_reading_tmp = {}
-                                for interval_reading_data in interval_reading:
-                                    interval_reading_tmp[interval_reading_data["date"]] = interval_reading_data[
-                                        "value"
-                                    ]
-                                single_date: datetime
-                                for single_date in daterange(begin, end):
-                                    single_date_tz: datetime = single_date.replace(tzinfo=TIMEZONE)
-                                    max_histo = max_histo.replace(tzinfo=TIMEZONE)
-                                    if single_date_tz < max_histo:
-                                        if single_date_tz.strftime(self.date_format) in interval_reading_tmp:
-                                            # FOUND
-                                            self.daily.insert(
-                                                date=datetime.combine(single_date_tz, datetime.min.time()),
-                                                value=interval_reading_tmp[single_date_tz.strftime(self.date_format)],
-                                                blacklist=blacklist,
-                                            )
-                                        else:
-                                            # NOT FOUND
-                                            self.daily.fail_increment(
-                                                date=datetime.combine(single_date_tz, datetime.min.time()),
-                                            )
-                                return interval_reading
-                            return {
-                                "error": True,
-                                "description": "Données non disponibles.",
-                                "status_code": CODE_404_NOT_FOUND,
-                            }
-                        if is_json(data.text):
-                            description = json.loads(data.text)["detail"]
-                        else:
-                            description = data.text
-                        return {
-                            "error": True,
-                            "description": description,
-                            "status_code": data.status_code,
-                        }
+                # Most recent first, the backfill keeping a reserve of the quota for the latest data.
+                quota = GATEWAY_QUOTAS.get(self.usage_point_id)
+                for range_begin, range_end in reversed(current_data["missing"]):
+                    if not quota.acquire(fresh=is_fresh(range_end)):
+                        logging.warning(" => Quota de la passerelle bientôt atteint, reporté au prochain cycle.")
+                        break
+                    response = self.import_range(range_begin, range_end)
+                    if not isinstance(response, list):
+                        if response and response.get("status_code") in (CODE_409_CONFLICT, CODE_429_TOO_MANY_REQUEST):
+                            quota.exhaust()
+                        return response
+                    output.extend(response)
+                return output
+            except Exception as e:
+                logging.exception(e)
+                logging.error(e)
+
+    def import_range(self, begin, end):  # noqa: C901, PLR0915
+        """Request a range of daily data from the gateway and store it."""
+        with APP_CONFIG.tracer.start_as_current_span(f"{__name__}.{inspect.currentframe().f_code.co_name}"):
+            begin_str = begin.strftime(self.date_format)
+            end_str = end.strftime(self.date_format)
+            endpoint = f"daily_{self.measure_type}/{self.usage_point_id}/start/{begin_str}/end/{end_str}"
+            if hasattr(self.usage_point_config, "cache") and self.usage_point_config.cache:
+                endpoint += "/cache"
+            try:
+                logging.info(f" Chargement des données depuis MyElectricalData {begin_str} => {end_str}")
+                data = Query(endpoint=f"{self.url}/{endpoint}/", headers=self.headers).get()
+                if data.status_code == CODE_403_FORBIDDEN:
                     if hasattr(data, "text"):
                         description = json.loads(data.text)["detail"]
                     else:
@@ -212,7 +182,68 @@ class Daily:
                         "error": True,
                         "description": description,
                         "status_code": status_code,
+                        "exit": True,
                     }
+                blacklist = 0
+                max_histo = datetime.combine(datetime.now(tz=TIMEZONE), datetime.max.time()) - timedelta(days=1)
+                if hasattr(data, "status_code"):
+                    if data.status_code == CODE_200_SUCCESS:
+                        meter_reading = json.loads(data.text)["meter_reading"]
+                        if meter_reading is not None and "interval_reading" in meter_reading:
+                            interval_reading = meter_reading["interval_reading"]
+                            interval_reading_tmp = {}
+                            for interval_reading_data in interval_reading:
+                                interval_reading_tmp[interval_reading_data["date"]] = interval_reading_data["value"]
+                            rows = []
+                            fail_dates = []
+                            single_date: datetime
+                            for single_date in daterange(begin, end):
+                                single_date_tz: datetime = single_date.replace(tzinfo=TIMEZONE)
+                                max_histo = max_histo.replace(tzinfo=TIMEZONE)
+                                if single_date_tz < max_histo:
+                                    if single_date_tz.strftime(self.date_format) in interval_reading_tmp:
+                                        # FOUND
+                                        rows.append(
+                                            {
+                                                "date": datetime.combine(single_date_tz, datetime.min.time()),
+                                                "value": interval_reading_tmp[
+                                                    single_date_tz.strftime(self.date_format)
+                                                ],
+                                                "blacklist": blacklist,
+                                            }
+                                        )
+                                    else:
+                                        # NOT FOUND
+                                        fail_dates.append(datetime.combine(single_date_tz, datetime.min.time()))
+                            self.daily.insert_window(rows, fail_dates)
+                            return interval_reading
+                        return {
+                            "error": True,
+                            "description": "Données non disponibles.",
+                            "status_code": CODE_404_NOT_FOUND,
+                        }
+                    if is_json(data.text):
+                        description = json.loads(data.text)["detail"]
+                    else:
+                        description = data.text
+                    return {
+                        "error": True,
+                        "description": description,
+                        "status_code": data.status_code,
+                    }
+                if hasattr(data, "text"):
+                    description = json.loads(data.text)["detail"]
+                else:
+                    description = data
+                if hasattr(data, "status_code"):
+                    status_code = data.status_code
+                else:
+                    status_code = CODE_500_INTERNAL_SERVER_ERROR
+                return {
+                    "error": True,
+                    "description": description,
+                    "status_code": status_code,
+                }
             except Exception as e:
                 logging.exception(e)
                 logging.error(e)
@@ -279,7 +310,7 @@ class Daily:
         with APP_CONFIG.tracer.start_as_current_span(f"{__name__}.{inspect.currentframe().f_code.co_name}"):
             if date is not None:
                 date = datetime.strptime(date, self.date_format).astimezone(TIMEZONE)
-            result = self.run(
+            result = self.import_range(
                 datetime.combine(date - timedelta(days=2), datetime.min.time()),
                 datetime.combine(date + timedelta(days=2), datetime.min.time()),
             )
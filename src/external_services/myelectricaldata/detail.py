@@ -1,9 +1,12 @@
 """Get myelectricaldata detail data."""
 
+import contextvars
 import inspect
 import json
 import logging
 import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 from config.main import APP_CONFIG
@@ -13,6 +16,7 @@ from const import (
     CODE_403_FORBIDDEN,
     CODE_404_NOT_FOUND,
     CODE_409_CONFLICT,
+    CODE_429_TOO_MANY_REQUEST,
     CODE_500_INTERNAL_SERVER_ERROR,
     DETAIL_MAX_DAYS,
     TIMEZONE,
@@ -24,14 +28,16 @@ from database.detail import DatabaseDetail
 from database.usage_points import DatabaseUsagePoints
 from db_schema import ConsumptionDetail, ProductionDetail
 from models.query import Query
+from models.quota import GATEWAY_QUOTAS, is_fresh
 from utils import is_json
 
 
 class Detail:
     """Manage detail data."""
 
-    def __init__(self, headers, usage_point_id, measure_type="consumption"):
+    def __init__(self, headers, usage_point_id, measure_type="consumption", workers=None):
         self.url = URL
+        self.workers = workers
         self.max_detail = 7
         self.date_format = "%Y-%m-%d"
         self.date_detail_format = "%Y-%m-%d %H:%M:%S"
@@ -84,27 +90,71 @@ class Detail:
             if hasattr(self.usage_point_config, "production_price"):
                 self.base_price = self.usage_point_config.production_price
 
-    def run(self, begin, end):  # noqa: C901
-        """Run the detail query."""
+    def run(self, begin, end):
+        """Run the detail query, only requesting the days missing in the cache."""
         with APP_CONFIG.tracer.start_as_current_span(f"{__name__}.{inspect.currentframe().f_code.co_name}"):
             if begin.strftime(self.date_format) == end.strftime(self.date_format):
                 end = end + timedelta(days=1)
             begin_str = begin.strftime(self.date_format)
             end_str = end.strftime(self.date_format)
             logging.info(f"Récupération des données : {begin_str} => {end_str}")
+            try:
+                # The load curve is published up to the end of yesterday.
+                today = TIMEZONE.localize(datetime.combine(datetime.now(tz=TIMEZONE), datetime.min.time()))
+                current_data = DatabaseDetail(self.usage_point_id, self.measure_type).get(begin, min(end, today))
+                if not current_data["missing_data"]:
+                    logging.info(" => Toutes les données sont déjà en cache.")
+                    output = []
+                    for date, data in current_data["date"].items():
+                        output.append({"date": date, "value": data["value"]})
+                    return output
+                interval_reading = []
+                for range_begin, range_end in self.missing_ranges(current_data["missing"]):
+                    response = self.import_range(range_begin, range_end)
+                    if not isinstance(response, list):
+                        return response
+                    interval_reading.extend(response)
+                return interval_reading
+            except Exception as e:
+                logging.exception(e)
+                logging.error(e)
+
+    def missing_ranges(self, gaps):
+        """Convert the spans missing in the cache into the ranges of days to request.
+
+        Args:
+            gaps (list): The missing (begin, end) spans, in chronological order.
+
+        Returns:
+            list: The (begin, end) ranges of days, end excluded.
+        """
+        ranges = []
+        for gap_begin, gap_end in gaps:
+            first = gap_begin.date()
+            last = (gap_end - timedelta(microseconds=1)).date() + timedelta(days=1)
+            if ranges and first <= ranges[-1][1]:
+                ranges[-1] = (ranges[-1][0], max(ranges[-1][1], last))
+            else:
+                ranges.append((first, last))
+        return [
+            (
+                TIMEZONE.localize(datetime.combine(first, datetime.min.time())),
+                TIMEZONE.localize(datetime.combine(last, datetime.min.time())),
+            )
+            for first, last in ranges
+        ]
+
+    def import_range(self, begin, end):  # noqa: C901
+        """Request a range of the load curve from the gateway and store it."""
+        with APP_CONFIG.tracer.start_as_current_span(f"{__name__}.{inspect.currentframe().f_code.co_name}"):
+            if begin.strftime(self.date_format) == end.strftime(self.date_format):
+                end = end + timedelta(days=1)
+            begin_str = begin.strftime(self.date_format)
+            end_str = end.strftime(self.date_format)
             endpoint = f"{self.measure_type}_load_curve/{self.usage_point_id}/start/{begin_str}/end/{end_str}"
             if hasattr(self.usage_point_config, "cache") and self.usage_point_config.cache:
                 endpoint += "/cache"
             try:
-                if datetime.now(tz=TIMEZONE) >= end.astimezone(TIMEZONE):
-                    current_data = DatabaseDetail(self.usage_point_id, self.measure_type).get(begin, end)
-                    if not current_data["missing_data"]:
-                        logging.info(" => Toutes les données sont déjà en cache.")
-                        output = []
-                        for date, data in current_data["date"].items():
-                            output.append({"date": date, "value": data["value"]})
-                        return output
-
                 logging.info(f" Chargement des données depuis MyElectricalData {begin_str} => {end_str}")
                 data = Query(endpoint=f"{self.url}/{endpoint}/", headers=self.headers).get()
                 if hasattr(data, "status_code"):
@@ -122,6 +172,8 @@ class Detail:
                         meter_reading = json.loads(data.text)["meter_reading"]
                         if meter_reading is not None and "interval_reading" in meter_reading:
                             interval_reading = meter_reading["interval_reading"]
+                            rows = []
+                            fail_dates = []
                             for interval_reading_data in interval_reading:
                                 value = interval_reading_data["value"]
                                 interval = re.findall(r"\d+", interval_reading_data["interval_length"])[0]
@@ -131,14 +183,10 @@ class Detail:
                                 date = date_object - timedelta(minutes=int(interval))
                                 if int(value) == 0:
                                     logging.warning(f" => {date} blacklint incrementation.")
-                                    DatabaseDetail(self.usage_point_id, self.measure_type).fail_increment(date)
+                                    fail_dates.append(date)
                                 else:
-                                    DatabaseDetail(self.usage_point_id, self.measure_type).insert(
-                                        date=date,
-                                        value=value,
-                                        interval=interval,
-                                        blacklist=0,
-                                    )
+                                    rows.append({"date": date, "value": value, "interval": interval, "blacklist": 0})
+                            DatabaseDetail(self.usage_point_id, self.measure_type).insert_window(rows, fail_dates)
                             return interval_reading
                         return {
                             "error": True,
@@ -166,62 +214,124 @@ class Detail:
                 logging.exception(e)
                 logging.error(e)
 
+    def plan(self):
+        """Compute the windows of the load curve missing in the cache.
+
+        The days missing since the activation date (or DETAIL_MAX_DAYS days ago) are split in windows of at most
+        max_detail days, most recent first.
+
+        Returns:
+            list: The (begin, end) windows, end excluded.
+        """
+        # The load curve is published up to the end of yesterday.
+        today = TIMEZONE.localize(datetime.combine(datetime.now(tz=TIMEZONE), datetime.min.time()))
+        begin = max(self.max_days_date, self.activation_date)
+        gaps = DatabaseDetail(self.usage_point_id, self.measure_type).get_gaps(begin, today)
+        windows = []
+        for range_begin, range_end in reversed(self.missing_ranges(gaps)):
+            first = range_begin.date()
+            last = range_end.date()
+            while last > first:
+                window_begin = max(first, last - timedelta(days=self.max_detail))
+                windows.append(
+                    (
+                        TIMEZONE.localize(datetime.combine(window_begin, datetime.min.time())),
+                        TIMEZONE.localize(datetime.combine(last, datetime.min.time())),
+                    )
+                )
+                last = window_begin
+        return windows
+
     def get(self):
-        """Get the detail data."""
+        """Get the detail data.
+
+        The missing windows are planned up front and requested concurrently, by at most workers threads
+        (gateway.workers by default), each window being written in its own transaction. A fatal error stops the
+        windows not yet started (the ones in flight are still collected), and the windows exceeding the quota of the
+        usage point are left to the next cycle.
+        """
         with APP_CONFIG.tracer.start_as_current_span(f"{__name__}.{inspect.currentframe().f_code.co_name}"):
-            end = datetime.combine((datetime.now(tz=TIMEZONE) + timedelta(days=2)), datetime.max.time()).replace(
-                tzinfo=TIMEZONE
-            )
-            begin = datetime.combine(end - timedelta(days=self.max_detail), datetime.min.time()).replace(
-                tzinfo=TIMEZONE
-            )
-            finish = True
+            windows = self.plan()
+            if not windows:
+                logging.info(" => Toutes les données sont déjà en cache.")
+                return []
+            logging.info(f" => {len(windows)} période(s) à récupérer.")
             result = []
-            while finish:
-                if self.max_days_date > begin:
-                    # Max day reached
-                    begin = self.max_days_date
-                    finish = False
-                    response = self.run(begin, end)
-                elif self.activation_date and self.activation_date > begin:
-                    # Activation date reached
-                    begin = self.activation_date
-                    finish = False
-                    response = self.run(begin, end)
-                else:
-                    response = self.run(begin, end)
-                    begin = begin - timedelta(days=self.max_detail)
-                    end = end - timedelta(days=self.max_detail)
-                if "exit" in response:
-                    finish = False
-                    response = {
-                        "error": True,
-                        "description": response["description"],
-                        "status_code": response["status_code"],
-                    }
-                if response is not None:
-                    result = [*result, *response]
-                else:
-                    response = {
-                        "error": True,
-                        "description": "MyElectricalData est indisponible.",
-                    }
-                if response is None or ("error" in response and response.get("error", False)):
-                    logging.error("Echec de la récupération des données.")
-                    if "description" in response:
-                        logging.error(f'=> {response["description"]}')
-                    logging.error(" => %s -> %s", begin.strftime(self.date_format), end.strftime(self.date_format))
-                if "status_code" in response and (
-                    response["status_code"] == CODE_409_CONFLICT or response["status_code"] == CODE_400_BAD_REQUEST
-                ):
-                    finish = False
-                    logging.error("Arrêt de la récupération des données suite à une erreur.")
-                    logging.error(
-                        "Prochain lancement à %s",
-                        datetime.now(tz=TIMEZONE) + timedelta(seconds=DatabaseConfig().get("cycle")),
+            workers = min(self.workers or APP_CONFIG.gateway.workers, len(windows))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="detail") as executor:
+                # At most one window per worker is in flight, so that an error stops the windows not started yet.
+                pending = deque()
+                for window in self.schedule(windows):
+                    pending.append(
+                        (window, executor.submit(contextvars.copy_context().run, self.import_range, *window))
                     )
+                    if len(pending) >= workers and not self.check_window(*pending.popleft(), result):
+                        break
+                while pending:
+                    self.check_window(*pending.popleft(), result)
             return result
 
+    def schedule(self, windows):
+        """Yield the windows allowed by the quota of the usage point.
+
+        The backfill keeps a reserve of the quota for the latest data, the windows left wait for the next cycle.
+
+        Args:
+            windows (list): The (begin, end) windows, most recent first.
+
+        Yields:
+            tuple: The (begin, end) windows to request.
+        """
+        quota = GATEWAY_QUOTAS.get(self.usage_point_id)
+        for index, window in enumerate(windows):
+            if not quota.acquire(fresh=is_fresh(window[1])):
+                logging.warning(
+                    f" => Quota de la passerelle bientôt atteint, {len(windows) - index} période(s) reportée(s) au "
+                    "prochain cycle."
+                )
+                return
+            yield window
+
+    def check_window(self, window, future, result):
+        """Collect the response of a window, logging its error.
+
+        Args:
+            window (tuple): The (begin, end) window.
+            future (Future): The import_range call of the window.
+            result (list): The interval readings collected so far, extended with the window ones.
+
+        Returns:
+            bool: False if the error stops the import, True otherwise.
+        """
+        begin, end = window
+        response = future.result()
+        if isinstance(response, list):
+            result.extend(response)
+            return True
+        if response is None:
+            response = {
+                "error": True,
+                "description": "MyElectricalData est indisponible.",
+            }
+        logging.error("Echec de la récupération des données.")
+        if "description" in response:
+            logging.error(f'=> {response["description"]}')
+        logging.error(" => %s -> %s", begin.strftime(self.date_format), end.strftime(self.date_format))
+        if response.get("status_code") in (CODE_409_CONFLICT, CODE_429_TOO_MANY_REQUEST):
+            GATEWAY_QUOTAS.get(self.usage_point_id).exhaust()
+        if "exit" in response or response.get("status_code") in (
+            CODE_409_CONFLICT,
+            CODE_400_BAD_REQUEST,
+            CODE_429_TOO_MANY_REQUEST,
+        ):
+            logging.error("Arrêt de la récupération des données suite à une erreur.")
+            logging.error(
+                "Prochain lancement à %s",
+                datetime.now(tz=TIMEZONE) + timedelta(seconds=DatabaseConfig().get("cycle")),
+            )
+            return False
+        return True
+
     def reset_daily(self, date):
         """Reset the detail for a specific date."""
         with APP_CONFIG.tracer.start_as_current_span(f"{__name__}.{inspect.currentframe().f_code.co_name}"):
@@ -267,7 +377,7 @@ class Detail:
         with APP_CONFIG.tracer.start_as_current_span(f"{__name__}.{inspect.currentframe().f_code.co_name}"):
             if date is not None:
                 date = datetime.strptime(date, self.date_format).astimezone(TIMEZONE)
-            result = self.run(
+            result = self.import_range(
                 datetime.combine(date - timedelta(days=2), datetime.min.time()),
                 datetime.combine(date + timedelta(days=2), datetime.min.time()),
             )
@@ -11,6 +11,8 @@ from config.main import APP_CONFIG
 from const import (
     CODE_200_SUCCESS,
     CODE_404_NOT_FOUND,
+    CODE_409_CONFLICT,
+    CODE_429_TOO_MANY_REQUEST,
     CODE_500_INTERNAL_SERVER_ERROR,
     DAILY_MAX_DAYS,
     TIMEZONE,
@@ -21,6 +23,7 @@ from database.contracts import DatabaseContracts
 from database.max_power import DatabaseMaxPower
 from database.usage_points import DatabaseUsagePoints
 from models.query import Query
+from models.quota import GATEWAY_QUOTAS, is_fresh
 from utils import daterange
 
 
@@ -73,8 +76,14 @@ class Power:
                         output.append({"date": date, "value": data["value"]})
                     return output
                 else:
+                    quota = GATEWAY_QUOTAS.get(self.usage_point_id)
+                    if not quota.acquire(fresh=is_fresh(end)):
+                        logging.warning(" => Quota de la passerelle bientôt atteint, reporté au prochain cycle.")
+                        return []
                     logging.info(" Chargement des données depuis MyElectricalData %s => %s", begin_str, end_str)
                     data = Query(endpoint=f"{self.url}/{endpoint}/", headers=self.headers).get()
+                    if getattr(data, "status_code", None) in (CODE_409_CONFLICT, CODE_429_TOO_MANY_REQUEST):
+                        quota.exhaust()
                     blacklist = 0
                     max_histo = datetime.combine(datetime.now(tz=TIMEZONE_UTC), datetime.max.time()) - timedelta(
                         days=1
@@ -10,6 +10,7 @@ from config.main import APP_CONFIG
 from const import CODE_200_SUCCESS, URL
 from database.usage_points import DatabaseUsagePoints
 from models.query import Query
+from models.quota import GATEWAY_QUOTAS
 from utils import get_version
 
 
@@ -73,6 +74,7 @@ class Status:
                             ).replace(tzinfo=datetime.timezone.utc),
                             ban=status["ban"],
                         )
+                        GATEWAY_QUOTAS.get(usage_point_id).load()
                         return status
                     except Exception as e:
                         if APP_CONFIG.debug:
@@ -11,6 +11,7 @@ from config.main import APP_CONFIG
 from const import CODE_200_SUCCESS, TIMEZONE, URL
 from database.tempo import DatabaseTempo
 from models.query import Query
+from models.tempo_calendar import TEMPO_CALENDAR
 from utils import title
 
 
@@ -46,9 +47,12 @@ class Tempo:
             if query_response.status_code == CODE_200_SUCCESS:
                 try:
                     response_json: dict = json.loads(query_response.text)
+                    tempo_colors = {}
                     for date, color in response_json.items():
                         date_obj = datetime.strptime(date, "%Y-%m-%d").replace(tzinfo=TIMEZONE)
                         DatabaseTempo().set(date_obj, color)
+                        tempo_colors[date_obj.date()] = color
+                    TEMPO_CALENDAR.update(tempo_colors)
                     response = response_json
                 except Exception as e:
                     logging.error(e)
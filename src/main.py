@@ -36,12 +36,19 @@ def job_gateway_status():
     Job().get_gateway_status()
 
 
+@repeat_every(seconds=86400, wait_first=True)
+def job_database_maintenance():
+    """Database vacuum and optimization."""
+    Job().database_maintenance()
+
+
 @asynccontextmanager
 async def bootstrap(app: FastAPI):  # pylint: disable=unused-argument
     """Bootstap jobs."""
     await job_boot()
     await job_home_assistant()
     await job_gateway_status()
+    await job_database_maintenance()
     yield
 
 
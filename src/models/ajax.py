@@ -10,7 +10,6 @@ from database.contracts import DatabaseContracts
 from database.daily import DatabaseDaily
 from database.detail import DatabaseDetail
 from database.max_power import DatabaseMaxPower
-from database.tempo import DatabaseTempo
 from database.usage_points import DatabaseUsagePoints
 from external_services.myelectricaldata.cache import Cache
 from external_services.myelectricaldata.daily import Daily
@@ -21,6 +20,7 @@ from external_services.myelectricaldata.status import Status
 from external_services.myelectricaldata.tempo import Tempo
 from models.jobs import Job
 from models.stat import Stat
+from models.tempo_calendar import TEMPO_CALENDAR
 from utils import check_format, get_version, title
 
 utc = pytz.UTC
@@ -587,75 +587,49 @@ class Ajax:
             dict: A dictionary containing the datatable result.
         """
         with APP_CONFIG.tracer.start_as_current_span(f"{__name__}.{inspect.currentframe().f_code.co_name}"):
-            records_total = 0
             args = args._query_params  # noqa: SLF001 # pylint: disable=W0212
             draw = int(args.get("draw"))
             length = int(args.get("length"))
             search = args.get("search[value]")
             start_index = int(args.get("start"))
-            end_index = start_index + length
             order_column = int(args.get("order[0][column]"))
             order_dir = args.get("order[0][dir]")
-            all_data = []
-            data = []
-            if measurement_direction == "consumption":
-                records_total = DatabaseDaily(self.usage_point_id, "consumption").get_count()
-                col_spec = {
-                    0: "date",
-                    1: "value",
-                    2: "value",
-                    3: "value",
-                    4: "value",
-                    5: "fail_count",
-                    6: "cache",
-                    7: "import_clean",
-                    8: "blacklist",
-                }
-                all_data = DatabaseDaily(self.usage_point_id, "consumption").get_datatable(
-                    order_column=col_spec[order_column],
-                    order_dir=order_dir,
-                    search=search,
-                )
-                data = self.datatable_daily(all_data, start_index, end_index, measurement_direction)
-
-            elif measurement_direction == "consumption_detail":
-                records_total = DatabaseDetail(self.usage_point_id, "consumption").get_count()
-                col_spec = {
-                    0: "date",
-                    1: "date",
-                    2: "value",
-                    3: "value",
-                    4: "fail_count",
-                    5: "cache",
-                    6: "import_clean",
-                    7: "blacklist",
-                }
-                all_data = DatabaseDetail(self.usage_point_id, "consumption").get_datatable(
+            if measurement_direction in ["consumption", "production"]:
+                database = DatabaseDaily(self.usage_point_id, measurement_direction)
+                if measurement_direction == "consumption":
+                    col_spec = {
+                        0: "date",
+                        1: "value",
+                        2: "value",
+                        3: "value",
+                        4: "value",
+                        5: "fail_count",
+                        6: "cache",
+                        7: "import_clean",
+                        8: "blacklist",
+                    }
+                else:
+                    col_spec = {
+                        0: "date",
+                        1: "value",
+                        2: "value",
+                        3: "fail_count",
+                        4: "cache",
+                        5: "import_clean",
+                        6: "blacklist",
+                    }
+                page = database.get_datatable(
                     order_column=col_spec[order_column],
                     order_dir=order_dir,
                     search=search,
+                    start=start_index,
+                    length=length,
                 )
-                data = self.datatable_detail(all_data, start_index, end_index, measurement_direction)
-
-            elif measurement_direction == "production":
-                records_total = DatabaseDaily(self.usage_point_id, "production").get_count()
-                col_spec = {
-                    0: "date",
-                    1: "value",
-                    2: "value",
-                    3: "fail_count",
-                    4: "cache",
-                    5: "import_clean",
-                    6: "blacklist",
-                }
-                all_data = DatabaseDaily(self.usage_point_id, "consumption").get_datatable(
-                    order_column=col_spec[order_column],
-                    order_dir=order_dir,
-                    search=search,
-                )
-                data = self.datatable_daily(all_data, start_index, end_index, measurement_direction)
-            elif measurement_direction == "production_detail":
-                records_total = DatabaseDetail(self.usage_point_id, "production").get_count()
+                data = self.datatable_daily(page, measurement_direction)
+                records_total = database.get_count()
+                records_filtered = database.get_datatable_count(search)
+            elif measurement_direction in ["consumption_detail", "production_detail"]:
+                database = DatabaseDetail(self.usage_point_id, measurement_direction.split("_")[0])
                 col_spec = {
                     0: "date",
                     1: "date",
@@ -666,14 +640,18 @@ class Ajax:
                     6: "import_clean",
                     7: "blacklist",
                 }
-                all_data = DatabaseDetail(self.usage_point_id, "production").get_datatable(
+                page = database.get_datatable(
                     order_column=col_spec[order_column],
                     order_dir=order_dir,
                     search=search,
+                    start=start_index,
+                    length=length,
                 )
-                data = self.datatable_detail(all_data, start_index, end_index, measurement_direction)
+                data = self.datatable_detail(page, measurement_direction)
+                records_total = database.get_count()
+                records_filtered = database.get_datatable_count(search)
             elif measurement_direction == "consumption_max_power":
-                records_total = DatabaseMaxPower(self.usage_point_id).get_daily_count()
+                database = DatabaseMaxPower(self.usage_point_id)
                 col_spec = {
                     0: "date",
                     1: "date",
@@ -685,16 +663,24 @@ class Ajax:
                     7: "import_clean",
                     8: "blacklist",
                 }
-                all_data = DatabaseMaxPower(self.usage_point_id).get_daily_datatable(
+                page = database.get_daily_datatable(
                     order_column=col_spec[order_column],
                     order_dir=order_dir,
                     search=search,
+                    start=start_index,
+                    length=length,
                 )
-                data = self.datatable_max_power(all_data, start_index, end_index)
+                data = self.datatable_max_power(page)
+                records_total = database.get_daily_count()
+                records_filtered = database.get_daily_datatable_count(search)
+            else:
+                data = []
+                records_total = 0
+                records_filtered = 0
             result = {
                 "draw": draw + 1,
                 "recordsTotal": records_total,
-                "recordsFiltered": len(all_data),
+                "recordsFiltered": records_filtered,
                 "data": data,
             }
             return result
@@ -763,158 +749,135 @@ class Ajax:
             btn = {"cache": cache_html, "blacklist": blacklist_html}
             return btn
 
-    def datatable_daily(self, all_data, start_index, end_index, measurement_direction):
+    def datatable_daily(self, rows, measurement_direction):
         """Generate the HTML code for the daily datatable based on the provided data.
 
         Args:
-            all_data (list): The list of database data.
-            start_index (int): The start index of the datatable.
-            end_index (int): The end index of the datatable.
+            rows (list): The database rows of the page.
             measurement_direction (str): The measurement direction.
 
         Returns:
             list: The generated HTML code for the daily datatable.
         """
         with APP_CONFIG.tracer.start_as_current_span(f"{__name__}.{inspect.currentframe().f_code.co_name}"):
-            index = 0
             result = []
-            for db_data in all_data:
-                if start_index <= index <= end_index:
-                    date_text = db_data.date.strftime(self.date_format)
-                    target = "daily"
-                    # VALUE
-                    conso_w = f"""<div id="{measurement_direction}_conso_w_{date_text}">{db_data.value}</div>"""
-                    conso_kw = (
-                        f"""<div id="{measurement_direction}_conso_kw_{date_text}">{db_data.value / 1000}</div>"""
+            if measurement_direction == "consumption":
+                hc_hp = Stat(self.usage_point_id, "consumption").get_daily_hc_hp([row.date.date() for row in rows])
+            for db_data in rows:
+                date_text = db_data.date.strftime(self.date_format)
+                target = "daily"
+                # VALUE
+                conso_w = f"""<div id="{measurement_direction}_conso_w_{date_text}">{db_data.value}</div>"""
+                conso_kw = f"""<div id="{measurement_direction}_conso_kw_{date_text}">{db_data.value / 1000}</div>"""
+                fail_count = f"""<div id="{measurement_direction}_fail_count_{date_text}">{db_data.fail_count}</div>"""
+                # CACHE STATE
+                if db_data.fail_count == 0:
+                    cache_state = (
+                        f'<div id="{measurement_direction}_icon_{target}_{date_text}" class="icon_success">1</div>'
                     )
-                    fail_count = (
-                        f"""<div id="{measurement_direction}_fail_count_{date_text}">{db_data.fail_count}</div>"""
+                else:
+                    cache_state = (
+                        f'<div id="{measurement_direction}_icon_{target}_{date_text}" class="icon_failed">0</div>'
                     )
-                    # CACHE STATE
-                    if db_data.fail_count == 0:
-                        cache_state = (
-                            f'<div id="{measurement_direction}_icon_{target}_{date_text}" class="icon_success">1</div>'
-                        )
-                    else:
-                        cache_state = (
-                            f'<div id="{measurement_direction}_icon_{target}_{date_text}" class="icon_failed">0</div>'
-                        )
-                    tempo = DatabaseTempo().get_range(db_data.date, db_data.date)
-                    if tempo and tempo[0]:
-                        if tempo[0].color == "RED":
-                            temp_color = f"""
+                tempo_color = TEMPO_CALENDAR.get_color(db_data.date)
+                if tempo_color:
+                    if tempo_color == "RED":
+                        temp_color = f"""
 <div id="{measurement_direction}_tempo_{target}_{date_text}" class="tempo_red">2</div>"""
-                        elif tempo[0].color == "WHITE":
-                            temp_color = f"""
+                    elif tempo_color == "WHITE":
+                        temp_color = f"""
 <div id="{measurement_direction}_tempo_{target}_{date_text}" class="tempo_white">1</div>"""
-                        else:
-                            temp_color = f"""
-<div id="{measurement_direction}_tempo_{target}_{date_text}" class="tempo_blue">0</div>"""
-                    else:
-                        temp_color = f'<div id="{measurement_direction}_tempo_{target}_{date_text}" class="">-</div>'
-                    hc = Stat(self.usage_point_id, "consumption").get_daily(db_data.date, "hc")
-                    if hc == 0:
-                        hc = "-"
-                    else:
-                        hc = hc / 1000
-                    hp = Stat(self.usage_point_id, "consumption").get_daily(db_data.date, "hp")
-                    if hp == 0:
-                        hp = "-"
                     else:
-                        hp = hp / 1000
+                        temp_color = f"""
+<div id="{measurement_direction}_tempo_{target}_{date_text}" class="tempo_blue">0</div>"""
+                else:
+                    temp_color = f'<div id="{measurement_direction}_tempo_{target}_{date_text}" class="">-</div>'
+                buttons = self.datatable_button(measurement_direction, db_data)
+                if measurement_direction == "consumption":
+                    hc = hc_hp[db_data.date.date()]["hc"]
+                    hc = "-" if hc == 0 else hc / 1000
+                    hp = hc_hp[db_data.date.date()]["hp"]
+                    hp = "-" if hp == 0 else hp / 1000
                     hc_kw = f'<div id="{measurement_direction}_hc_{target}_{date_text}" class="">{hc}</div>'
                     hp_kw = f'<div id="{measurement_direction}_hp_{target}_{date_text}" class="">{hp}</div>'
-                    if measurement_direction == "consumption":
-                        day_data = [
-                            date_text,
-                            conso_w,
-                            conso_kw,
-                            hc_kw,
-                            hp_kw,
-                            temp_color,
-                            fail_count,
-                            cache_state,
-                            self.datatable_button(measurement_direction, db_data)["cache"],
-                            self.datatable_button(measurement_direction, db_data)["blacklist"],
-                        ]
-                    else:
-                        day_data = [
-                            date_text,
-                            conso_w,
-                            conso_kw,
-                            fail_count,
-                            cache_state,
-                            self.datatable_button(measurement_direction, db_data)["cache"],
-                            self.datatable_button(measurement_direction, db_data)["blacklist"],
-                        ]
-                    result.append(day_data)
-                index = index + 1
+                    day_data = [
+                        date_text,
+                        conso_w,
+                        conso_kw,
+                        hc_kw,
+                        hp_kw,
+                        temp_color,
+                        fail_count,
+                        cache_state,
+                        buttons["cache"],
+                        buttons["blacklist"],
+                    ]
+                else:
+                    day_data = [
+                        date_text,
+                        conso_w,
+                        conso_kw,
+                        fail_count,
+                        cache_state,
+                        buttons["cache"],
+                        buttons["blacklist"],
+                    ]
+                result.append(day_data)
             return result
 
-    def datatable_detail(self, all_data, start_index, end_index, measurement_direction):
+    def datatable_detail(self, rows, measurement_direction):
         """Generate the datatable for the detailed view of the electrical data.
 
         Args:
-            all_data (list): List of all data.
-            start_index (int): Start index of the data.
-            end_index (int): End index of the data.
+            rows (list): The database rows of the page.
             measurement_direction (str): Measurement direction.
 
         Returns:
             list: Resulting datatable.
         """
         with APP_CONFIG.tracer.start_as_current_span(f"{__name__}.{inspect.currentframe().f_code.co_name}"):
-            index = 0
             result = []
-            for db_data in all_data:
-                if start_index <= index <= end_index:
-                    date_text = db_data.date.strftime(self.date_format)
-                    date_hour = db_data.date.strftime("%H:%M:%S")
-                    target = "detail"
-                    # VALUE
-                    conso_w = f"""<div id="{measurement_direction}_conso_w_{date_text}">{db_data.value}</div>"""
-                    conso_kw = (
-                        f"""<div id="{measurement_direction}_conso_kw_{date_text}">{db_data.value / 1000}</div>"""
+            for db_data in rows:
+                date_text = db_data.date.strftime(self.date_format)
+                date_hour = db_data.date.strftime("%H:%M:%S")
+                target = "detail"
+                # VALUE
+                conso_w = f"""<div id="{measurement_direction}_conso_w_{date_text}">{db_data.value}</div>"""
+                conso_kw = f"""<div id="{measurement_direction}_conso_kw_{date_text}">{db_data.value / 1000}</div>"""
+                fail_count = f"""<div id="{measurement_direction}_fail_count_{date_text}">{db_data.fail_count}</div>"""
+                # CACHE STATE
+                if db_data.fail_count == 0:
+                    cache_state = (
+                        f'<div id="{measurement_direction}_icon_{target}_{date_text}" class="icon_success">1</div>'
                     )
-                    fail_count = (
-                        f"""<div id="{measurement_direction}_fail_count_{date_text}">{db_data.fail_count}</div>"""
+                else:
+                    cache_state = (
+                        f'<div id="{measurement_direction}_icon_{target}_{date_text}" class="icon_failed">0</div>'
                     )
-                    # CACHE STATE
-                    if db_data.fail_count == 0:
-                        cache_state = (
-                            f'<div id="{measurement_direction}_icon_{target}_{date_text}" class="icon_success">1</div>'
-                        )
-                    else:
-                        cache_state = (
-                            f'<div id="{measurement_direction}_icon_{target}_{date_text}" class="icon_failed">0</div>'
-                        )
-                    day_data = [
-                        date_text,
-                        date_hour,
-                        conso_w,
-                        conso_kw,
-                        fail_count,
-                        cache_state,
-                        self.datatable_button(measurement_direction, db_data)["cache"],
-                        self.datatable_button(measurement_direction, db_data)["blacklist"],
-                    ]
-                    result.append(day_data)
-                index = index + 1
+                buttons = self.datatable_button(measurement_direction, db_data)
+                day_data = [
+                    date_text,
+                    date_hour,
+                    conso_w,
+                    conso_kw,
+                    fail_count,
+                    cache_state,
+                    buttons["cache"],
+                    buttons["blacklist"],
+                ]
+                result.append(day_data)
             return result
 
-    def datatable_max_power(self, all_data, start_index, end_index):
+    def datatable_max_power(self, rows):
         """Generate the datatable for the maximum power data.
 
         Args:
-            all_data (list): List of all data.
-            start_index (int): Start index of the data.
-            end_index (int): End index of the data.
+            rows (list): The database rows of the page.
 
         Returns:
             list: Resulting datatable.
         """
         with APP_CONFIG.tracer.start_as_current_span(f"{__name__}.{inspect.currentframe().f_code.co_name}"):
-            index = 0
             result = []
             measurement_direction = "consumption_max_power"
             event_date = ""
@@ -924,50 +887,47 @@ class Ajax:
                 max_power = int(contract.subscribed_power.split(" ")[0]) * 1000
             else:
                 max_power = 999000
-            for db_data in all_data:
-                if start_index <= index <= end_index:
-                    date_text = db_data.date.strftime(self.date_format)
-                    ampere = f"{round(int(db_data.value) / 230, 2)}"
-                    if isinstance(db_data.event_date, datetime):
-                        event_date = db_data.event_date.strftime("%H:%M:%S")
-                    # VALUE
-                    if max_power <= int(db_data.value):
-                        style = 'style="color:#FF0000; font-weight:bolder"'
-                    elif (max_power * 90 / 100) <= db_data.value:
-                        style = 'style="color:#FFB600; font-weight:bolder"'
-                    else:
-                        style = ""
-                    data_text_event_date = f"""<div id="{measurement_direction}_conso_event_date_{date_text}"
-                    {style}>{event_date}</div>"""
-                    conso_w = (
-                        f"""<div id="{measurement_direction}_conso_w_{date_text}" {style}>{db_data.value}</div>"""
+            for db_data in rows:
+                date_text = db_data.date.strftime(self.date_format)
+                ampere = f"{round(int(db_data.value) / 230, 2)}"
+                if isinstance(db_data.event_date, datetime):
+                    event_date = db_data.event_date.strftime("%H:%M:%S")
+                # VALUE
+                if max_power <= int(db_data.value):
+                    style = 'style="color:#FF0000; font-weight:bolder"'
+                elif (max_power * 90 / 100) <= db_data.value:
+                    style = 'style="color:#FFB600; font-weight:bolder"'
+                else:
+                    style = ""
+                data_text_event_date = f"""<div id="{measurement_direction}_conso_event_date_{date_text}"
+                {style}>{event_date}</div>"""
+                conso_w = f"""<div id="{measurement_direction}_conso_w_{date_text}" {style}>{db_data.value}</div>"""
+                conso_kw = f"""<div id="{measurement_direction}_conso_kw_{date_text}"
+                {style}>{db_data.value / 1000}</div>"""
+                conso_a = f"""<div id="{measurement_direction}_conso_a_{date_text}" {style}>{ampere}</div>"""
+                fail_count = f"""<div id="{measurement_direction}_fail_count_{date_text}"
+                {style}>{db_data.fail_count}</div>"""
+
+                # CACHE STATE
+                if db_data.fail_count == 0:
+                    cache_state = (
+                        f'<div id="{measurement_direction}_icon_{target}_{date_text}" class="icon_success">1</div>'
                     )
-                    conso_kw = f"""<div id="{measurement_direction}_conso_kw_{date_text}"
-                    {style}>{db_data.value / 1000}</div>"""
-                    conso_a = f"""<div id="{measurement_direction}_conso_a_{date_text}" {style}>{ampere}</div>"""
-                    fail_count = f"""<div id="{measurement_direction}_fail_count_{date_text}"
-                    {style}>{db_data.fail_count}</div>"""
-
-                    # CACHE STATE
-                    if db_data.fail_count == 0:
-                        cache_state = (
-                            f'<div id="{measurement_direction}_icon_{target}_{date_text}" class="icon_success">1</div>'
-                        )
-                    else:
-                        cache_state = (
-                            f'<div id="{measurement_direction}_icon_{target}_{date_text}" class="icon_failed">0</div>'
-                        )
-                    day_data = [
-                        date_text,
-                        data_text_event_date,
-                        conso_w,
-                        conso_kw,
-                        conso_a,
-                        fail_count,
-                        cache_state,
-                        self.datatable_button(measurement_direction, db_data)["cache"],
-                        self.datatable_button(measurement_direction, db_data)["blacklist"],
-                    ]
-                    result.append(day_data)
-                index = index + 1
+                else:
+                    cache_state = (
+                        f'<div id="{measurement_direction}_icon_{target}_{date_text}" class="icon_failed">0</div>'
+                    )
+                buttons = self.datatable_button(measurement_direction, db_data)
+                day_data = [
+                    date_text,
+                    data_text_event_date,
+                    conso_w,
+                    conso_kw,
+                    conso_a,
+                    fail_count,
+                    cache_state,
+                    buttons["cache"],
+                    buttons["blacklist"],
+                ]
+                result.append(day_data)
             return result
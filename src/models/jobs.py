@@ -1,8 +1,11 @@
 """This module contains the Job class, which is responsible for importing data from the API."""
 
+import contextvars
+import copy
 import logging
 import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 
 from config.main import APP_CONFIG
@@ -12,6 +15,7 @@ from database.usage_points import DatabaseUsagePoints
 from external_services.home_assistant.main import HomeAssistant
 from external_services.home_assistant_ws.main import HomeAssistantWs
 from external_services.influxdb.main import ExportInfluxDB
+from external_services.mqtt.client import Mqtt
 from external_services.mqtt.main import ExportMqtt
 from external_services.myelectricaldata.address import Address
 from external_services.myelectricaldata.contract import Contract
@@ -21,8 +25,26 @@ from external_services.myelectricaldata.ecowatt import Ecowatt
 from external_services.myelectricaldata.power import Power
 from external_services.myelectricaldata.status import Status
 from external_services.myelectricaldata.tempo import Tempo
+from models.rollup import Rollup
 from models.stat import Stat
-from utils import export_finish, finish, get_version, log_usage_point_id, title
+from utils import LOG_USAGE_POINT_ID, export_finish, finish, get_version, log_usage_point_id, title
+
+# Value of the target parameter of Job.job_import_data selecting each step.
+STEP_TARGETS = {
+    "get_account_status": "account_status",
+    "get_contract": "contract",
+    "get_addresses": "addresses",
+    "get_consumption": "consumption",
+    "get_consumption_detail": "consumption_detail",
+    "get_production": "production",
+    "get_production_detail": "production_detail",
+    "get_consumption_max_power": "consumption_max_power",
+    "stat_price": "stat",
+    "export_mqtt": "mqtt",
+    "export_home_assistant": "home_assistant",
+    "export_home_assistant_ws": "home_assistant_ws",
+    "export_influxdb": "influxdb",
+}
 
 
 class Job:
@@ -33,6 +55,8 @@ class Job:
         self.usage_point_config: UsagePointId = {}
         self.wait_job_start: int = 10
         self.tempo_enable: bool = False
+        self.mqtt: Mqtt = None
+        self.workers: int = None
         if self.usage_point_id is None:
             self.usage_points_all: List[UsagePointId] = DatabaseUsagePoints().get_all()
         else:
@@ -45,7 +69,7 @@ class Job:
         else:
             self.job_import_data()
 
-    def job_import_data(self, wait=True, target=None):  # noqa: PLR0912, C901
+    def job_import_data(self, wait=True, target=None):
         """Import data from the API."""
         if DB.lock_status():
             return {"status": False, "notif": "Importation déjà en cours..."}
@@ -69,79 +93,114 @@ class Job:
         if target == "ecowatt" or target is None:
             self.get_ecowatt()
 
-        for usage_point_config in self.usage_points_all:
-            self.usage_point_config = usage_point_config
-            usage_point_id = usage_point_config.usage_point_id
-            log_usage_point_id(usage_point_id)
-            DatabaseUsagePoints(usage_point_id).last_call_update()
-            if usage_point_config.enable:
-                #######################################################################################################
-                # CHECK ACCOUNT DATA
-                if target == "account_status" or target is None:
-                    self.get_account_status()
-
-                #######################################################################################################
-                # CONTRACT
-                if target == "contract" or target is None:
-                    self.get_contract()
-
-                #######################################################################################################
-                # ADDRESSE
-                if target == "addresses" or target is None:
-                    self.get_addresses()
-
-                #######################################################################################################
-                # CONSUMPTION / PRODUCTION
-                if target == "consumption" or target is None:
-                    self.get_consumption()
-
-                if target == "consumption_detail" or target is None:
-                    self.get_consumption_detail()
-
-                if target == "production" or target is None:
-                    self.get_production()
-
-                if target == "production_detail" or target is None:
-                    self.get_production_detail()
-
-                if target == "consumption_max_power" or target is None:
-                    self.get_consumption_max_power()
-
-                #######################################################################################################
-                # STATISTIQUES
-                if target == "stat" or target is None:
-                    self.stat_price()
-
-                #######################################################################################################
-                # MQTT
-                if target == "mqtt" or target is None:
-                    self.export_mqtt()
-
-                #######################################################################################################
-                # HOME ASSISTANT
-                if target == "home_assistant" or target is None:
-                    self.export_home_assistant()
-
-                #######################################################################################################
-                # HOME ASSISTANT WS
-                if target == "home_assistant_ws" or target is None:
-                    self.export_home_assistant_ws()
-
-                #######################################################################################################
-                # INFLUXDB
-                if target == "influxdb" or target is None:
-                    self.export_influxdb()
-            else:
-                logging.info(
-                    " => Point de livraison Désactivé dans la configuration (Exemple: https://tinyurl.com/2kbd62s9)."
+        # The MQTT exports of all the usage points share one connection: the broker drops the session of a client
+        # id as soon as another connection opens with it.
+        if (APP_CONFIG.mqtt.enable or APP_CONFIG.home_assistant.enable) and target in (None, "mqtt", "home_assistant"):
+            self.mqtt = Mqtt()
+
+        # The gateway.workers threads are shared by the usage points imported at the same time.
+        workers = max(1, min(APP_CONFIG.gateway.workers, len(self.usage_points_all)))
+        share = max(1, APP_CONFIG.gateway.workers // workers)
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="import") as executor:
+                list(
+                    executor.map(lambda config: self.import_usage_point(config, target, share), self.usage_points_all)
                 )
+        else:
+            for usage_point_config in self.usage_points_all:
+                self.import_usage_point(usage_point_config, target, share)
+
+        if self.mqtt is not None:
+            self.mqtt.disconnect()
+            self.mqtt = None
 
         finish()
 
         self.usage_point_id = None
         DB.unlock()
+        DB.optimize()
         return {"status": True, "notif": "Importation terminée"}
 
+    def import_usage_point(self, usage_point_config, target=None, workers=None):
+        """Import the data of a usage point and export it.
+
+        The steps run on a copy of the job bound to the usage point, so that several usage points can be imported
+        at the same time, and their logs are prefixed with the usage point ID. The gateway calls that don't depend
+        on each other (the daily, detail and max power records) and the exports run concurrently when the usage
+        point has more than one worker.
+
+        Args:
+            usage_point_config (UsagePointId): The usage point configuration.
+            target (str, optional): The only step to run. Defaults to None (all the steps).
+            workers (int, optional): The threads of the usage point. Defaults to None (gateway.workers).
+        """
+        usage_point_id = usage_point_config.usage_point_id
+        job = copy.copy(self)
+        job.usage_point_id = usage_point_id
+        job.usage_point_config = usage_point_config
+        job.workers = workers
+        token = LOG_USAGE_POINT_ID.set(usage_point_id)
+        try:
+            log_usage_point_id(usage_point_id)
+            DatabaseUsagePoints(usage_point_id).last_call_update()
+            if not usage_point_config.enable:
+                logging.info(
+                    " => Point de livraison Désactivé dans la configuration (Exemple: https://tinyurl.com/2kbd62s9)."
+                )
+                return
+            for steps in (
+                # Account status & contract
+                ["get_account_status", "get_contract", "get_addresses"],
+                # Consumption / production
+                [
+                    "get_consumption",
+                    "get_consumption_detail",
+                    "get_production",
+                    "get_production_detail",
+                    "get_consumption_max_power",
+                ],
+                # Statistics
+                ["stat_price"],
+                # Exports
+                ["export_mqtt", "export_home_assistant", "export_home_assistant_ws", "export_influxdb"],
+            ):
+                job.run_steps([step for step in steps if target in (None, STEP_TARGETS[step])])
+        except Exception as e:
+            traceback.print_exc()
+            logging.error(f"[{usage_point_id}] Erreur lors de l'importation du point de livraison")
+            logging.error(e)
+        finally:
+            LOG_USAGE_POINT_ID.reset(token)
+
+    def run_steps(self, steps):
+        """Run steps that don't depend on each other, concurrently if the job has more than one worker.
+
+        The workers of the job are split between the steps running at the same time.
+
+        Args:
+            steps (list): The names of the Job methods to run.
+        """
+        workers = min(self.get_workers(), len(steps))
+        if workers > 1:
+            job = copy.copy(self)
+            job.workers = max(1, self.get_workers() // workers)
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="step") as executor:
+                # The steps threads keep the context of the usage point (log prefix).
+                futures = [executor.submit(contextvars.copy_context().run, getattr(job, step)) for step in steps]
+                for future in futures:
+                    future.result()
+        else:
+            for step in steps:
+                getattr(self, step)()
+
+    def get_workers(self):
+        """Return the number of threads the job may use.
+
+        Returns:
+            int: The workers of the job, gateway.workers by default.
+        """
+        return self.workers or APP_CONFIG.gateway.workers
+
     def header_generate(self, token=True):
         """Generate the header for the API request.
 
@@ -178,6 +237,20 @@ class Job:
             logging.error(f"Erreur lors de la {detail.lower()}")
             logging.error(e)
 
+    def database_maintenance(self):
+        """Vacuum and optimize the database, unless an import is running."""
+        if DB.lock_status():
+            return
+        detail = "Maintenance de la base de données"
+        try:
+            title(detail)
+            DB.vacuum()
+            DB.optimize()
+        except Exception as e:
+            traceback.print_exc()
+            logging.error(f"Erreur lors de la {detail.lower()}")
+            logging.error(e)
+
     def get_account_status(self):
         """Retrieve the account status information.
 
@@ -320,7 +393,7 @@ class Job:
             usage_point_id = usage_point_config.usage_point_id
             title(f"[{usage_point_id}] {detail}")
             if hasattr(usage_point_config, "consumption_detail") and usage_point_config.consumption_detail:
-                Detail(headers=self.header_generate(), usage_point_id=usage_point_id).get()
+                Detail(headers=self.header_generate(), usage_point_id=usage_point_id, workers=self.get_workers()).get()
                 export_finish()
             else:
                 logging.info(f"{detail} désactivée sur le point de livraison")
@@ -378,6 +451,7 @@ class Job:
                     headers=self.header_generate(),
                     usage_point_id=usage_point_id,
                     measure_type="production",
+                    workers=self.get_workers(),
                 ).get()
                 export_finish()
             else:
@@ -459,6 +533,12 @@ class Job:
             if hasattr(usage_point_config, "production_detail") and usage_point_config.production_detail:
                 logging.info("Production :")
                 Stat(usage_point_id=usage_point_id, measurement_direction="production").generate_price()
+            for measurement_direction in ["consumption", "production"]:
+                if getattr(usage_point_config, measurement_direction, False) or getattr(
+                    usage_point_config, f"{measurement_direction}_detail", False
+                ):
+                    logging.info(f'Cumuls "{measurement_direction.upper()}" :')
+                    Rollup(usage_point_id, measurement_direction).refresh()
             export_finish()
 
         try:
@@ -480,9 +560,9 @@ class Job:
         def run(usage_point_id, target):
             title(f"[{usage_point_id}] {detail}")
             if target is None:
-                HomeAssistant(usage_point_id).export()
+                HomeAssistant(usage_point_id, self.mqtt).export()
             elif target == "ecowatt":
-                HomeAssistant(usage_point_id).ecowatt()
+                HomeAssistant(usage_point_id, self.mqtt).ecowatt()
             export_finish()
 
         try:
@@ -532,6 +612,6 @@ class Job:
         usage_point_id = self.usage_point_config.usage_point_id
         title(f"[{usage_point_id}] {detail}")
         if APP_CONFIG.mqtt.enable:
-            ExportMqtt(usage_point_id)
+            ExportMqtt(usage_point_id, self.mqtt)
         else:
             title("Désactivé dans la configuration (Exemple: https://tinyurl.com/2kbd62s9)")
@@ -0,0 +1,86 @@
+"""Compiled off-peak (HC) calendar of a usage point."""
+from datetime import datetime
+from functools import lru_cache
+
+MINUTES_PER_DAY = 1440
+
+
+class OffpeakCalendar:
+    """Minute-of-week lookup table classifying timestamps in HP or HC.
+
+    The off-peak hours strings ("22H00-6H00;12h30-14h00") are parsed once, then every classification is a single
+    index lookup instead of splitting and parsing the strings for each measure.
+
+    Attributes:
+        ranges (dict): The off-peak ranges indexed by weekday (0 = monday), as lists of (begin, end) minutes.
+        table (bytes): The 7x1440 minute-of-week table, 1 for off-peak (HC) and 0 for peak (HP).
+    """
+
+    def __init__(self, offpeak_hours):
+        """Initialize the calendar.
+
+        Args:
+            offpeak_hours (tuple): The seven off-peak hours strings, from monday to sunday.
+        """
+        self.ranges = {}
+        table = bytearray(7 * MINUTES_PER_DAY)
+        for weekday, day_offpeak_hours in enumerate(offpeak_hours):
+            self.ranges[weekday] = []
+            if day_offpeak_hours is None:
+                continue
+            for offpeak_hour in day_offpeak_hours.split(";"):
+                if offpeak_hour in ("None", ""):
+                    continue
+                offpeak_range = []
+                for hour_minute in offpeak_hour.split("-")[:2]:
+                    hour = datetime.strptime(hour_minute.replace("h", ":").replace("H", ":"), "%H:%M")  # noqa: DTZ007
+                    offpeak_range.append(hour.hour * 60 + hour.minute)
+                begin, end = offpeak_range
+                self.ranges[weekday].append((begin, end))
+                day_offset = weekday * MINUTES_PER_DAY
+                if end < begin:
+                    table[day_offset + begin : day_offset + MINUTES_PER_DAY] = b"\x01" * (MINUTES_PER_DAY - begin)
+                    table[day_offset : day_offset + end] = b"\x01" * end
+                elif begin < end:
+                    table[day_offset + begin : day_offset + end] = b"\x01" * (end - begin)
+        self.table = bytes(table)
+
+    def measure_type(self, date):
+        """Classify a timestamp.
+
+        Args:
+            date (datetime): The timestamp.
+
+        Returns:
+            str: "HC" for off-peak, "HP" otherwise.
+        """
+        if self.table[date.weekday() * MINUTES_PER_DAY + date.hour * 60 + date.minute]:
+            return "HC"
+        return "HP"
+
+    def classify(self, dates):
+        """Classify a batch of timestamps.
+
+        Args:
+            dates (iterable): The timestamps.
+
+        Returns:
+            list: "HC" or "HP" for each timestamp, in the same order.
+        """
+        table = self.table
+        return [
+            "HC" if table[date.weekday() * MINUTES_PER_DAY + date.hour * 60 + date.minute] else "HP" for date in dates
+        ]
+
+
+@lru_cache(maxsize=64)
+def get_offpeak_calendar(offpeak_hours):
+    """Return the compiled calendar for the given off-peak hours, compiled once per distinct configuration.
+
+    Args:
+        offpeak_hours (tuple): The seven off-peak hours strings, from monday to sunday.
+
+    Returns:
+        OffpeakCalendar: The compiled calendar.
+    """
+    return OffpeakCalendar(offpeak_hours)
@@ -1,10 +1,84 @@
 """Request."""
 
 import logging
+import random
+import threading
+import time
 
 import requests
 
 from config.main import APP_CONFIG
+from const import (
+    GATEWAY_CONNECT_TIMEOUT,
+    GATEWAY_MAX_RETRY,
+    GATEWAY_POOL_SIZE,
+    GATEWAY_READ_TIMEOUT,
+    GATEWAY_READ_TIMEOUTS,
+    GATEWAY_RETRY_BACKOFF,
+    GATEWAY_RETRY_STATUS,
+)
+
+
+class RateLimit:
+    """Spread the calls made from all the threads so that they don't exceed a number of calls per second."""
+
+    def __init__(self):
+        """Initialize RateLimit."""
+        self.lock = threading.Lock()
+        self.next_call = 0.0
+
+    def wait(self, rate):
+        """Wait for the next free call slot.
+
+        Args:
+            rate (float): The maximum number of calls per second (0 disables the limit).
+        """
+        if not rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            call = max(now, self.next_call)
+            self.next_call = call + 1 / rate
+        if call > now:
+            time.sleep(call - now)
+
+
+GATEWAY_RATE_LIMIT = RateLimit()
+
+
+def get_session():
+    """Return the HTTP session shared by all the gateway calls, to reuse its keep-alive connections.
+
+    Returns:
+        requests.Session: The session.
+    """
+    global SESSION  # noqa: PLW0603
+    with SESSION_LOCK:
+        if SESSION is None:
+            SESSION = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=GATEWAY_POOL_SIZE)
+            SESSION.mount("https://", adapter)
+            SESSION.mount("http://", adapter)
+        return SESSION
+
+
+def get_timeout(endpoint):
+    """Return the timeouts of a gateway endpoint.
+
+    Args:
+        endpoint (str): The endpoint URL.
+
+    Returns:
+        tuple: The connect and read timeouts, in seconds.
+    """
+    for path, timeout in GATEWAY_READ_TIMEOUTS.items():
+        if path in endpoint:
+            return GATEWAY_CONNECT_TIMEOUT, timeout
+    return GATEWAY_CONNECT_TIMEOUT, GATEWAY_READ_TIMEOUT
+
+
+SESSION = None
+SESSION_LOCK = threading.Lock()
 
 
 class Query(object):
@@ -12,125 +86,78 @@ class Query(object):
 
     def __init__(self, endpoint, headers=None):
         self.endpoint = endpoint
-        self.timeout = 60
+        self.timeout = get_timeout(endpoint)
         if not headers:
             self.headers = {"Content-Type": "application/x-www-form-urlencoded"}
         else:
             self.headers = headers
 
-    def get(self, params=None):
-        """Get."""
-        logging.debug(f"[GET] Endpoint {self.endpoint}")
+    def request(self, method, params=None, data=None):
+        """Send a request on the shared session.
+
+        The idempotent requests failing on a network error or a temporary gateway error (502, 503 or 504) are sent
+        again, after an exponential backoff with jitter.
+
+        Args:
+            method (str): The HTTP method.
+            params (dict, optional): The query parameters. Defaults to None.
+            data (dict, optional): The request body. Defaults to None.
+
+        Returns:
+            requests.Response: The response ({} if the request failed).
+        """
+        logging.debug(f"[{method}] Endpoint {self.endpoint}")
         logging.debug(f" - url : {self.endpoint}")
         logging.debug(f" - headers : {self.headers}")
         logging.debug(f" - params : {params}")
+        if data is not None:
+            logging.debug(f" - data : {data}")
+        attempts = GATEWAY_MAX_RETRY + 1 if method in ("GET", "PUT", "DELETE") else 1
         response = {}
-        try:
-            response = requests.request(
-                "GET",
-                headers=self.headers,
-                params=params,
-                url=self.endpoint,
-                timeout=self.timeout,
-                verify=APP_CONFIG.gateway.ssl,
-            )
-            logging.debug(f"[RESPONSE] : status_code {response.status_code}")
-            logging.debug(f" => {response.text}...")
-        except Exception as e:
-            logging.error(e)
+        for attempt in range(attempts):
+            if attempt:
+                delay = random.uniform(0, GATEWAY_RETRY_BACKOFF * 2 ** (attempt - 1))  # noqa: S311
+                logging.warning(f"Nouvelle tentative dans {delay:.1f}s ({attempt}/{GATEWAY_MAX_RETRY})")
+                time.sleep(delay)
+            try:
+                GATEWAY_RATE_LIMIT.wait(APP_CONFIG.gateway.rate_limit)
+                response = get_session().request(
+                    method,
+                    headers=self.headers,
+                    params=params,
+                    data=data,
+                    url=self.endpoint,
+                    timeout=self.timeout,
+                    verify=APP_CONFIG.gateway.ssl,
+                )
+                logging.debug(f"[RESPONSE] : status_code {response.status_code}")
+                logging.debug(f" => {response.text}...")
+                if response.status_code not in GATEWAY_RETRY_STATUS:
+                    break
+            except requests.exceptions.RequestException as e:
+                logging.error(e)
+                response = {}
+            except Exception as e:
+                logging.error(e)
+                break
         return response
 
+    def get(self, params=None):
+        """Get."""
+        return self.request("GET", params=params)
+
     def post(self, params=None, data=None):
         """Post."""
-        logging.debug(f"[POST] Endpoint {self.endpoint}")
-        logging.debug(f" - url : {self.endpoint}")
-        logging.debug(f" - headers : {self.headers}")
-        logging.debug(f" - params : {params}")
-        logging.debug(f" - data : {data}")
-        response = {}
-        try:
-            response = requests.request(
-                "POST",
-                headers=self.headers,
-                params=params,
-                data=data,
-                url=self.endpoint,
-                timeout=self.timeout,
-                verify=APP_CONFIG.gateway.ssl,
-            )
-            logging.debug(f"[RESPONSE] : status_code {response.status_code}")
-            logging.debug(f" => {response.text}...")
-        except Exception:
-            logging.error(response)
-        return response
+        return self.request("POST", params=params, data=data)
 
     def delete(self, params=None, data=None):
         """Delete."""
-        logging.debug(f"[DELETE] Endpoint {self.endpoint}")
-        logging.debug(f" - headers : {self.headers}")
-        logging.debug(f" - params : {params}")
-        logging.debug(f" - data : {data}")
-        response = {}
-        try:
-            response = requests.request(
-                "DELETE",
-                headers=self.headers,
-                params=params,
-                data=data,
-                url=self.endpoint,
-                timeout=self.timeout,
-                verify=APP_CONFIG.gateway.ssl,
-            )
-            logging.debug(f"[RESPONSE] : status_code {response.status_code}")
-            logging.debug(f" => {response.text}...")
-            return response
-        except Exception:
-            logging.error(response)
-        return response
+        return self.request("DELETE", params=params, data=data)
 
     def update(self, params=None, data=None):
         """Update."""
-        logging.debug(f"[UPDATE] Endpoint {self.endpoint}")
-        logging.debug(f" - headers : {self.headers}")
-        logging.debug(f" - params : {params}")
-        logging.debug(f" - data : {data}")
-        response = {}
-        try:
-            response = requests.request(
-                "UPDATE",
-                headers=self.headers,
-                params=params,
-                data=data,
-                url=self.endpoint,
-                timeout=self.timeout,
-                verify=APP_CONFIG.gateway.ssl,
-            )
-            logging.debug(f"[RESPONSE] : status_code {response.status_code}")
-            logging.debug(f" => {response.text}...")
-            return response
-        except Exception:
-            logging.error(response)
-        return response
+        return self.request("UPDATE", params=params, data=data)
 
     def put(self, params=None, data=None):
         """Put."""
-        logging.debug(f"[PUT] Endpoint {self.endpoint}")
-        logging.debug(f" - headers : {self.headers}")
-        logging.debug(f" - params : {params}")
-        logging.debug(f" - data : {data}")
-        response = {}
-        try:
-            response = requests.request(
-                "PUT",
-                headers=self.headers,
-                params=params,
-                data=data,
-                url=self.endpoint,
-                timeout=self.timeout,
-                verify=APP_CONFIG.gateway.ssl,
-            )
-            logging.debug(f"[RESPONSE] : status_code {response.status_code}")
-            logging.debug(f" => {response.text}...")
-        except Exception:
-            logging.error(response)
-        return response
+        return self.request("PUT", params=params, data=data)
@@ -0,0 +1,110 @@
+"""Gateway call quota of the usage points."""
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+from const import QUOTA_FRESH_DAYS, QUOTA_FRESH_RESERVE, TIMEZONE
+from database.usage_points import DatabaseUsagePoints
+
+
+def is_fresh(end):
+    """Tell if a range of data ending at a date holds the latest published data.
+
+    Args:
+        end (datetime): The end of the range.
+
+    Returns:
+        bool: True if the range ends less than QUOTA_FRESH_DAYS days ago.
+    """
+    today = datetime.combine(datetime.now(tz=TIMEZONE), datetime.min.time())
+    return end.replace(tzinfo=None) >= today - timedelta(days=QUOTA_FRESH_DAYS)
+
+
+class Quota:
+    """Token bucket of the gateway calls left to a usage point until its quota is reset.
+
+    The bucket is filled from the call_number, quota_limit, quota_reached and quota_reset_at fields of the usage
+    point, which the account status keeps up to date, and refilled once the reset date is passed. The last
+    QUOTA_FRESH_RESERVE calls are kept for the latest data: the historical backfill stops before and resumes on the
+    next cycle.
+    """
+
+    def __init__(self, usage_point_id):
+        """Initialize Quota.
+
+        Args:
+            usage_point_id (str): The usage point ID.
+        """
+        self.usage_point_id = usage_point_id
+        self.lock = threading.Lock()
+        self.limit = None
+        self.tokens = None
+        self.reset_at = None
+        self.load()
+
+    def load(self):
+        """Fill the bucket from the quota fields of the usage point (no limit if the quota is unknown)."""
+        usage_point = DatabaseUsagePoints(self.usage_point_id).get()
+        with self.lock:
+            self.limit = getattr(usage_point, "quota_limit", None) or None
+            self.reset_at = getattr(usage_point, "quota_reset_at", None)
+            if self.reset_at is not None and self.reset_at.tzinfo is None:
+                self.reset_at = self.reset_at.replace(tzinfo=timezone.utc)
+            if self.limit is None:
+                self.tokens = None
+            elif usage_point.quota_reached:
+                self.tokens = 0
+            else:
+                self.tokens = max(self.limit - (usage_point.call_number or 0), 0)
+
+    def acquire(self, fresh=True):
+        """Take a call from the bucket.
+
+        Args:
+            fresh (bool, optional): True for the latest data, False for the backfill. Defaults to True.
+
+        Returns:
+            bool: True if the call can be made, False if it must wait for the next cycle.
+        """
+        with self.lock:
+            if self.reset_at is not None and datetime.now(tz=timezone.utc) >= self.reset_at:
+                self.tokens = self.limit
+                self.reset_at = None
+            if self.tokens is None:
+                return True
+            if self.tokens > (0 if fresh else QUOTA_FRESH_RESERVE):
+                self.tokens -= 1
+                return True
+            return False
+
+    def exhaust(self):
+        """Empty the bucket, when the gateway answers that the quota is reached."""
+        with self.lock:
+            self.tokens = 0
+        logging.warning(f"[{self.usage_point_id}] Quota d'appels à la passerelle atteint.")
+
+
+class Quotas:
+    """The quota of each usage point, shared by all the threads of an import."""
+
+    def __init__(self):
+        """Initialize Quotas."""
+        self.quotas = {}
+        self.lock = threading.Lock()
+
+    def get(self, usage_point_id):
+        """Return the quota of a usage point, loading it on first use.
+
+        Args:
+            usage_point_id (str): The usage point ID.
+
+        Returns:
+            Quota: The quota.
+        """
+        with self.lock:
+            if usage_point_id not in self.quotas:
+                self.quotas[usage_point_id] = Quota(usage_point_id)
+            return self.quotas[usage_point_id]
+
+
+GATEWAY_QUOTAS = Quotas()
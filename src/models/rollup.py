@@ -0,0 +1,219 @@
+"""Day, week, month and year sums of a usage point."""
+import calendar
+import hashlib
+import json
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+
+from const import TEMPO_BEGIN, TEMPO_END, TIMEZONE
+from database.daily import DatabaseDaily
+from database.detail import DatabaseDetail
+from database.rollup import DatabaseRollup
+from database.statistique import DatabaseStatistique
+from database.usage_points import DatabaseUsagePoints
+from models.offpeak import get_offpeak_calendar
+from models.tempo_calendar import TEMPO_CALENDAR
+
+PERIODS = ("week", "month", "year")
+# Detail records read at once
+BATCH_SIZE = 1000
+
+
+def period_start(period, day):
+    """Return the first day of the period containing a day.
+
+    Args:
+        period (str): The period (day, week, month or year).
+        day (date): The day.
+
+    Returns:
+        date: The first day of the period.
+    """
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    if period == "year":
+        return day.replace(month=1, day=1)
+    return day
+
+
+def day_range(index=0):
+    """Return the bounds of yesterday minus index days, like Stat.daily."""
+    day = datetime.now(tz=timezone.utc).date() - timedelta(days=index + 1)
+    return day, day
+
+
+def week_range(year, month=None):
+    """Return the bounds of the week of the current day in the given year and month, like Stat.get_week."""
+    today = datetime.now(tz=TIMEZONE).date()
+    if month is None:
+        month = today.month
+    # adapt for day in leap-year
+    if today.strftime("%m%d") == "0229" and int(year) != today.year:
+        today = today + timedelta(days=1)
+    start = today.replace(year=year, month=month) - timedelta(days=today.replace(year=year, month=month).weekday())
+    return start, start + timedelta(days=6)
+
+
+def month_range(year, month=None):
+    """Return the bounds of a month, like Stat.get_month."""
+    if month is None:
+        month = datetime.now(tz=TIMEZONE).month
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def year_range(year):
+    """Return the bounds of a year, like Stat.get_year."""
+    return date(year, 1, 1), date(year, 12, 31)
+
+
+class Rollup:
+    """Sums of the measurements of a usage point per day, week, month and year, kept in the rollup table.
+
+    The day sums are computed from the daily records (BASE) and the detail records (HP/HC and tempo colors, in Wh),
+    the week, month and year sums from the day sums. Like the price, each month is saved with its signature (number
+    of records, sum of the values, last date and tempo colors) and only the changed months are computed again.
+    """
+
+    def __init__(self, usage_point_id, measurement_direction="consumption"):
+        """Initialize Rollup.
+
+        Args:
+            usage_point_id (str): The usage point ID.
+            measurement_direction (str, optional): The measurement direction. Defaults to "consumption".
+        """
+        self.usage_point_id = usage_point_id
+        self.measurement_direction = measurement_direction
+        self.db = DatabaseRollup(usage_point_id, measurement_direction)
+        self.state_key = f"rollup_{measurement_direction}_state"
+
+    def get(self):
+        """Retrieve all the sums, in a single query.
+
+        Returns:
+            dict: The sums indexed by (period, period start (date), measure type).
+        """
+        return self.db.get()
+
+    def get_offpeak_hours(self):
+        """Return the seven off-peak hours strings of the usage point, from monday to sunday."""
+        usage_point = DatabaseUsagePoints(self.usage_point_id).get()
+        return tuple(getattr(usage_point, f"offpeak_hours_{weekday}") for weekday in range(0, 7))
+
+    def get_signatures(self):
+        """Compute the signature of each month of records.
+
+        Returns:
+            dict: The daily, detail and tempo signatures indexed by month ("YYYY-MM").
+        """
+        months = defaultdict(dict)
+        for key, database in (
+            ("daily", DatabaseDaily(self.usage_point_id, self.measurement_direction)),
+            ("detail", DatabaseDetail(self.usage_point_id, self.measurement_direction)),
+        ):
+            for (year, month), (count, total, last_date) in database.get_month_signature().items():
+                months[f"{year}-{month:02d}"][key] = [count, int(total), last_date.isoformat()]
+        if self.measurement_direction == "consumption":
+            for day, color in TEMPO_CALENDAR.get_all().items():
+                month = months.get(f"{day.year}-{day.month:02d}")
+                if month is not None:
+                    month["tempo"] = month.get("tempo", "") + color[0]
+        return dict(months)
+
+    def refresh(self):
+        """Compute again the sums of the months changed since the last refresh.
+
+        Returns:
+            int: The number of months computed.
+        """
+        offpeak_hours = self.get_offpeak_hours()
+        settings = hashlib.md5(json.dumps(offpeak_hours).encode("utf-8")).hexdigest()  # noqa: S324
+        statistique = DatabaseStatistique(self.usage_point_id)
+        state = statistique.get(self.state_key)
+        state = json.loads(state[0].value) if state else {}
+        if state.get("settings") == settings:
+            previous = state.get("months", {})
+        else:
+            previous = {}
+            self.db.delete()
+        months = self.get_signatures()
+        changed = sorted(key for key in months.keys() | previous.keys() if months.get(key) != previous.get(key))
+        if not changed:
+            return 0
+        offpeak_calendar = get_offpeak_calendar(offpeak_hours)
+        for month_key in changed:
+            logging.info(f" - {month_key.replace('-', ' / ')}")
+            year, month = month_key.split("-")
+            self.refresh_days(int(year), int(month), offpeak_calendar)
+        first_year, first_month = changed[0].split("-")
+        last_year, last_month = changed[-1].split("-")
+        self.refresh_periods(
+            month_range(int(first_year), int(first_month))[0], month_range(int(last_year), int(last_month))[1]
+        )
+        statistique.set(self.state_key, json.dumps({"settings": settings, "months": months}))
+        return len(changed)
+
+    def refresh_days(self, year, month, offpeak_calendar):
+        """Compute the day sums of a month.
+
+        Args:
+            year (int): The year.
+            month (int): The month.
+            offpeak_calendar (OffpeakCalendar): The off-peak calendar of the usage point.
+        """
+        first_day, last_day = month_range(year, month)
+        begin = TIMEZONE.localize(datetime.combine(first_day, datetime.min.time()))
+        end = TIMEZONE.localize(datetime.combine(last_day, datetime.max.time()))
+        values = defaultdict(float)
+        daily = DatabaseDaily(self.usage_point_id, self.measurement_direction)
+        for day, value in daily.get_sum_by_day(begin, end).items():
+            values[(datetime.combine(day, datetime.min.time()), "BASE")] += value
+        tempo_colors = TEMPO_CALENDAR.get_all() if self.measurement_direction == "consumption" else {}
+        detail = DatabaseDetail(self.usage_point_id, self.measurement_direction)
+        for rows in detail.get_batches(BATCH_SIZE, begin, end):
+            for row, measure_type in zip(rows, offpeak_calendar.classify(row.date for row in rows)):
+                day = datetime.combine(row.date.date(), datetime.min.time())
+                interval = row.interval if row.interval != 0 else 1
+                wh = row.value / (60 / interval)
+                values[(day, measure_type)] += wh
+                color = tempo_colors.get(row.date.date())
+                if color:
+                    if TEMPO_BEGIN <= row.date.hour * 100 + row.date.minute < TEMPO_END:
+                        values[(day, f"{color}_HP")] += wh
+                    else:
+                        values[(day, f"{color}_HC")] += wh
+        self.db.set(
+            "day",
+            datetime.combine(first_day, datetime.min.time()),
+            datetime.combine(last_day, datetime.min.time()),
+            values,
+        )
+
+    def refresh_periods(self, first_day, last_day):
+        """Compute the week, month and year sums of the periods overlapping two days, from the day sums.
+
+        Args:
+            first_day (date): The first day.
+            last_day (date): The last day.
+        """
+        begin = min(period_start("week", first_day), period_start("year", first_day))
+        end = max(period_start("week", last_day) + timedelta(days=6), date(last_day.year, 12, 31))
+        days = self.db.get(
+            "day", datetime.combine(begin, datetime.min.time()), datetime.combine(end, datetime.min.time())
+        )
+        for period in PERIODS:
+            period_begin = period_start(period, first_day)
+            period_end = period_start(period, last_day)
+            values = defaultdict(float)
+            for (_, day, measure_type), value in days.items():
+                start = period_start(period, day)
+                if period_begin <= start <= period_end:
+                    values[(datetime.combine(start, datetime.min.time()), measure_type)] += value
+            self.db.set(
+                period,
+                datetime.combine(period_begin, datetime.min.time()),
+                datetime.combine(period_end, datetime.min.time()),
+                values,
+            )
@@ -1,25 +1,60 @@
 """Generate all statistical data for a usage point."""
 import calendar
+import hashlib
 import json
 import logging
-from datetime import date, datetime, timedelta, timezone
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, namedtuple
+from datetime import date, datetime, time, timedelta, timezone
+from itertools import accumulate
 
 from dateutil.relativedelta import relativedelta
 
-from const import TEMPO_BEGIN, TEMPO_END
+from const import TEMPO_BEGIN, TEMPO_END, TIMEZONE
 from database.contracts import DatabaseContracts
 from database.daily import DatabaseDaily
 from database.detail import DatabaseDetail
 from database.max_power import DatabaseMaxPower
+from database.metadata import METADATA_CACHE
 from database.statistique import DatabaseStatistique
 from database.tempo import DatabaseTempo
 from database.usage_points import DatabaseUsagePoints
-from utils import is_between
+from db_schema import ConsumptionDailyMaxPower
+from models.offpeak import get_offpeak_calendar
+from models.tempo_calendar import TEMPO_CALENDAR
+
+MaxPowerRecord = namedtuple("MaxPowerRecord", ["date", "value", "event_date"])
 
 now_date = datetime.now(timezone.utc)
 yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
 
 
+class DayIndex:
+    """Prefix sums over per-day aggregates, answering the sum of any window of days with two bisections."""
+
+    def __init__(self, values):
+        """Initialize the index from a dictionary of values indexed by day (date)."""
+        self.days = sorted(values)
+        self.prefix = list(accumulate((values[day] for day in self.days), initial=0))
+
+    def sum(self, begin, end):
+        """Sum the values of the days covered by the given range.
+
+        Args:
+            begin (datetime): The begin of the range, a day starting after midnight is excluded.
+            end (datetime): The end of the range.
+
+        Returns:
+            float: The sum of the values.
+        """
+        first_day = begin.date() if begin.time() == time.min else begin.date() + timedelta(days=1)
+        left = bisect_left(self.days, first_day)
+        right = bisect_right(self.days, end.date())
+        if right <= left:
+            return 0
+        return self.prefix[right] - self.prefix[left]
+
+
 class Stat:  # pylint: disable=R0902,R0904
     """The 'Stat' class represents a statistical analysis tool for a usage point.
 
@@ -98,6 +133,7 @@ class Stat:  # pylint: disable=R0902,R0904
                                                    and measure type.
         - get_price(): Returns the price data.
         - get_mesure_type(date): Returns the measure type for the specified date.
+        - get_mesure_types(dates): Returns the measure types for a batch of dates.
         - generate_price(): Generates and saves the price data.
         - get_daily(date, mesure_type): Returns the daily data for the specified date and measure type.
         - delete(): Deletes the statistical data for the usage point.
@@ -177,7 +213,9 @@ class Stat:  # pylint: disable=R0902,R0904
         self.value_peak_offpeak_percent_hp_vs_hc = 0
         self.value_monthly_evolution = 0
         self.value_yearly_evolution = 0
-        self.usage_point_id_contract = DatabaseContracts(self.usage_point_id).get()
+        # AGGREGATES
+        self.daily_index = None
+        self.detail_index = None
 
     def daily(self, index=0):
         """Calculate the daily value for the given index.
@@ -192,9 +230,7 @@ class Stat:  # pylint: disable=R0902,R0904
         yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
         begin = datetime.combine(yesterday_date - timedelta(days=index), datetime.min.time())
         end = datetime.combine(begin, datetime.max.time())
-        value = 0
-        for data in DatabaseDaily(self.usage_point_id, self.measurement_direction).get_range(begin, end):
-            value = value + data.value
+        value = self.daily_sum(begin, end)
         return {
             "value": value,
             "begin": begin.strftime(self.date_format),
@@ -215,14 +251,7 @@ class Stat:  # pylint: disable=R0902,R0904
         yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
         begin = datetime.combine(yesterday_date - timedelta(days=index), datetime.min.time())
         end = datetime.combine(begin, datetime.max.time())
-        value = 0
-        for data in DatabaseDetail(self.usage_point_id, self.measurement_direction).get_range(begin, end):
-            day_measure_type = self.get_mesure_type(data.date)
-            day_interval = data.interval if hasattr(data, "interval") and data.interval != 0 else 1
-            if measure_type is None or (measure_type == "HP" and day_measure_type == "HP"):
-                value = value + data.value / (60 / day_interval)
-            elif measure_type is None or (measure_type == "HC" and day_measure_type == "HC"):
-                value = value + data.value / (60 / day_interval)
+        value = self.detail_sum(begin, end, measure_type)
         return {
             "value": value,
             "begin": begin.strftime(self.date_format),
@@ -253,13 +282,13 @@ class Stat:  # pylint: disable=R0902,R0904
         for data in DatabaseDetail(self.usage_point_id, self.measurement_direction).get_range(begin, end):
             hour = int(datetime.strftime(data.date, "%H"))
             if hour < TEMPO_BEGIN:
-                color = DatabaseTempo().get_range(begin - timedelta(days=1), end - timedelta(days=1))[0].color
+                color = TEMPO_CALENDAR.get_color(begin - timedelta(days=1))
                 color = f"{color.lower()}_hc"
             elif hour >= TEMPO_END:
-                color = DatabaseTempo().get_range(begin + timedelta(days=1), end + timedelta(days=1))[0].color
+                color = TEMPO_CALENDAR.get_color(begin + timedelta(days=1))
                 color = f"{color.lower()}_hc"
             else:
-                color = DatabaseTempo().get_range(begin, end)[0].color
+                color = TEMPO_CALENDAR.get_color(begin)
                 color = f"{color.lower()}_hp"
             value[color] += data.value / (60 / data.interval)
         return {
@@ -281,10 +310,8 @@ class Stat:  # pylint: disable=R0902,R0904
         yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
         begin = datetime.combine(yesterday_date - timedelta(days=index), datetime.min.time())
         end = datetime.combine(begin, datetime.max.time())
-        value = ""
-        for data in DatabaseTempo().get_range(begin, end):
-            logging.debug(f"tempo data: {data}")
-            value = value + data.color
+        value = TEMPO_CALENDAR.get_color(begin) or ""
+        logging.debug(f"tempo color: {value}")
         return {
             "value": value,
             "begin": begin.strftime(self.date_format),
@@ -305,7 +332,7 @@ class Stat:  # pylint: disable=R0902,R0904
         begin = datetime.combine(yesterday_date - timedelta(days=index), datetime.min.time())
         end = datetime.combine(begin, datetime.max.time())
         value = 0
-        for data in DatabaseMaxPower(self.usage_point_id).get_range(begin, end):
+        for data in self.get_max_power_range(begin, end):
             value = value + data.value
         return {
             "value": value,
@@ -334,7 +361,7 @@ class Stat:  # pylint: disable=R0902,R0904
         end = datetime.combine(begin, datetime.max.time())
         value = 0
         boolv = "true"
-        for data in DatabaseMaxPower(self.usage_point_id).get_range(begin, end):
+        for data in self.get_max_power_range(begin, end):
             value = value + data.value
             if (value / 1000) < max_power:
                 boolv = "false"
@@ -358,7 +385,7 @@ class Stat:  # pylint: disable=R0902,R0904
         begin = datetime.combine(yesterday_date - timedelta(days=index), datetime.min.time())
         end = datetime.combine(begin, datetime.max.time())
         max_power_time = ""
-        for data in DatabaseMaxPower(self.usage_point_id).get_range(begin, end):
+        for data in self.get_max_power_range(begin, end):
             if data.event_date is None or data.event_date == "":
                 max_power_time = data.date
             else:
@@ -374,6 +401,26 @@ class Stat:  # pylint: disable=R0902,R0904
         }
         return data
 
+    def get_max_power_range(self, begin, end):
+        """Retrieve the maximum power records of a range, shared by the Stat objects until the next write.
+
+        Args:
+            begin (datetime): The begin date.
+            end (datetime): The end date.
+
+        Returns:
+            list: The records (date, value, event_date), most recent first.
+        """
+        return METADATA_CACHE.get(
+            ConsumptionDailyMaxPower.__tablename__,
+            self.usage_point_id,
+            ("stat_max_power_range", begin, end),
+            lambda: [
+                MaxPowerRecord(data.date, data.value, data.event_date)
+                for data in DatabaseMaxPower(self.usage_point_id).get_range(begin, end)
+            ],
+        )
+
     def current_week_array(self):
         """Calculate the array of values for the current week.
 
@@ -389,11 +436,7 @@ class Stat:  # pylint: disable=R0902,R0904
         daily_obj = []
         id_max = 7
         while day_idx < id_max:
-            day = DatabaseDaily(self.usage_point_id, self.measurement_direction).get_range(begin, end)
-            if day:
-                daily_obj.append({"date": day[0].date, "value": day[0].value})
-            else:
-                daily_obj.append({"date": begin, "value": 0})
+            daily_obj.append({"date": begin, "value": self.daily_sum(begin, end)})
             begin = begin - timedelta(days=1)
             end = end - timedelta(days=1)
             day_idx = day_idx + 1
@@ -409,8 +452,7 @@ class Stat:  # pylint: disable=R0902,R0904
         yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
         begin = datetime.combine(now_date - relativedelta(weeks=1), datetime.min.time())
         end = datetime.combine(yesterday_date, datetime.max.time())
-        for data in DatabaseDaily(self.usage_point_id, self.measurement_direction).get_range(begin, end):
-            self.value_current_week = self.value_current_week + data.value
+        self.value_current_week = self.value_current_week + self.daily_sum(begin, end)
         logging.debug(f" current_week => {self.value_current_week}")
         return {
             "value": self.value_current_week,
@@ -428,8 +470,7 @@ class Stat:  # pylint: disable=R0902,R0904
         yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
         begin = datetime.combine(now_date - relativedelta(weeks=2), datetime.min.time())
         end = datetime.combine(yesterday_date - relativedelta(weeks=1), datetime.max.time())
-        for data in DatabaseDaily(self.usage_point_id, self.measurement_direction).get_range(begin, end):
-            self.value_last_week = self.value_last_week + data.value
+        self.value_last_week = self.value_last_week + self.daily_sum(begin, end)
         logging.debug(f" last_week => {self.value_last_week}")
         return {
             "value": self.value_last_week,
@@ -458,11 +499,7 @@ class Stat:  # pylint: disable=R0902,R0904
         yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
         begin = datetime.combine(yesterday_date, datetime.min.time())
         end = datetime.combine(yesterday_date, datetime.max.time())
-        data = DatabaseDaily(self.usage_point_id, self.measurement_direction).get_range(begin, end)
-        if data:
-            self.value_yesterday = data[0].value
-        else:
-            self.value_yesterday = 0
+        self.value_yesterday = self.daily_sum(begin, end)
         logging.debug(f" yesterday => {self.value_yesterday}")
         return {
             "value": self.value_yesterday,
@@ -480,11 +517,7 @@ class Stat:  # pylint: disable=R0902,R0904
         yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
         begin = datetime.combine(yesterday_date - timedelta(days=1), datetime.min.time())
         end = datetime.combine(yesterday_date - timedelta(days=1), datetime.max.time())
-        data = DatabaseDaily(self.usage_point_id, self.measurement_direction).get_range(begin, end)
-        if data:
-            self.value_yesterday_1 = data[0].value
-        else:
-            self.value_yesterday_1 = 0
+        self.value_yesterday_1 = self.daily_sum(begin, end)
         logging.debug(f" yesterday_1 => {self.value_yesterday_1}")
         return {
             "value": self.value_yesterday_1,
@@ -518,8 +551,7 @@ class Stat:  # pylint: disable=R0902,R0904
             datetime.min.time(),
         )
         end = datetime.combine(yesterday_date - relativedelta(years=1), datetime.max.time())
-        for data in DatabaseDaily(self.usage_point_id, self.measurement_direction).get_range(begin, end):
-            self.value_current_week_last_year = self.value_current_week_last_year + data.value
+        self.value_current_week_last_year = self.value_current_week_last_year + self.daily_sum(begin, end)
         logging.debug(f" current_week_last_year => {self.value_current_week_last_year}")
         return {
             "value": self.value_current_week_last_year,
@@ -540,8 +572,7 @@ class Stat:  # pylint: disable=R0902,R0904
             datetime.min.time(),
         )
         end = datetime.combine(yesterday_date.replace(day=1) - timedelta(days=1), datetime.max.time())
-        for day in DatabaseDaily(self.usage_point_id, self.measurement_direction).get_range(begin, end):
-            self.value_last_month = self.value_last_month + day.value
+        self.value_last_month = self.value_last_month + self.daily_sum(begin, end)
         logging.debug(f" last_month => {self.value_last_month}")
         return {
             "value": self.value_last_month,
@@ -559,8 +590,7 @@ class Stat:  # pylint: disable=R0902,R0904
         yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
         begin = datetime.combine(now_date.replace(day=1), datetime.min.time())
         end = yesterday_date
-        for day in DatabaseDaily(self.usage_point_id, self.measurement_direction).get_range(begin, end):
-            self.value_current_month = self.value_current_month + day.value
+        self.value_current_month = self.value_current_month + self.daily_sum(begin, end)
         logging.debug(f" current_month => {self.value_current_month}")
         return {
             "value": self.value_current_month,
@@ -578,8 +608,7 @@ class Stat:  # pylint: disable=R0902,R0904
         yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
         begin = datetime.combine(now_date.replace(day=1), datetime.min.time()) - relativedelta(years=1)
         end = yesterday_date - relativedelta(years=1)
-        for day in DatabaseDaily(self.usage_point_id, self.measurement_direction).get_range(begin, end):
-            self.value_current_month_last_year = self.value_current_month_last_year + day.value
+        self.value_current_month_last_year = self.value_current_month_last_year + self.daily_sum(begin, end)
         logging.debug(f" current_month_last_year => {self.value_current_month_last_year}")
         return {
             "value": self.value_current_month_last_year,
@@ -615,8 +644,7 @@ class Stat:  # pylint: disable=R0902,R0904
         end = datetime.combine(yesterday_date.replace(day=1) - timedelta(days=1), datetime.max.time()) - relativedelta(
             years=1
         )
-        for day in DatabaseDaily(self.usage_point_id, self.measurement_direction).get_range(begin, end):
-            self.value_last_month_last_year = self.value_last_month_last_year + day.value
+        self.value_last_month_last_year = self.value_last_month_last_year + self.daily_sum(begin, end)
         logging.debug(f" last_month_last_year => {self.value_last_month_last_year}")
         return {
             "value": self.value_last_month_last_year,
@@ -647,8 +675,7 @@ class Stat:  # pylint: disable=R0902,R0904
         yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
         begin = datetime.combine(now_date.replace(month=1, day=1), datetime.min.time())
         end = yesterday_date
-        for day in DatabaseDaily(self.usage_point_id, self.measurement_direction).get_range(begin, end):
-            self.value_current_year = self.value_current_year + day.value
+        self.value_current_year = self.value_current_year + self.daily_sum(begin, end)
         logging.debug(f" current_year => {self.value_current_year}")
         return {
             "value": self.value_current_year,
@@ -669,8 +696,7 @@ class Stat:  # pylint: disable=R0902,R0904
             datetime.min.time(),
         )
         end = yesterday_date - relativedelta(years=1)
-        for day in DatabaseDaily(self.usage_point_id, self.measurement_direction).get_range(begin, end):
-            self.value_current_year_last_year = self.value_current_year_last_year + day.value
+        self.value_current_year_last_year = self.value_current_year_last_year + self.daily_sum(begin, end)
         logging.debug(f" current_year_last_year => {self.value_current_year_last_year}")
         return {
             "value": self.value_current_year_last_year,
@@ -691,8 +717,7 @@ class Stat:  # pylint: disable=R0902,R0904
         )
         last_day_of_month = calendar.monthrange(int(begin.strftime("%Y")), 12)[1]
         end = datetime.combine(begin.replace(month=1, day=last_day_of_month), datetime.max.time())
-        for day in DatabaseDaily(self.usage_point_id, self.measurement_direction).get_range(begin, end):
-            self.value_last_year = self.value_last_year + day.value
+        self.value_last_year = self.value_last_year + self.daily_sum(begin, end)
         logging.debug(f" last_year => {self.value_last_year}")
         return {
             "value": self.value_last_year,
@@ -723,13 +748,8 @@ class Stat:  # pylint: disable=R0902,R0904
         yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
         begin = datetime.combine(yesterday_date, datetime.min.time())
         end = datetime.combine(now_date, datetime.max.time())
-        for day in DatabaseDetail(self.usage_point_id, self.measurement_direction).get_range(begin, end):
-            measure_type = self.get_mesure_type(day.date)
-            day_interval = day.interval if hasattr(day, "interval") and day.interval != 0 else 1
-            if measure_type == "HP":
-                self.value_yesterday_hp = self.value_yesterday_hp + (day.value / (60 / day_interval))
-            if measure_type == "HC":
-                self.value_yesterday_hc = self.value_yesterday_hc + (day.value / (60 / day_interval))
+        self.value_yesterday_hp = self.value_yesterday_hp + self.detail_sum(begin, end, "HP")
+        self.value_yesterday_hc = self.value_yesterday_hc + self.detail_sum(begin, end, "HC")
         logging.debug(f" yesterday_hc => HC : {self.value_yesterday_hc}")
         logging.debug(f" yesterday_hp => HP : {self.value_yesterday_hp}")
         return {
@@ -748,15 +768,9 @@ class Stat:  # pylint: disable=R0902,R0904
         yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
         begin = yesterday_date - relativedelta(years=1)
         end = yesterday_date
-        value_peak_offpeak_percent_hp = 0
-        value_peak_offpeak_percent_hc = 0
+        value_peak_offpeak_percent_hp = self.detail_sum(begin, end, "HP", raw=True)
+        value_peak_offpeak_percent_hc = self.detail_sum(begin, end, "HC", raw=True)
         value_peak_offpeak_percent_hp_vs_hc = 0
-        for day in DatabaseDetail(self.usage_point_id, self.measurement_direction).get_range(begin, end):
-            measure_type = self.get_mesure_type(day.date)
-            if measure_type == "HP":
-                value_peak_offpeak_percent_hp = value_peak_offpeak_percent_hp + day.value
-            if measure_type == "HC":
-                value_peak_offpeak_percent_hc = value_peak_offpeak_percent_hc + day.value
         if value_peak_offpeak_percent_hc != 0:
             value_peak_offpeak_percent_hp_vs_hc = abs(
                 ((100 * value_peak_offpeak_percent_hc) / value_peak_offpeak_percent_hp) - 100
@@ -782,16 +796,10 @@ class Stat:  # pylint: disable=R0902,R0904
             now_date.replace(year=year, month=12, day=last_day_of_month),
             datetime.max.time(),
         )
-        value = 0
         if measure_type is None:
-            for day in DatabaseDaily(self.usage_point_id, self.measurement_direction).get_range(begin, end):
-                value = value + day.value
+            value = self.daily_sum(begin, end)
         else:
-            for day in DatabaseDetail(self.usage_point_id, self.measurement_direction).get_range(begin, end):
-                day_measure_type = self.get_mesure_type(day.date)
-                if day_measure_type == measure_type:
-                    day_interval = day.interval if hasattr(day, "interval") and day.interval != 0 else 1
-                    value = value + (day.value / (60 / day_interval))
+            value = self.detail_sum(begin, end, measure_type)
         return {
             "value": value,
             "begin": begin.strftime(self.date_format),
@@ -812,16 +820,10 @@ class Stat:  # pylint: disable=R0902,R0904
         yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
         end = datetime.combine(yesterday_date - relativedelta(years=idx), datetime.max.time())
         begin = datetime.combine(end - relativedelta(years=1), datetime.min.time())
-        value = 0
         if measure_type is None:
-            for day in DatabaseDaily(self.usage_point_id, self.measurement_direction).get_range(begin, end):
-                value = value + day.value
+            value = self.daily_sum(begin, end)
         else:
-            for day in DatabaseDetail(self.usage_point_id, self.measurement_direction).get_range(begin, end):
-                day_measure_type = self.get_mesure_type(day.date)
-                if day_measure_type == measure_type:
-                    day_interval = day.interval if hasattr(day, "interval") and day.interval != 0 else 1
-                    value = value + (day.value / (60 / day_interval))
+            value = self.detail_sum(begin, end, measure_type)
         return {
             "value": value,
             "begin": begin.strftime(self.date_format),
@@ -848,16 +850,10 @@ class Stat:  # pylint: disable=R0902,R0904
             now_date.replace(year=year, month=month, day=last_day_of_month),
             datetime.max.time(),
         )
-        value = 0
         if measure_type is None:
-            for day in DatabaseDaily(self.usage_point_id, self.measurement_direction).get_range(begin, end):
-                value = value + day.value
+            value = self.daily_sum(begin, end)
         else:
-            for day in DatabaseDetail(self.usage_point_id, self.measurement_direction).get_range(begin, end):
-                day_measure_type = self.get_mesure_type(day.date)
-                if day_measure_type == measure_type:
-                    day_interval = day.interval if hasattr(day, "interval") and day.interval != 0 else 1
-                    value = value + (day.value / (60 / day_interval))
+            value = self.detail_sum(begin, end, measure_type)
         return {
             "value": value,
             "begin": begin.strftime(self.date_format),
@@ -878,16 +874,10 @@ class Stat:  # pylint: disable=R0902,R0904
         yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
         end = datetime.combine(yesterday_date - relativedelta(years=idx), datetime.max.time())
         begin = datetime.combine(end - relativedelta(months=1), datetime.min.time())
-        value = 0
         if measure_type is None:
-            for day in DatabaseDaily(self.usage_point_id, self.measurement_direction).get_range(begin, end):
-                value = value + day.value
+            value = self.daily_sum(begin, end)
         else:
-            for day in DatabaseDetail(self.usage_point_id, self.measurement_direction).get_range(begin, end):
-                day_measure_type = self.get_mesure_type(day.date)
-                if day_measure_type == measure_type:
-                    day_interval = day.interval if hasattr(day, "interval") and day.interval != 0 else 1
-                    value = value + (day.value / (60 / day_interval))
+            value = self.detail_sum(begin, end, measure_type)
         return {
             "value": value,
             "begin": begin.strftime(self.date_format),
@@ -923,16 +913,10 @@ class Stat:  # pylint: disable=R0902,R0904
             end,
             datetime.max.time(),
         )
-        value = 0
         if measure_type is None:
-            for day in DatabaseDaily(self.usage_point_id, self.measurement_direction).get_range(begin, end):
-                value = value + day.value
+            value = self.daily_sum(begin, end)
         else:
-            for day in DatabaseDetail(self.usage_point_id, self.measurement_direction).get_range(begin, end):
-                day_measure_type = self.get_mesure_type(day.date)
-                if day_measure_type == measure_type:
-                    day_interval = day.interval if hasattr(day, "interval") and day.interval != 0 else 1
-                    value = value + (day.value / (60 / day_interval))
+            value = self.detail_sum(begin, end, measure_type)
         return {
             "value": value,
             "begin": begin.strftime(self.date_format),
@@ -953,22 +937,110 @@ class Stat:  # pylint: disable=R0902,R0904
         yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
         end = datetime.combine(yesterday_date - relativedelta(years=idx), datetime.max.time())
         begin = datetime.combine(end - timedelta(days=7), datetime.min.time())
-        value = 0
         if measure_type is None:
-            for day in DatabaseDaily(self.usage_point_id, self.measurement_direction).get_range(begin, end):
-                value = value + day.value
+            value = self.daily_sum(begin, end)
         else:
-            for day in DatabaseDetail(self.usage_point_id, self.measurement_direction).get_range(begin, end):
-                day_measure_type = self.get_mesure_type(day.date)
-                if day_measure_type == measure_type:
-                    day_interval = day.interval if hasattr(day, "interval") and day.interval != 0 else 1
-                    value = value + (day.value / (60 / day_interval))
+            value = self.detail_sum(begin, end, measure_type)
         return {
             "value": value,
             "begin": begin.strftime(self.date_format),
             "end": end.strftime(self.date_format),
         }
 
+    def daily_sum(self, begin, end):
+        """Sum the daily values between two dates.
+
+        All the windows are answered from a single grouped query, loaded on first use and shared by the Stat objects
+        of the usage point until its daily records are written.
+
+        Args:
+            begin (datetime): The begin date.
+            end (datetime): The end date.
+
+        Returns:
+            int: The sum of the daily values.
+        """
+        if self.daily_index is None:
+            database = DatabaseDaily(self.usage_point_id, self.measurement_direction)
+            self.daily_index = METADATA_CACHE.get(
+                database.table.__tablename__,
+                self.usage_point_id,
+                "stat_daily_index",
+                lambda: DayIndex(database.get_sum_by_day()),
+            )
+        return self.daily_index.sum(begin, end)
+
+    def detail_sum(self, begin, end, measure_type=None, raw=False):
+        """Sum the detail values between two dates.
+
+        All the windows are answered from a single grouped query (by day and HP/HC), loaded on first use and shared by
+        the Stat objects of the usage point until its detail records are written.
+
+        Args:
+            begin (datetime): The begin date.
+            end (datetime): The end date.
+            measure_type (str, optional): The measure type (HP or HC), None for both. Defaults to None.
+            raw (bool, optional): Sum the raw values instead of the Wh. Defaults to False.
+
+        Returns:
+            float: The sum of the detail values.
+        """
+        if self.detail_index is None:
+            database = DatabaseDetail(self.usage_point_id, self.measurement_direction)
+            self.detail_index = METADATA_CACHE.get(
+                database.table.__tablename__,
+                self.usage_point_id,
+                ("stat_detail_index", self.get_offpeak_hours()),
+                lambda: self.get_detail_index(database),
+            )
+        if measure_type is not None:
+            measure_type = measure_type.upper()
+        index = self.detail_index.get((measure_type, raw))
+        if index is None:
+            return 0
+        return index.sum(begin, end)
+
+    def get_detail_index(self, database):
+        """Build the day indexes of the detail values, by measure type and unit.
+
+        Args:
+            database (DatabaseDetail): The detail records.
+
+        Returns:
+            dict: The DayIndex indexed by (measure type, raw).
+        """
+        values = defaultdict(lambda: defaultdict(int))
+        data = database.get_sum_by_day(self.get_offpeak_ranges())
+        for (day, day_measure_type), (value, wh) in data.items():
+            for key in (day_measure_type, None):
+                values[(key, False)][day] += wh
+                values[(key, True)][day] += value
+        return {key: DayIndex(days) for key, days in values.items()}
+
+    def get_offpeak_hours(self):
+        """Get the off-peak hours of the usage point.
+
+        Returns:
+            tuple: The seven off-peak hours strings, from monday to sunday.
+        """
+        return tuple(getattr(self.usage_point_id_config, f"offpeak_hours_{weekday}") for weekday in range(0, 7))
+
+    def get_offpeak_calendar(self):
+        """Get the compiled off-peak calendar of the usage point.
+
+        Returns:
+            OffpeakCalendar: The calendar, shared by all the usage points with the same off-peak hours.
+        """
+        return get_offpeak_calendar(self.get_offpeak_hours())
+
+    def get_offpeak_ranges(self):
+        """Get the off-peak ranges of the usage point.
+
+        Returns:
+            dict: The off-peak ranges indexed by weekday (0 = monday), as lists of (begin, end) minutes of the day.
+        """
+        return self.get_offpeak_calendar().ranges
+
     def get_price(self):
         """Retrieve the price data for the measurement direction.
 
@@ -989,135 +1061,179 @@ class Stat:  # pylint: disable=R0902,R0904
         Returns:
             str: The measurement type, either "HP" (high peak) or "HC" (off-peak).
         """
-        offpeak_hours = {}
-        for i in range(0, 7):
-            offpeak_hours[i] = getattr(self.usage_point_id_config, f"offpeak_hours_{i}")
-        # GET WEEKDAY
-        date_days = measurement_date.weekday()
-        date_hour_minute = measurement_date.strftime("%H:%M")
-        measure_type = "HP"
-        day_offpeak_hours = offpeak_hours[date_days]
-        if day_offpeak_hours is not None:
-            for offpeak_hour in day_offpeak_hours.split(";"):
-                if offpeak_hour != "None" and offpeak_hour != "" and offpeak_hour is not None:
-                    offpeak_begin = offpeak_hour.split("-")[0].replace("h", ":").replace("H", ":")
-                    # FORMAT HOUR WITH 2 DIGIT
-                    offpeak_begin = datetime.strptime(offpeak_begin, "%H:%M")
-                    offpeak_begin = datetime.strftime(offpeak_begin, "%H:%M")
-                    offpeak_stop = offpeak_hour.split("-")[1].replace("h", ":").replace("H", ":")
-                    # FORMAT HOUR WITH 2 DIGIT
-                    offpeak_stop = datetime.strptime(offpeak_stop, "%H:%M")
-                    offpeak_stop = datetime.strftime(offpeak_stop, "%H:%M")
-                    result = is_between(date_hour_minute, (offpeak_begin, offpeak_stop))
-                    if result:
-                        measure_type = "HC"
-        return measure_type
-
-    def generate_price(self):  # noqa: C901, PLR0912, PLR0915
+        return self.get_offpeak_calendar().measure_type(measurement_date)
+
+    def get_mesure_types(self, measurement_dates):
+        """Determine the measurement type (HP or HC) of a batch of dates.
+
+        Args:
+            measurement_dates (iterable): The dates for which to determine the measurement type.
+
+        Returns:
+            list: The measurement types, in the same order as the dates.
+        """
+        return self.get_offpeak_calendar().classify(measurement_dates)
+
+    def get_price_tariff(self, tempo_config):
+        """Compute the fingerprint of the tariff used to generate the price.
+
+        Args:
+            tempo_config (dict): The tempo prices.
+
+        Returns:
+            str: The fingerprint of the prices, off-peak hours and tempo prices.
+        """
+        tariff = {
+            "price": [
+                self.usage_point_id_config.consumption_price_base,
+                self.usage_point_id_config.consumption_price_hc,
+                self.usage_point_id_config.consumption_price_hp,
+                self.usage_point_id_config.production_price,
+            ],
+            "offpeak_hours": [getattr(self.usage_point_id_config, f"offpeak_hours_{i}") for i in range(0, 7)],
+            "tempo": tempo_config,
+        }
+        return hashlib.md5(json.dumps(tariff, sort_keys=True, default=str).encode("utf-8")).hexdigest()  # noqa: S324
+
+    def fold_price(self, price, items, tempo_config, tempo_colors):
+        """Add the price of the given detail records to a price aggregate.
+
+        Args:
+            price (dict): The price aggregate to update (BASE, TEMPO, HC and HP).
+            items (list): The detail records.
+            tempo_config (dict): The tempo prices.
+            tempo_colors (dict): The tempo colors indexed by day (date).
+        """
+        if self.measurement_direction == "consumption":
+            price_base = self.usage_point_id_config.consumption_price_base
+        else:
+            price_base = self.usage_point_id_config.production_price
+        for item, measure_type in zip(items, self.get_mesure_types(item.date for item in items)):
+            if measure_type == "HP":
+                price_hc_hp = self.usage_point_id_config.consumption_price_hp
+            else:
+                price_hc_hp = self.usage_point_id_config.consumption_price_hc
+            interval = item.interval if hasattr(item, "interval") and item.interval != 0 else 1
+            wh = (item.value) / (60 / interval)
+            kwh = wh / 1000
+            price["BASE"]["Wh"] += wh
+            price["BASE"]["kWh"] += kwh
+            price["BASE"]["euro"] += kwh * price_base
+            price[measure_type]["Wh"] += wh
+            price[measure_type]["kWh"] += kwh
+            price[measure_type]["euro"] += kwh * price_hc_hp
+            # TEMPO
+            if tempo_config:
+                hour = int(item.date.strftime("%H"))
+                if TEMPO_BEGIN <= hour < TEMPO_END:
+                    tempo_measure_type = "HP"
+                else:
+                    tempo_measure_type = "HC"
+                color = tempo_colors.get(item.date.date())
+                if color:
+                    tempo_price = tempo_config[f"{color.lower()}_{tempo_measure_type.lower()}"]
+                    if isinstance(tempo_price, str):
+                        tempo_price = float(tempo_price.replace(",", "."))
+                    tempo_key = f"{color}_{tempo_measure_type}"
+                    price["TEMPO"][tempo_key]["Wh"] += wh
+                    price["TEMPO"][tempo_key]["kWh"] += kwh
+                    price["TEMPO"][tempo_key]["euro"] += kwh * tempo_price
+
+    def generate_price(self):  # noqa: C901, PLR0912
         """Generate the price for the usage point based on the measurement data.
 
+        The price is aggregated per month and saved with the signature of each month (number of records, sum of the
+        values, last date and tempo colors), so a month is only folded again when its records or the tariff change.
+        Records appended after the last date of a month are folded on top of its saved aggregate.
+
         Returns:
             str: JSON string representing the calculated price.
         """
-        data = DatabaseDetail(self.usage_point_id, self.measurement_direction).get_all()
+        db_detail = DatabaseDetail(self.usage_point_id, self.measurement_direction)
+        signatures = db_detail.get_month_signature()
         result = {}
-        last_month = ""
-        if data:
-            tempo_config = DatabaseTempo().get_config("price")
-            tempo_data = DatabaseTempo().get_range(data[0].date, data[-1].date)
-            for item in data:
-                year = item.date.strftime("%Y")
-                month = item.date.strftime("%m")
-                if month != last_month:
-                    logging.info(f" - {year} / {month}")
-
-                measure_type = self.get_mesure_type(item.date)
-
-                tempo_date = datetime.combine(item.date, datetime.min.time())
-                interval = item.interval if hasattr(item, "interval") and item.interval != 0 else 1
-                if year not in result:
-                    result[year] = {
-                        "BASE": {"euro": 0, "kWh": 0, "Wh": 0},
-                        "TEMPO": {
-                            "BLUE_HC": {"euro": 0, "kWh": 0, "Wh": 0},
-                            "BLUE_HP": {"euro": 0, "kWh": 0, "Wh": 0},
-                            "WHITE_HC": {"euro": 0, "kWh": 0, "Wh": 0},
-                            "WHITE_HP": {"euro": 0, "kWh": 0, "Wh": 0},
-                            "RED_HC": {"euro": 0, "kWh": 0, "Wh": 0},
-                            "RED_HP": {"euro": 0, "kWh": 0, "Wh": 0},
-                        },
-                        "HC": {"euro": 0, "kWh": 0, "Wh": 0},
-                        "HP": {"euro": 0, "kWh": 0, "Wh": 0},
-                        "month": {},
-                    }
-                if month not in result[year]["month"]:
-                    result[year]["month"][month] = {
-                        "BASE": {"euro": 0, "kWh": 0, "Wh": 0},
-                        "TEMPO": {
-                            "BLUE_HC": {"euro": 0, "kWh": 0, "Wh": 0},
-                            "BLUE_HP": {"euro": 0, "kWh": 0, "Wh": 0},
-                            "WHITE_HC": {"euro": 0, "kWh": 0, "Wh": 0},
-                            "WHITE_HP": {"euro": 0, "kWh": 0, "Wh": 0},
-                            "RED_HC": {"euro": 0, "kWh": 0, "Wh": 0},
-                            "RED_HP": {"euro": 0, "kWh": 0, "Wh": 0},
-                        },
-                        "HC": {"euro": 0, "kWh": 0, "Wh": 0},
-                        "HP": {"euro": 0, "kWh": 0, "Wh": 0},
-                    }
-                if self.measurement_direction == "consumption":
-                    price = self.usage_point_id_config.consumption_price_base
-                else:
-                    price = self.usage_point_id_config.production_price
-                if measure_type == "HP":
-                    price_hc_hp = self.usage_point_id_config.consumption_price_hp
-                else:
-                    price_hc_hp = self.usage_point_id_config.consumption_price_hc
-                wh = (item.value) / (60 / interval)
-                kwh = wh / 1000
-                # YEARS
-                result[year]["BASE"]["Wh"] += wh
-                result[year]["BASE"]["kWh"] += kwh
-                result[year]["BASE"]["euro"] += kwh * price
-                result[year][measure_type]["Wh"] += wh
-                result[year][measure_type]["kWh"] += kwh
-                result[year][measure_type]["euro"] += kwh * price_hc_hp
-
-                # MONTH
-                result[year]["month"][month]["BASE"]["Wh"] += wh
-                result[year]["month"][month]["BASE"]["kWh"] += kwh
-                result[year]["month"][month]["BASE"]["euro"] += kwh * price
-                result[year]["month"][month][measure_type]["Wh"] += wh
-                result[year]["month"][month][measure_type]["kWh"] += kwh
-                result[year]["month"][month][measure_type]["euro"] += kwh * price_hc_hp
-
-                # TEMPO
-                if tempo_config:
-                    hour = int(item.date.strftime("%H"))
-                    if TEMPO_BEGIN <= hour < TEMPO_END:
-                        measure_type = "HP"
-                    else:
-                        measure_type = "HC"
-                    tempo_output = [x for x in tempo_data if x.date == tempo_date]
-                    if tempo_output:
-                        color = tempo_output[0].color
-                        tempo_price = tempo_config[f"{color.lower()}_{measure_type.lower()}"]
-                        if isinstance(tempo_price, str):
-                            tempo_price = float(tempo_price.replace(",", "."))
-                        result[year]["TEMPO"][f"{color}_{measure_type}"]["Wh"] += wh
-                        result[year]["TEMPO"][f"{color}_{measure_type}"]["kWh"] += kwh
-                        result[year]["TEMPO"][f"{color}_{measure_type}"]["euro"] += kwh * tempo_price
-                        result[year]["month"][month]["TEMPO"][f"{color}_{measure_type}"]["Wh"] += wh
-                        result[year]["month"][month]["TEMPO"][f"{color}_{measure_type}"]["kWh"] += kwh
-                        result[year]["month"][month]["TEMPO"][f"{color}_{measure_type}"]["euro"] += kwh * tempo_price
-                last_month = month
-            DatabaseStatistique(self.usage_point_id).set(
-                f"price_{self.measurement_direction}",
-                json.dumps(result),
-            )
-        else:
+        if not signatures:
             logging.error(" => Aucune donnée en cache.")
+            return json.dumps(result)
+        tempo_config = DatabaseTempo().get_config("price")
+        tempo_colors = TEMPO_CALENDAR.get_all()
+        tempo_signatures = defaultdict(str)
+        for tempo_date, tempo_color in tempo_colors.items():
+            tempo_signatures[(tempo_date.year, tempo_date.month)] += tempo_color[0]
+        tariff = self.get_price_tariff(tempo_config)
+        state_key = f"price_{self.measurement_direction}_state"
+        state = DatabaseStatistique(self.usage_point_id).get(state_key)
+        state = json.loads(state[0].value) if state else {}
+        months = state.get("months", {}) if state.get("tariff") == tariff else {}
+        current_months = {}
+        for (year, month), (count, total, last_date) in sorted(signatures.items()):
+            month_key = f"{year}-{month:02d}"
+            cached = months.get(month_key)
+            signature = {
+                "count": count,
+                "sum": total,
+                "last_date": last_date.isoformat(),
+                "tempo": tempo_signatures[(year, month)],
+            }
+            if cached is not None and all(cached.get(key) == value for key, value in signature.items()):
+                current_months[month_key] = cached
+                continue
+            logging.info(f" - {year} / {month:02d}")
+            begin = TIMEZONE.localize(datetime.combine(date(year, month, 1), datetime.min.time()))
+            end = TIMEZONE.localize(
+                datetime.combine(date(year, month, calendar.monthrange(year, month)[1]), datetime.max.time())
+            )
+            price = None
+            if cached is not None and cached.get("tempo") == signature["tempo"]:
+                # Only fold the records appended since the last run if the previous ones are unchanged.
+                cached_last_date = TIMEZONE.localize(datetime.fromisoformat(cached["last_date"]))
+                previous = db_detail.get_month_signature(begin, cached_last_date).get((year, month), (0, 0))
+                if previous[:2] == (cached["count"], cached["sum"]):
+                    price = cached["price"]
+                    begin = cached_last_date + timedelta(seconds=1)
+            if price is None:
+                price = self.empty_price()
+            self.fold_price(price, db_detail.get_range(begin, end, order="asc"), tempo_config, tempo_colors)
+            current_months[month_key] = {**signature, "price": price}
+
+        for month_key, month_data in current_months.items():
+            year, month = month_key.split("-")
+            if year not in result:
+                result[year] = {**self.empty_price(), "month": {}}
+            result[year]["month"][month] = month_data["price"]
+            for key in ["BASE", "HC", "HP"]:
+                for unit, value in month_data["price"][key].items():
+                    result[year][key][unit] += value
+            for key, tempo_price in month_data["price"]["TEMPO"].items():
+                for unit, value in tempo_price.items():
+                    result[year]["TEMPO"][key][unit] += value
+        DatabaseStatistique(self.usage_point_id).set(
+            state_key, json.dumps({"tariff": tariff, "months": current_months})
+        )
+        DatabaseStatistique(self.usage_point_id).set(f"price_{self.measurement_direction}", json.dumps(result))
         return json.dumps(result)
 
+    @staticmethod
+    def empty_price():
+        """Return an empty price aggregate.
+
+        Returns:
+            dict: The BASE, TEMPO, HC and HP price aggregate.
+        """
+        return {
+            "BASE": {"euro": 0, "kWh": 0, "Wh": 0},
+            "TEMPO": {
+                "BLUE_HC": {"euro": 0, "kWh": 0, "Wh": 0},
+                "BLUE_HP": {"euro": 0, "kWh": 0, "Wh": 0},
+                "WHITE_HC": {"euro": 0, "kWh": 0, "Wh": 0},
+                "WHITE_HP": {"euro": 0, "kWh": 0, "Wh": 0},
+                "RED_HC": {"euro": 0, "kWh": 0, "Wh": 0},
+                "RED_HP": {"euro": 0, "kWh": 0, "Wh": 0},
+            },
+            "HC": {"euro": 0, "kWh": 0, "Wh": 0},
+            "HP": {"euro": 0, "kWh": 0, "Wh": 0},
+        }
+
     def get_daily(self, specific_date, mesure_type):
         """Get the daily value for a specific date and measurement type.
 
@@ -1128,14 +1244,32 @@ class Stat:  # pylint: disable=R0902,R0904
         Returns:
             float: The daily value.
         """
-        begin = datetime.combine(specific_date, datetime.min.time())
-        end = datetime.combine(specific_date, datetime.max.time())
-        value = 0
-        for item in DatabaseDetail(self.usage_point_id, self.measurement_direction).get_range(begin, end):
-            if self.get_mesure_type(item.date).upper() == mesure_type.upper():
-                day_interval = item.interval if hasattr(item, "interval") and item.interval != 0 else 1
-                value += item.value / (60 / day_interval)
-        return value
+        begin = TIMEZONE.localize(datetime.combine(specific_date, datetime.min.time()))
+        end = TIMEZONE.localize(datetime.combine(specific_date, datetime.max.time()))
+        if self.detail_index is not None:
+            return self.detail_sum(begin, end, mesure_type)
+        data = DatabaseDetail(self.usage_point_id, self.measurement_direction).get_sum_by_day(
+            self.get_offpeak_ranges(), begin, end
+        )
+        return sum(wh for (_, measure_type), (_, wh) in data.items() if measure_type == mesure_type.upper())
+
+    def get_daily_hc_hp(self, days):
+        """Get the HC and HP values of several days, in a single query.
+
+        Args:
+            days (list): The days (datetime.date).
+
+        Returns:
+            dict: The {"hc": value, "hp": value} of each day.
+        """
+        data = DatabaseDetail(self.usage_point_id, self.measurement_direction).get_sum_by_day(
+            self.get_offpeak_ranges(), days=days
+        )
+        result = {day: {"hc": 0, "hp": 0} for day in days}
+        for (day, measure_type), (_, wh) in data.items():
+            if day in result:
+                result[day][measure_type.lower()] += wh
+        return result
 
     def delete(self):
         """Delete the data from the database."""
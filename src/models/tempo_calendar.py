@@ -0,0 +1,84 @@
+"""Shared date-keyed Tempo calendar."""
+import logging
+import threading
+from datetime import datetime
+
+from database.tempo import DatabaseTempo
+
+
+class TempoCalendar:
+    """In-memory index of the Tempo colors, loaded once from the database.
+
+    The calendar is loaded on first use and kept up to date with `update` when new Tempo days are written.
+    """
+
+    def __init__(self):
+        """Initialize an empty (not loaded) calendar."""
+        self.colors = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        """Load the Tempo colors from the database.
+
+        Returns:
+            dict: The Tempo colors indexed by day (date).
+        """
+        with self.lock:
+            colors = {}
+            for tempo in DatabaseTempo().get(order="asc"):
+                colors[tempo.date.date()] = tempo.color
+            self.colors = colors
+            logging.debug(f"Calendrier Tempo chargé ({len(colors)} jours).")
+            return self.colors
+
+    def update(self, colors):
+        """Merge the Tempo days that have just been written in the database.
+
+        Args:
+            colors (dict): The Tempo colors indexed by day (date or datetime).
+        """
+        with self.lock:
+            if self.colors is None:
+                return
+            merged = dict(self.colors)
+            for day, color in colors.items():
+                merged[day.date() if isinstance(day, datetime) else day] = color
+            self.colors = dict(sorted(merged.items()))
+
+    def get_all(self):
+        """Return all the Tempo colors.
+
+        Returns:
+            dict: The Tempo colors indexed by day (date), in chronological order.
+        """
+        if self.colors is None:
+            return self.load()
+        return self.colors
+
+    def get_color(self, day):
+        """Return the Tempo color of a day.
+
+        Args:
+            day (date | datetime): The day.
+
+        Returns:
+            str: The color (BLUE, WHITE or RED), None if unknown.
+        """
+        if isinstance(day, datetime):
+            day = day.date()
+        return self.get_all().get(day)
+
+    def get_colors(self, days):
+        """Return the Tempo colors of a batch of days.
+
+        Args:
+            days (iterable): The days (date or datetime).
+
+        Returns:
+            list: The colors, None for the unknown days, in the same order as the days.
+        """
+        colors = self.get_all()
+        return [colors.get(day.date() if isinstance(day, datetime) else day) for day in days]
+
+
+TEMPO_CALENDAR = TempoCalendar()
@@ -1,12 +1,13 @@
 """Generic utils."""
 
+import contextvars
 import decimal
 import json
 import logging
 import re
 import shutil
 import sys
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from math import floor
 from os import getenv
 from pathlib import Path
@@ -39,6 +40,95 @@ def daterange(start_date, end_date):
         yield start_date + timedelta(n)
 
 
+def day_ranges(days):
+    """Group days into ranges of consecutive days.
+
+    Args:
+        days (list): The days (date), in chronological order.
+
+    Returns:
+        list: The (first, last) days of each range, both included.
+    """
+    ranges = []
+    for day in days:
+        if ranges and ranges[-1][1] + timedelta(days=1) == day:
+            ranges[-1] = (ranges[-1][0], day)
+        else:
+            ranges.append((day, day))
+    return ranges
+
+
+def to_date(value):
+    """Convert the result of a SQL date() call to a date.
+
+    SQLite returns the day as an ISO string while PostgreSQL returns a date object.
+
+    Args:
+        value (str | datetime.date): The value returned by the database.
+
+    Returns:
+        datetime.date: The corresponding date.
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def search_date_range(search):
+    """Convert a datatable search on a date prefix into the range of the matching dates.
+
+    Args:
+        search (str): The search term, like "2024", "2024-03" or "2024-03-15".
+
+    Returns:
+        tuple: The (begin, end) naive datetimes, end excluded, or None if the search is not a date prefix.
+    """
+    match = re.fullmatch(r"(\d{4})(?:-(\d{2})(?:-(\d{2}))?)?", search.strip())
+    if match is None:
+        return None
+    year, month, day = (int(group) if group else None for group in match.groups())
+    try:
+        if day is not None:
+            begin = date(year, month, day)
+            end = begin + timedelta(days=1)
+        elif month is not None:
+            begin = date(year, month, 1)
+            end = (begin.replace(day=28) + timedelta(days=4)).replace(day=1)
+        else:
+            begin = date(year, 1, 1)
+            end = date(year + 1, 1, 1)
+    except ValueError:
+        return None
+    return datetime.combine(begin, datetime.min.time()), datetime.combine(end, datetime.min.time())
+
+
+def search_filter(search, date_column, value_column):
+    """Build the condition of a datatable search on a date and a value column.
+
+    A search on a month or a day ("2024-03", "2024-03-15") is a range on the indexed date column. A bare year
+    ("2024") is also a range, or a LIKE on the value, as it may as well be a value. Any other search matches the
+    date and the value with LIKE.
+
+    Args:
+        search (str): The search term.
+        date_column (Column): The date column.
+        value_column (Column): The value column.
+
+    Returns:
+        ColumnElement: The condition.
+    """
+    value_like = value_column.like(f"%{search}%")
+    date_range = search_date_range(search)
+    if date_range is None:
+        return date_column.like(f"%{search}%") | value_like
+    date_between = (date_column >= date_range[0]) & (date_column < date_range[1])
+    if "-" in search:
+        return date_between
+    return date_between | value_like
+
+
 def is_bool(v):
     """Check if a value is a boolean.
 
@@ -298,6 +388,31 @@ def export_finish():
     )
 
 
+# Usage point being imported by the current thread, set by Job.import_usage_point.
+LOG_USAGE_POINT_ID = contextvars.ContextVar("log_usage_point_id", default=None)
+
+
+class UsagePointFilter(logging.Filter):
+    """Prefix the log records with the usage point being imported, the usage points are imported concurrently."""
+
+    def filter(self, record):
+        """Add the usage point ID to the message of the record.
+
+        Args:
+            record (logging.LogRecord): The log record.
+
+        Returns:
+            bool: Always True, no record is dropped.
+        """
+        usage_point_id = LOG_USAGE_POINT_ID.get()
+        record.usage_point_id = usage_point_id or ""
+        if usage_point_id is not None:
+            prefix = f"[{usage_point_id}]"
+            if not str(record.msg).upper().startswith(prefix.upper()):
+                record.msg = f"{prefix} {record.msg}"
+        return True
+
+
 def log_usage_point_id(usage_point_id):
     """Log the usage point ID.
 
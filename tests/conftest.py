@@ -1,6 +1,7 @@
 import os
 import tempfile
 from contextlib import contextmanager
+from datetime import datetime
 
 import yaml
 import pytest
@@ -75,6 +76,33 @@ def update_paths():
             yield
 
 
+@pytest.fixture
+def usage_point(request):
+    """Create a usage point for the test, deleted with its records afterwards.
+
+    The usage point is described by the indirect parameter of the fixture, or else by the USAGE_POINT dict of the
+    test module:
+        id (str): The usage point ID.
+        settings (dict, optional): The other columns of the usage point, such as its off-peak hours.
+        begin (datetime, optional): The first day of the records. Defaults to Monday 2020-03-02.
+        seed (callable, optional): Called with the first day (localized) to insert the records.
+
+    Yields:
+        datetime: The first day, localized.
+    """
+    from const import TIMEZONE
+    from database.usage_points import DatabaseUsagePoints
+
+    params = getattr(request, "param", None) or request.module.USAGE_POINT
+    usage_point_id = params["id"]
+    DatabaseUsagePoints(usage_point_id).set({"name": usage_point_id, "token": "abcd", **params.get("settings", {})})
+    begin = TIMEZONE.localize(params.get("begin", datetime(2020, 3, 2)))
+    if "seed" in params:
+        params["seed"](begin)
+    yield begin
+    DatabaseUsagePoints(usage_point_id).delete()
+
+
 def contains_logline(caplog, expected_log: str, expected_level: int = None):
     for logger_name, level, message in caplog.record_tuples:
         is_log_match = expected_log == message
@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+USAGE_POINT_ID = "pdl_datatable"
+
+
+def seed(begin):
+    from database.detail import DatabaseDetail
+
+    DatabaseDetail(USAGE_POINT_ID).insert_bulk(
+        [{"date": begin + timedelta(minutes=30 * slot), "value": 10, "interval": 30} for slot in range(96)]
+    )
+
+
+USAGE_POINT = {
+    "id": USAGE_POINT_ID,
+    "settings": {f"offpeak_hours_{weekday}": "22H00-6H00" for weekday in range(7)},
+    "begin": datetime(2020, 3, 30),
+    "seed": seed,
+}
+
+
+def request(start, length, search=""):
+    return SimpleNamespace(
+        _query_params={
+            "draw": "1",
+            "start": str(start),
+            "length": str(length),
+            "search[value]": search,
+            "order[0][column]": "0",
+            "order[0][dir]": "asc",
+        }
+    )
+
+
+def test_detail_datatable_is_paginated(usage_point, mocker):
+    from database import DB
+    from models.ajax import Ajax
+
+    ajax = Ajax(USAGE_POINT_ID)
+    result = ajax.datatable("consumption_detail", request(10, 25))
+    assert result["recordsTotal"] == 96
+    assert result["recordsFiltered"] == 96
+    assert len(result["data"]) == 25
+    # Most recent first
+    assert result["data"][0][:2] == ["2020-03-31", "18:30:00"]
+
+    execute = mocker.spy(DB.session(), "execute")
+    result = ajax.datatable("consumption_detail", request(0, 10, "2020-03-30"))
+    assert result["recordsFiltered"] == 48
+    assert [row[0] for row in result["data"]] == ["2020-03-30"] * 10
+    statement = str(execute.call_args_list[0].args[0])
+    assert "LIMIT" in statement
+    assert "LIKE" not in statement
+
+    result = ajax.datatable("consumption_detail", request(40, -1, "2020-03"))
+    assert result["recordsFiltered"] == 96
+    assert len(result["data"]) == 56
+
+
+def test_daily_datatable_queries(usage_point, mocker):
+    from sqlalchemy import event
+
+    from const import TIMEZONE
+    from database import DB
+    from database.daily import DatabaseDaily
+    from models.ajax import Ajax
+
+    begin = TIMEZONE.localize(datetime(2020, 3, 20))
+    DatabaseDaily(USAGE_POINT_ID).insert_bulk(
+        [{"date": begin + timedelta(days=day), "value": 480} for day in range(12)]
+    )
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):  # noqa: PLR0913
+        statements.append(statement)
+
+    event.listen(DB.engine, "before_cursor_execute", before_cursor_execute)
+    result = Ajax(USAGE_POINT_ID).datatable("consumption", request(0, 12))
+    event.remove(DB.engine, "before_cursor_execute", before_cursor_execute)
+
+    rows = {row[0]: row for row in result["data"]}
+    assert len(rows) == 12
+    # 16 slots of 10 W during 30 minutes in off-peak hours, 32 in peak hours
+    assert ">0.08<" in rows["2020-03-30"][3]
+    assert ">0.16<" in rows["2020-03-30"][4]
+    assert ">-<" in rows["2020-03-29"][3]
+    assert len(statements) < 10
+
+
+def test_daily_datatable_search(usage_point):
+    from const import TIMEZONE
+    from database.daily import DatabaseDaily
+    from models.ajax import Ajax
+
+    begin = TIMEZONE.localize(datetime(2020, 3, 20))
+    DatabaseDaily(USAGE_POINT_ID).insert_bulk(
+        [{"date": begin + timedelta(days=day), "value": 1500 if day == 3 else 480} for day in range(12)]
+    )
+    ajax = Ajax(USAGE_POINT_ID)
+    # A bare 4-digit search matches a year or a value
+    result = ajax.datatable("consumption", request(0, 20, "1500"))
+    assert result["recordsFiltered"] == 1
+    assert [row[0] for row in result["data"]] == ["2020-03-23"]
+    assert ajax.datatable("consumption", request(0, 20, "2020"))["recordsFiltered"] == 12
+    assert ajax.datatable("consumption", request(0, 20, "2020-03-2"))["recordsFiltered"] == 10
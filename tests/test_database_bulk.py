@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+import pytest
+
+USAGE_POINT_ID = "pdl_bulk"
+USAGE_POINT = {"id": USAGE_POINT_ID}
+
+
+def test_detail_insert_bulk(usage_point, mocker):
+    from const import BULK_INSERT_CHUNK_SIZE
+    from database.detail import DatabaseDetail
+
+    detail = DatabaseDetail(USAGE_POINT_ID, "production")
+    dates = [usage_point + timedelta(minutes=30 * slot) for slot in range(BULK_INSERT_CHUNK_SIZE + 10)]
+    detail.insert_bulk([{"date": date, "value": 10, "interval": 30} for date in dates])
+    # Updated rows and a duplicated date in the same batch
+    execute = mocker.spy(detail.session, "execute")
+    detail.insert_bulk(
+        [{"date": dates[0], "value": 20, "interval": 30}, {"date": dates[0], "value": 30, "interval": 30}]
+    )
+    assert execute.call_count == 1
+
+    rows = detail.get_range(dates[0], dates[-1])
+    assert len(rows) == len(dates)
+    assert detail.get_date(dates[0]).value == 30
+    assert {row.measure_type for row in rows} == {"production"}
+
+
+def test_fail_increment_bulk(usage_point):
+    from const import MAX_IMPORT_TRY
+    from database.daily import DatabaseDaily
+    from database.detail import DatabaseDetail
+
+    for database in (DatabaseDetail(USAGE_POINT_ID), DatabaseDaily(USAGE_POINT_ID)):
+        database.insert_bulk([{"date": usage_point, "value": 10, "interval": 30}])
+        for fail_count in range(1, MAX_IMPORT_TRY):
+            database.fail_increment_bulk([usage_point, usage_point + timedelta(days=1)])
+            assert database.get_fail_count(usage_point) == fail_count
+            assert database.get_fail_count(usage_point + timedelta(days=1)) == fail_count - 1
+            assert database.get_date(usage_point).value == 0
+        database.fail_increment_bulk([usage_point])
+        assert database.get_fail_count(usage_point) == 0
+        assert database.get_date(usage_point).blacklist == 1
+
+
+def test_insert_window(usage_point, mocker):
+    from database.daily import DatabaseDaily
+    from database.detail import DatabaseDetail
+
+    fail_date = usage_point + timedelta(days=1)
+    begin = mocker.spy(DatabaseDaily(USAGE_POINT_ID).session, "begin")
+    for database in (DatabaseDetail(USAGE_POINT_ID), DatabaseDaily(USAGE_POINT_ID)):
+        begin.reset_mock()
+        database.insert_window([{"date": usage_point, "value": 10, "interval": 30}], [fail_date])
+        assert begin.call_count == 1
+        assert database.get_date(usage_point).value == 10
+        assert database.get_date(fail_date).value == 0
+        # The records are not written if the failed dates can't be
+        mocker.patch.object(type(database), "fail_increment_bulk", side_effect=RuntimeError)
+        with pytest.raises(RuntimeError):
+            database.insert_window([{"date": usage_point, "value": 20, "interval": 30}], [fail_date])
+        assert database.get_date(usage_point).value == 10
@@ -0,0 +1,139 @@
+import dataclasses
+from datetime import datetime, timedelta
+
+USAGE_POINT_ID = "pdl_gaps"
+USAGE_POINT = {"id": USAGE_POINT_ID}
+
+
+@dataclasses.dataclass
+class MockResponse:
+    status_code: int
+    text: str = ""
+
+
+def insert_slots(begin, days, skip=()):
+    from database.detail import DatabaseDetail
+
+    rows = []
+    for slot in range(48 * days):
+        if slot not in skip:
+            rows.append({"date": begin + timedelta(minutes=30 * slot), "value": 10, "interval": 30})
+    DatabaseDetail(USAGE_POINT_ID).insert_bulk(rows)
+
+
+def test_detail_gaps(usage_point):
+    from const import TIMEZONE
+    from database.detail import DatabaseDetail
+
+    # A single missing slot is tolerated, a 3 hours hole isn't
+    insert_slots(usage_point, 2, skip={5, *range(60, 66)})
+    detail = DatabaseDetail(USAGE_POINT_ID)
+    end = usage_point + timedelta(days=4)
+    assert detail.get_gaps(usage_point, end) == [
+        (TIMEZONE.localize(datetime(2020, 3, 3, 6)), TIMEZONE.localize(datetime(2020, 3, 3, 9))),
+        (TIMEZONE.localize(datetime(2020, 3, 4)), end),
+    ]
+    assert detail.get(usage_point, usage_point + timedelta(days=1))["missing_data"] is False
+
+
+def test_daily_missing_ranges(usage_point):
+    from const import TIMEZONE
+    from database.daily import DatabaseDaily
+
+    daily = DatabaseDaily(USAGE_POINT_ID)
+    daily.insert_bulk([{"date": usage_point + timedelta(days=day), "value": 10} for day in (0, 3, 6)])
+    daily.insert(usage_point + timedelta(days=4), 0, blacklist=1)
+    daily.insert(usage_point + timedelta(days=5), 0)
+
+    result = daily.get(usage_point, usage_point + timedelta(days=6))
+    assert result["missing_data"] is True
+    assert result["missing"] == [
+        (TIMEZONE.localize(datetime(2020, 3, 3)), TIMEZONE.localize(datetime(2020, 3, 5))),
+        (TIMEZONE.localize(datetime(2020, 3, 7)), TIMEZONE.localize(datetime(2020, 3, 8))),
+    ]
+    assert result["date"]["2020-03-06"] == {"status": False, "blacklist": 1, "value": 0}
+
+
+def test_detail_run_requests_missing_days(usage_point, mocker):
+    from external_services.myelectricaldata.detail import Detail
+
+    insert_slots(usage_point, 7, skip=set(range(96, 144)))
+    m_query = mocker.patch("external_services.myelectricaldata.detail.Query")
+    m_query.return_value.get.return_value = MockResponse(
+        status_code=200, text='{"meter_reading": {"interval_reading": []}}'
+    )
+
+    detail = Detail(headers="any", usage_point_id=USAGE_POINT_ID)
+    detail.run(usage_point, usage_point + timedelta(days=7))
+    assert m_query.call_count == 1
+    assert m_query.call_args.kwargs["endpoint"].endswith(
+        f"consumption_load_curve/{USAGE_POINT_ID}/start/2020-03-04/end/2020-03-05/"
+    )
+
+    m_query.reset_mock()
+    assert detail.run(usage_point, usage_point + timedelta(days=2))
+    m_query.assert_not_called()
+
+
+def test_detail_plan_and_backfill(usage_point, mocker):
+    from config.main import APP_CONFIG
+    from const import TIMEZONE
+    from external_services.myelectricaldata.detail import Detail
+
+    mocker.patch("external_services.myelectricaldata.detail.datetime", wraps=datetime)
+    # 2020-03-02 -> 2020-03-09 is cached, the load curve is published up to the end of 2020-03-29
+    insert_slots(usage_point, 7)
+    detail = Detail(headers="any", usage_point_id=USAGE_POINT_ID)
+    detail.max_days_date = TIMEZONE.localize(datetime(2020, 2, 25))
+    detail.activation_date = TIMEZONE.localize(datetime(2020, 2, 20))
+    now = mocker.patch("external_services.myelectricaldata.detail.datetime.now")
+    now.return_value = TIMEZONE.localize(datetime(2020, 3, 30, 12))
+
+    def day(value):
+        return TIMEZONE.localize(datetime(2020, *value))
+
+    assert detail.plan() == [
+        (day((3, 23)), day((3, 30))),
+        (day((3, 16)), day((3, 23))),
+        (day((3, 9)), day((3, 16))),
+        (day((2, 25)), day((3, 2))),
+    ]
+
+    import_range = mocker.patch.object(detail, "import_range", return_value=[{"value": 1}])
+    assert len(detail.get()) == 4
+    assert import_range.call_count == 4
+
+    # A conflict stops the windows not started yet
+    mocker.patch("external_services.myelectricaldata.detail.DatabaseConfig").return_value.get.return_value = 3600
+    mocker.patch.object(APP_CONFIG.gateway, "_workers", 1)
+    import_range.reset_mock()
+    import_range.side_effect = [[{"value": 1}], {"error": True, "description": "conflict", "status_code": 409}]
+    assert detail.get() == [{"value": 1}]
+    assert import_range.call_count == 2
+
+
+def test_detail_stop_collects_windows_in_flight(usage_point, mocker):
+    from config.main import APP_CONFIG
+    from const import TIMEZONE
+    from external_services.myelectricaldata.detail import Detail
+    from models.quota import GATEWAY_QUOTAS
+
+    today = TIMEZONE.localize(datetime.combine(datetime.now(tz=TIMEZONE), datetime.min.time()))
+    detail = Detail(headers="any", usage_point_id=USAGE_POINT_ID)
+    detail.max_days_date = today - timedelta(days=35)
+    mocker.patch.object(APP_CONFIG.gateway, "_workers", 3)
+    mocker.patch.dict(GATEWAY_QUOTAS.quotas, clear=True)
+    mocker.patch("external_services.myelectricaldata.detail.DatabaseConfig").return_value.get.return_value = 3600
+    error = mocker.patch("logging.error")
+    responses = {
+        today: {"error": True, "description": "conflict", "status_code": 409},
+        today - timedelta(days=7): [{"value": 1}],
+        today - timedelta(days=14): {"error": True, "description": "unavailable", "status_code": 500},
+    }
+    import_range = mocker.patch.object(detail, "import_range", side_effect=lambda begin, end: responses[end])
+
+    # The conflict stops the next windows, the ones in flight are still collected and their errors logged
+    assert len(detail.plan()) == 5
+    assert detail.get() == [{"value": 1}]
+    assert import_range.call_count == 3
+    error.assert_any_call("=> unavailable")
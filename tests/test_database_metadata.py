@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+USAGE_POINT_ID = "pdl_metadata"
+
+
+@pytest.fixture
+def usage_point():
+    from const import TIMEZONE
+    from database.usage_points import DatabaseUsagePoints
+
+    DatabaseUsagePoints(USAGE_POINT_ID).set({"name": USAGE_POINT_ID, "token": "abcd"})
+    yield TIMEZONE.localize(datetime(2020, 3, 30))
+    DatabaseUsagePoints(USAGE_POINT_ID).delete()
+
+
+def test_daily_metadata(usage_point, mocker):
+    from database.daily import DatabaseDaily
+
+    daily = DatabaseDaily(USAGE_POINT_ID)
+    assert daily.get_count() == 0
+    assert daily.get_last_date() is False
+    daily.insert_bulk([{"date": usage_point + timedelta(days=day), "value": 10} for day in range(4)])
+
+    execute = mocker.spy(daily.session, "execute")
+    assert daily.get_count() == 4
+    assert daily.get_last_date() == datetime(2020, 3, 30)
+    assert daily.get_first_date() == datetime(2020, 4, 2)
+    assert daily.get_month_count() == {(2020, 3): 2, (2020, 4): 2}
+    calls = execute.call_count
+    # Served from the cache
+    assert daily.get_date_range() == {"begin": datetime(2020, 3, 30), "end": datetime(2020, 4, 2)}
+    assert DatabaseDaily(USAGE_POINT_ID).get_count() == 4
+    assert execute.call_count == calls
+    # The production records and the other usage points have their own entries
+    assert DatabaseDaily(USAGE_POINT_ID, "production").get_count() == 0
+
+    daily.insert(usage_point + timedelta(days=4), 10)
+    assert daily.get_count() == 5
+    assert daily.get_first_date() == datetime(2020, 4, 3)
+    daily.delete()
+    assert daily.get_count() == 0
+
+
+def test_detail_metadata_invalidated_on_usage_point_delete(usage_point):
+    from database.detail import DatabaseDetail
+    from database.usage_points import DatabaseUsagePoints
+
+    detail = DatabaseDetail(USAGE_POINT_ID)
+    detail.insert(usage_point, 10, 30)
+    assert detail.get_count() == 1
+    DatabaseUsagePoints(USAGE_POINT_ID).delete()
+    assert detail.get_count() == 0
+    assert detail.get_first_date() is False
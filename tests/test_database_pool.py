@@ -0,0 +1,68 @@
+def test_engine_is_pooled():
+    from sqlalchemy import text
+    from sqlalchemy.pool import QueuePool
+
+    from database import DB
+
+    assert isinstance(DB.engine.pool, QueuePool)
+    with DB.engine.connect() as connection:
+        first = connection.connection.dbapi_connection
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+    with DB.engine.connect() as connection:
+        assert connection.connection.dbapi_connection is first
+
+
+def test_pool_options():
+    from sqlalchemy.pool import NullPool, QueuePool
+
+    from config.backend import Backend
+    from database import DB
+
+    options = DB.get_pool_options(Backend({"backend": {"pool_size": 2, "max_overflow": 3}}, write=False))
+    assert options == {
+        "poolclass": QueuePool,
+        "pool_size": 2,
+        "max_overflow": 3,
+        "connect_args": {"check_same_thread": False},
+    }
+    assert DB.get_pool_options(Backend({"backend": {"pool": "false"}}, write=False)) == {"poolclass": NullPool}
+
+
+def test_sqlite_profile():
+    from database import DB
+
+    with DB.engine.connect() as connection:
+        pragmas = {
+            pragma: connection.exec_driver_sql(f"PRAGMA {pragma}").scalar()
+            for pragma in ("journal_mode", "synchronous", "mmap_size", "cache_size", "temp_store", "busy_timeout")
+        }
+    assert pragmas == {
+        "journal_mode": "wal",
+        "synchronous": 1,
+        "mmap_size": 268435456,
+        "cache_size": -65536,
+        "temp_store": 2,
+        "busy_timeout": 30000,
+    }
+
+
+def test_database_maintenance(mocker):
+    from database import DB
+    from models.jobs import Job
+
+    vacuum = mocker.spy(DB, "vacuum")
+    DB.lock()
+    Job().database_maintenance()
+    DB.unlock()
+    vacuum.assert_not_called()
+
+    Job().database_maintenance()
+    vacuum.assert_called_once()
+    with DB.engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2
+    # The file is already in incremental mode: no full VACUUM
+    execute = mocker.spy(DB.engine.dialect, "do_execute")
+    Job().database_maintenance()
+    statements = [call.args[1] for call in execute.call_args_list]
+    assert "PRAGMA incremental_vacuum" in statements
+    assert "VACUUM" not in statements
@@ -0,0 +1,279 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+USAGE_POINT_ID = "pdl1"
+STATISTIC_ID = f"myelectricaldata:{USAGE_POINT_ID}_base_consumption"
+
+
+class FakeRecorder:
+    """Home Assistant recorder behind a WebSocket, keeping the imported statistics in memory."""
+
+    def __init__(self):
+        self.statistics = {}
+        self.imported = []
+        self.outputs = []
+        self.connected = True
+
+    def send(self, message):
+        message = json.loads(message)
+        result = None
+        if message["type"] == "recorder/list_statistic_ids":
+            result = [{"statistic_id": statistic_id} for statistic_id in self.statistics]
+        elif message["type"] == "recorder/statistics_during_period":
+            result = self.statistics_during_period(message)
+        elif message["type"] == "recorder/import_statistics":
+            statistic = self.statistics.setdefault(message["metadata"]["statistic_id"], {})
+            for stat in message["stats"]:
+                statistic[datetime.fromisoformat(stat["start"])] = stat["sum"]
+            self.imported.append((message["metadata"]["statistic_id"], len(message["stats"])))
+        self.outputs.append(json.dumps({"id": message["id"], "type": "result", "success": True, "result": result}))
+
+    def recv(self):
+        return self.outputs.pop(0)
+
+    def close(self):
+        self.connected = False
+
+    def statistics_during_period(self, message):
+        from const import TIMEZONE
+
+        begin = datetime.fromisoformat(message["start_time"])
+        end = datetime.fromisoformat(message["end_time"])
+        result = {}
+        for statistic_id in message["statistic_ids"]:
+            rows = {}
+            for start, total in sorted(self.statistics.get(statistic_id, {}).items()):
+                if begin <= start < end:
+                    if message["period"] == "month":
+                        period = TIMEZONE.localize(datetime(start.year, start.month, 1))
+                    else:
+                        period = start
+                    rows[period] = {"start": period.timestamp() * 1000, "sum": total}
+            result[statistic_id] = list(rows.values())
+        return result
+
+
+class LateRecorder(FakeRecorder):
+    """Recorder answering the last message first."""
+
+    def __init__(self):
+        super().__init__()
+        self.max_in_flight = 0
+
+    def send(self, message):
+        super().send(message)
+        self.max_in_flight = max(self.max_in_flight, len(self.outputs))
+
+    def recv(self):
+        return self.outputs.pop()
+
+
+def import_data(mocker, recorder):
+    from external_services.home_assistant_ws.main import HomeAssistantWs
+
+    def connect(self):
+        self.websocket = recorder
+        return True
+
+    mocker.patch.object(HomeAssistantWs, "connect", connect)
+    recorder.imported = []
+    HomeAssistantWs(USAGE_POINT_ID)
+    return recorder.imported
+
+
+def test_import_is_incremental(mocker):
+    from config.main import APP_CONFIG
+    from const import TIMEZONE
+    from database.detail import DatabaseDetail
+
+    config = APP_CONFIG.myelectricaldata.usage_point_config[USAGE_POINT_ID]
+    mocker.patch.object(type(config), "consumption_price_base", 0.2)
+    begin = TIMEZONE.localize(datetime(2024, 3, 4))
+    detail = DatabaseDetail(USAGE_POINT_ID)
+    detail.insert_bulk(
+        [{"date": begin + timedelta(minutes=30 * slot), "value": 1000, "interval": 30} for slot in range(96)]
+    )
+    recorder = FakeRecorder()
+
+    assert import_data(mocker, recorder) == [(STATISTIC_ID, 48), (f"{STATISTIC_ID}_cost", 48)]
+    assert max(recorder.statistics[STATISTIC_ID].values()) == 48
+    # Nothing new
+    assert import_data(mocker, recorder) == []
+    # Only the new hours are sent, their sums resume from the last imported one
+    detail.insert_bulk(
+        [{"date": begin + timedelta(minutes=30 * slot), "value": 1000, "interval": 30} for slot in range(96, 144)]
+    )
+    assert import_data(mocker, recorder) == [(STATISTIC_ID, 24), (f"{STATISTIC_ID}_cost", 24)]
+    statistic = recorder.statistics[STATISTIC_ID]
+    assert len(statistic) == 72
+    assert statistic[datetime(2024, 3, 6, 0, tzinfo=timezone(timedelta(hours=1)))] == 49
+    assert max(statistic.values()) == 72
+    assert round(max(recorder.statistics[f"{STATISTIC_ID}_cost"].values()), 6) == 14.4
+    detail.delete()
+
+
+def test_import_is_pipelined(mocker):
+    from config.main import APP_CONFIG
+    from const import TIMEZONE
+    from database.detail import DatabaseDetail
+
+    mocker.patch.object(APP_CONFIG.home_assistant_ws, "_batch_size", 10)
+    mocker.patch.object(APP_CONFIG.home_assistant_ws, "_max_in_flight", 3)
+    error = mocker.patch("logging.error")
+    begin = TIMEZONE.localize(datetime(2024, 3, 4))
+    detail = DatabaseDetail(USAGE_POINT_ID)
+    detail.insert_bulk(
+        [{"date": begin + timedelta(minutes=30 * slot), "value": 1000, "interval": 30} for slot in range(96)]
+    )
+    recorder = LateRecorder()
+
+    chunks = [10, 10, 10, 10, 8]
+    assert import_data(mocker, recorder) == [(STATISTIC_ID, size) for size in chunks] + [
+        (f"{STATISTIC_ID}_cost", size) for size in chunks
+    ]
+    assert recorder.max_in_flight == 3
+    assert recorder.outputs == []
+    assert len(recorder.statistics[STATISTIC_ID]) == 48
+    assert max(recorder.statistics[STATISTIC_ID].values()) == 48
+    error.assert_not_called()
+    detail.delete()
+
+
+def test_import_tempo_and_production(mocker):
+    from config.main import APP_CONFIG
+    from const import TIMEZONE
+    from database.detail import DatabaseDetail
+    from models.tempo_calendar import TEMPO_CALENDAR
+
+    config = APP_CONFIG.myelectricaldata.usage_point_config[USAGE_POINT_ID]
+    for weekday in range(7):
+        mocker.patch.object(type(config), f"offpeak_hours_{weekday}", "22H00-6H00")
+    mocker.patch.object(type(config), "production_price", 0.1)
+    mocker.patch("database.usage_points.DatabaseUsagePoints.get_plan", return_value="TEMPO")
+    mocker.patch(
+        "database.tempo.DatabaseTempo.get_config",
+        return_value={f"{color}_{hour_type}": 0.1 for color in ("blue", "white", "red") for hour_type in ("hc", "hp")}
+        | {"red_hp": 0.5},
+    )
+    mocker.patch.object(
+        TEMPO_CALENDAR,
+        "get_all",
+        return_value={datetime(2024, 3, 3).date(): "BLUE", datetime(2024, 3, 4).date(): "RED"},
+    )
+    error = mocker.patch("logging.error")
+    begin = TIMEZONE.localize(datetime(2024, 3, 4))
+    consumption = DatabaseDetail(USAGE_POINT_ID)
+    consumption.insert_bulk(
+        [{"date": begin + timedelta(minutes=30 * slot), "value": 1000, "interval": 30} for slot in range(96)]
+    )
+    production = DatabaseDetail(USAGE_POINT_ID, "production")
+    production.insert_bulk(
+        [{"date": begin + timedelta(minutes=30 * slot), "value": 2000, "interval": 30} for slot in range(24, 28)]
+    )
+    recorder = FakeRecorder()
+
+    import_data(mocker, recorder)
+    prefix = f"myelectricaldata:{USAGE_POINT_ID}"
+    hours = {statistic_id: len(statistic) for statistic_id, statistic in recorder.statistics.items()}
+    assert hours == {
+        f"{prefix}_bluehc_consumption": 6,
+        f"{prefix}_redhp_consumption": 16,
+        f"{prefix}_redhc_consumption": 8,
+        f"{prefix}_bluehc_consumption_cost": 6,
+        f"{prefix}_redhp_consumption_cost": 16,
+        f"{prefix}_redhc_consumption_cost": 8,
+        f"{prefix}_production": 2,
+        f"{prefix}_production_revenue": 2,
+    }
+    assert max(recorder.statistics[f"{prefix}_redhp_consumption_cost"].values()) == 8
+    assert max(recorder.statistics[f"{prefix}_production"].values()) == 4
+    assert round(max(recorder.statistics[f"{prefix}_production_revenue"].values()), 6) == 0.4
+    error.assert_called_once_with("Import impossible, pas de donnée tempo sur la date du 2024-03-05")
+    consumption.delete()
+    production.delete()
+
+
+def test_import_plan_change(mocker):
+    from config.main import APP_CONFIG
+    from const import TIMEZONE
+    from database.detail import DatabaseDetail
+
+    config = APP_CONFIG.myelectricaldata.usage_point_config[USAGE_POINT_ID]
+    for weekday in range(7):
+        mocker.patch.object(type(config), f"offpeak_hours_{weekday}", "22H00-6H00")
+    get_plan = mocker.patch("database.usage_points.DatabaseUsagePoints.get_plan", return_value="BASE")
+    begin = TIMEZONE.localize(datetime(2024, 3, 4))
+    detail = DatabaseDetail(USAGE_POINT_ID)
+    detail.insert_bulk(
+        [{"date": begin + timedelta(minutes=30 * slot), "value": 1000, "interval": 30} for slot in range(96)]
+    )
+    recorder = FakeRecorder()
+
+    assert import_data(mocker, recorder) == [(STATISTIC_ID, 48), (f"{STATISTIC_ID}_cost", 48)]
+    # The new statistics are imported from the first hour, not from the last hour of the BASE one
+    get_plan.return_value = "HC/HP"
+    prefix = f"myelectricaldata:{USAGE_POINT_ID}"
+    assert sorted(import_data(mocker, recorder)) == [
+        (f"{prefix}_hc_consumption", 16),
+        (f"{prefix}_hc_consumption_cost", 16),
+        (f"{prefix}_hp_consumption", 32),
+        (f"{prefix}_hp_consumption_cost", 32),
+    ]
+    assert import_data(mocker, recorder) == []
+    detail.delete()
+
+
+def test_import_waits_for_tempo_color(mocker):
+    from config.main import APP_CONFIG
+    from const import TIMEZONE
+    from database.detail import DatabaseDetail
+    from models.tempo_calendar import TEMPO_CALENDAR
+
+    config = APP_CONFIG.myelectricaldata.usage_point_config[USAGE_POINT_ID]
+    for weekday in range(7):
+        mocker.patch.object(type(config), f"offpeak_hours_{weekday}", "22H00-6H00")
+    mocker.patch("database.usage_points.DatabaseUsagePoints.get_plan", return_value="TEMPO")
+    mocker.patch(
+        "database.tempo.DatabaseTempo.get_config",
+        return_value={f"{color}_{hour_type}": 0.1 for color in ("blue", "white", "red") for hour_type in ("hc", "hp")},
+    )
+    colors = {
+        datetime(2024, 3, 3).date(): "BLUE",
+        datetime(2024, 3, 4).date(): "RED",
+        datetime(2024, 3, 6).date(): "RED",
+    }
+    mocker.patch.object(TEMPO_CALENDAR, "get_all", return_value=colors)
+    error = mocker.patch("logging.error")
+    begin = TIMEZONE.localize(datetime(2024, 3, 4))
+    detail = DatabaseDetail(USAGE_POINT_ID)
+    detail.insert_bulk(
+        [{"date": begin + timedelta(minutes=30 * slot), "value": 1000, "interval": 30} for slot in range(144)]
+    )
+    recorder = FakeRecorder()
+    prefix = f"myelectricaldata:{USAGE_POINT_ID}"
+
+    # The import stops at the first hour without color
+    import_data(mocker, recorder)
+    hours = {statistic_id: len(statistic) for statistic_id, statistic in recorder.statistics.items()}
+    assert hours == {
+        f"{prefix}_bluehc_consumption": 6,
+        f"{prefix}_redhp_consumption": 16,
+        f"{prefix}_redhc_consumption": 8,
+        f"{prefix}_bluehc_consumption_cost": 6,
+        f"{prefix}_redhp_consumption_cost": 16,
+        f"{prefix}_redhc_consumption_cost": 8,
+    }
+    error.assert_called_once_with("Import impossible, pas de donnée tempo sur la date du 2024-03-05")
+    # Its hours are sent once the color is known
+    colors[datetime(2024, 3, 5).date()] = "RED"
+    assert sorted(import_data(mocker, recorder)) == [
+        (f"{prefix}_redhc_consumption", 10),
+        (f"{prefix}_redhc_consumption_cost", 10),
+        (f"{prefix}_redhp_consumption", 32),
+        (f"{prefix}_redhp_consumption_cost", 32),
+    ]
+    statistic = recorder.statistics[f"{prefix}_redhp_consumption"]
+    assert len(statistic) == 48
+    assert max(statistic.values()) == 48
+    assert import_data(mocker, recorder) == []
+    detail.delete()
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+USAGE_POINT_ID = "pdl1"
+
+
+def test_detail_export_is_batched(mocker):
+    from config.main import APP_CONFIG
+    from const import TIMEZONE
+    from database.detail import DatabaseDetail
+    from database.statistique import DatabaseStatistique
+    from external_services.influxdb.main import ExportInfluxDB
+
+    begin = TIMEZONE.localize(datetime(2020, 3, 2))
+    detail = DatabaseDetail(USAGE_POINT_ID, "production")
+    detail.insert_bulk(
+        [{"date": begin + timedelta(minutes=30 * slot), "value": 100, "interval": 30} for slot in range(250)]
+    )
+    mocker.patch.object(APP_CONFIG.influxdb.batching_options, "_batch_size", 100)
+    get_all = mocker.spy(DatabaseDetail, "get_all")
+
+    export = ExportInfluxDB(USAGE_POINT_ID)
+    export.influxdb_client = mocker.Mock()
+    export.detail("production")
+
+    batches = [call.args[0] for call in export.influxdb_client.write_batch.call_args_list]
+    assert [len(batch) for batch in batches] == [100, 100, 50]
+    assert batches[0][0]["time"] == export.tz.localize(datetime(2020, 3, 2))
+    assert batches[0][0]["fields"]["Wh"] == 50
+    assert batches[0][0]["tags"]["measure_type"] == "BASE"
+    assert batches[-1][-1]["time"] == export.tz.localize(datetime(2020, 3, 7, 4, 30))
+    export.influxdb_client.write.assert_not_called()
+    get_all.assert_not_called()
+    detail.delete()
+    DatabaseStatistique(USAGE_POINT_ID).delete("influxdb_production_detail_state")
+
+
+def test_daily_export_is_incremental(mocker):
+    from const import TIMEZONE
+    from database.daily import DatabaseDaily
+    from database.statistique import DatabaseStatistique
+    from external_services.influxdb.main import ExportInfluxDB
+
+    begin = TIMEZONE.localize(datetime(2020, 3, 28))
+    daily = DatabaseDaily(USAGE_POINT_ID, "production")
+    daily.insert_bulk([{"date": begin + timedelta(days=day), "value": 1000} for day in range(6)])
+    export = ExportInfluxDB(USAGE_POINT_ID)
+    export.influxdb_client = mocker.Mock()
+
+    def exported_dates():
+        dates = [
+            record["time"].strftime("%Y-%m-%d")
+            for call in export.influxdb_client.write_batch.call_args_list
+            for record in call.args[0]
+        ]
+        export.influxdb_client.reset_mock()
+        return dates
+
+    export.daily("production")
+    assert exported_dates() == [f"2020-03-{day}" for day in range(28, 32)] + ["2020-04-01", "2020-04-02"]
+    # Nothing changed
+    export.daily("production")
+    assert exported_dates() == []
+    # Only the new records are sent
+    daily.insert_bulk([{"date": begin + timedelta(days=day), "value": 1000} for day in (6, 7)])
+    export.daily("production")
+    assert exported_dates() == ["2020-04-03", "2020-04-04"]
+    # A record updated in the past sends its month again
+    daily.insert(begin, 2000)
+    export.daily("production")
+    assert exported_dates() == [f"2020-03-{day}" for day in range(28, 32)]
+    # As does a price change
+    mocker.patch.object(type(export.usage_point_config), "production_price", 0.5)
+    export.daily("production")
+    assert len(exported_dates()) == 8
+    daily.delete()
+    DatabaseStatistique(USAGE_POINT_ID).delete("influxdb_production_state")
+
+
+def test_export_state_is_synchronous_only(mocker):
+    from config.main import APP_CONFIG
+    from const import TIMEZONE
+    from database.daily import DatabaseDaily
+    from database.statistique import DatabaseStatistique
+    from external_services.influxdb.main import ExportInfluxDB
+
+    mocker.patch.object(APP_CONFIG.influxdb, "_method", "batching")
+    begin = TIMEZONE.localize(datetime(2020, 3, 28))
+    daily = DatabaseDaily(USAGE_POINT_ID, "production")
+    daily.insert_bulk([{"date": begin + timedelta(days=day), "value": 1000} for day in range(6)])
+    export = ExportInfluxDB(USAGE_POINT_ID)
+    export.influxdb_client = mocker.Mock()
+
+    # The write errors are not known in batching mode: everything is sent again
+    for _ in range(2):
+        export.daily("production")
+        assert sum(len(call.args[0]) for call in export.influxdb_client.write_batch.call_args_list) == 6
+        export.influxdb_client.reset_mock()
+    assert not DatabaseStatistique(USAGE_POINT_ID).get("influxdb_production_state")
+    daily.delete()
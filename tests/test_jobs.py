@@ -74,6 +74,114 @@ def test_job_import_data(mocker, job, caplog):
         m.reset_mock()
 
 
+@pytest.mark.parametrize("workers", [1, 4])
+@pytest.mark.parametrize("target", [None, "stat"])
+def test_job_import_data_binds_usage_points(mocker, job, workers, target):
+    from config.main import APP_CONFIG
+    from models.jobs import Job
+
+    calls = []
+    for method in PER_JOB_METHODS + PER_USAGE_POINT_METHODS:
+        mocker.patch.object(
+            Job,
+            method,
+            autospec=True,
+            side_effect=lambda self, method=method: calls.append((method, self.usage_point_id)),
+        )
+    mocker.patch("database.DB.lock_status", return_value=False)
+    mocker.patch("database.DB.lock")
+    mocker.patch("database.DB.unlock")
+    mocker.patch.object(APP_CONFIG.gateway, "_workers", workers)
+
+    job.job_import_data(wait=False, target=target)
+
+    enabled = [up.usage_point_id for up in job.usage_points_all if getattr(up, "enable", False)]
+    methods = PER_USAGE_POINT_METHODS if target is None else ["stat_price"]
+    # Each step runs once per enabled usage point, on a job bound to it
+    assert sorted(call for call in calls if call[0] not in PER_JOB_METHODS) == sorted(
+        (method, usage_point_id) for method in methods for usage_point_id in enabled
+    )
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_job_import_data_shares_the_mqtt_connection(mocker, job, workers):
+    from config.main import APP_CONFIG
+    from models.jobs import Job
+
+    for method in PER_JOB_METHODS + PER_USAGE_POINT_METHODS:
+        if method not in ("export_mqtt", "export_home_assistant"):
+            mocker.patch.object(Job, method)
+    mocker.patch("database.DB.lock_status", return_value=False)
+    mocker.patch("database.DB.lock")
+    mocker.patch("database.DB.unlock")
+    mocker.patch.object(APP_CONFIG.gateway, "_workers", workers)
+    mocker.patch.object(APP_CONFIG.mqtt, "_enable", True)
+    mocker.patch.object(APP_CONFIG.home_assistant, "_enable", True)
+    m_mqtt = mocker.patch("models.jobs.Mqtt")
+    m_export_mqtt = mocker.patch("models.jobs.ExportMqtt")
+    m_home_assistant = mocker.patch("models.jobs.HomeAssistant")
+
+    job.job_import_data(wait=False)
+
+    # A single connection for the whole run, closed at the end
+    m_mqtt.assert_called_once_with()
+    connection = m_mqtt.return_value
+    enabled = [up.usage_point_id for up in job.usage_points_all if getattr(up, "enable", False)]
+    assert [call.args for call in m_export_mqtt.call_args_list] == [
+        (usage_point_id, connection) for usage_point_id in enabled
+    ]
+    assert [call.args for call in m_home_assistant.call_args_list] == [
+        (usage_point_id, connection) for usage_point_id in enabled
+    ]
+    connection.disconnect.assert_called_once_with()
+    assert job.mqtt is None
+
+
+@pytest.mark.parametrize(("usage_points", "share"), [(1, 4), (2, 2), (4, 1)])
+def test_job_import_data_shares_the_workers(mocker, caplog, usage_points, share):
+    from config.main import APP_CONFIG
+    from models.jobs import Job
+    from utils import UsagePointFilter
+
+    job = Job("pdl1")
+    job.usage_points_all = job.usage_points_all * usage_points
+    calls = []
+
+    def step(self, method):
+        logging.info(method)
+        calls.append((method, self.get_workers()))
+
+    for method in PER_JOB_METHODS + PER_USAGE_POINT_METHODS:
+        mocker.patch.object(Job, method, autospec=True, side_effect=lambda self, method=method: step(self, method))
+    mocker.patch("database.DB.lock_status", return_value=False)
+    mocker.patch("database.DB.lock")
+    mocker.patch("database.DB.unlock")
+    mocker.patch.object(APP_CONFIG.gateway, "_workers", 4)
+    caplog.handler.addFilter(UsagePointFilter())
+
+    with caplog.at_level(logging.INFO):
+        job.job_import_data(wait=False)
+
+    # 4 workers in all: shared by the usage points, then by the steps running at the same time
+    workers = dict(calls)
+    assert workers["stat_price"] == share
+    assert workers["get_consumption_detail"] == 1
+    assert all(f"[pdl1] {method}" in caplog.messages for method in PER_USAGE_POINT_METHODS)
+
+
+def test_rate_limit(mocker):
+    from models.query import RateLimit
+
+    sleep = mocker.patch("models.query.time.sleep")
+    mocker.patch("models.query.time.monotonic", return_value=100.0)
+    rate_limit = RateLimit()
+    for _ in range(3):
+        rate_limit.wait(4)
+    assert [call.args[0] for call in sleep.call_args_list] == [0.25, 0.5]
+    rate_limit.wait(0)
+    assert sleep.call_count == 2
+
+
 def test_header_generate(job, caplog):
     from utils import get_version
 
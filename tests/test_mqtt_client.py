@@ -0,0 +1,110 @@
+class FakeMessage:
+    def __init__(self, client, topic):
+        self.client = client
+        self.topic = topic
+        self.rc = 0
+
+    def wait_for_publish(self, timeout=None):
+        self.client.inflight.remove(self)
+
+    def is_published(self):
+        return not self.topic.endswith("fail")
+
+
+class FakeClient:
+    def __init__(self, client_id):
+        self.client_id = client_id
+        self.inflight = []
+        self.max_inflight = 0
+        self.published = []
+        self.on_connect = None
+
+    def max_inflight_messages_set(self, inflight):
+        pass
+
+    def connect(self, hostname, port):
+        self.on_connect(self, None, {}, 0)
+
+    def loop_start(self):
+        pass
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def publish(self, topic, payload, qos, retain):
+        message = FakeMessage(self, topic)
+        self.inflight.append(message)
+        self.max_inflight = max(self.max_inflight, len(self.inflight))
+        self.published.append(topic)
+        return message
+
+
+def test_publish_multiple_reuses_the_connection(mocker):
+    from external_services.mqtt import client
+
+    m_client = mocker.patch.object(client.mqtt, "Client", FakeClient)
+    m_publish = mocker.patch("paho.mqtt.publish.multiple")
+    mocker.patch.object(client, "MQTT_MAX_INFLIGHT", 10)
+
+    mqtt = client.Mqtt()
+    assert mqtt.valid
+    data = {f"topic_{index}": index for index in range(25)}
+    data["topic_fail"] = "value"
+    result = mqtt.publish_multiple(data, "prefix")
+
+    assert result["published"] == 25
+    assert result["failed"] == 1
+    assert mqtt.client.published == [f"prefix/{topic}" for topic in data]
+    assert mqtt.client.max_inflight == 10
+    assert mqtt.client.inflight == []
+    assert isinstance(mqtt.client, m_client)
+    m_publish.assert_not_called()
+
+
+def test_publish_multiple_skips_unchanged_topics(mocker):
+    from config.main import APP_CONFIG
+    from database.mqtt import DatabaseMqtt
+    from external_services.mqtt import client
+
+    mocker.patch.object(client.mqtt, "Client", FakeClient)
+    data = {"state": 10, "attributes": "{}", "fail": "value"}
+    mqtt = client.Mqtt()
+    mqtt.publish_multiple(data, "digest")
+    assert mqtt.client.published == ["digest/state", "digest/attributes", "digest/fail"]
+
+    # The digests are persisted, another connection skips the unchanged topics
+    mqtt = client.Mqtt()
+    result = mqtt.publish_multiple({**data, "state": 11}, "digest")
+    assert mqtt.client.published == ["digest/state", "digest/fail"]
+    assert (result["published"], result["skipped"], result["failed"]) == (1, 1, 1)
+
+    # Everything is published again once the digests are older than full_refresh
+    mqtt.client.published.clear()
+    mocker.patch.object(APP_CONFIG.mqtt, "_full_refresh", 0)
+    mqtt.publish_multiple(data, "digest")
+    assert mqtt.client.published == ["digest/state", "digest/attributes", "digest/fail"]
+    DatabaseMqtt().delete()
+
+
+def test_publish_multiple_counts_unsent_messages(mocker):
+    from paho.mqtt.client import MQTT_ERR_NO_CONN, MQTTMessageInfo
+
+    from database.mqtt import DatabaseMqtt
+    from external_services.mqtt import client
+
+    def publish(self, topic, payload, qos, retain):
+        message = MQTTMessageInfo(len(self.published))
+        message.rc = MQTT_ERR_NO_CONN
+        self.published.append(topic)
+        return message
+
+    mocker.patch.object(client.mqtt, "Client", FakeClient)
+    mocker.patch.object(FakeClient, "publish", publish)
+    mqtt = client.Mqtt()
+    result = mqtt.publish_multiple({"state": 10, "attributes": "{}"}, "no_conn")
+
+    assert (result["published"], result["failed"]) == (0, 2)
+    assert "no_conn/state" not in DatabaseMqtt().get()
@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+OFFPEAK_HOURS = ("22H00-6H00", "12h30-14h00;23H00-7H30", "", None, "None", "2h00-7h00;14H00-16H00", "0h00-0h00")
+
+
+def legacy_measure_type(date):
+    from utils import is_between
+
+    measure_type = "HP"
+    day_offpeak_hours = OFFPEAK_HOURS[date.weekday()]
+    if day_offpeak_hours is not None:
+        for offpeak_hour in day_offpeak_hours.split(";"):
+            if offpeak_hour not in ("None", ""):
+                offpeak_begin, offpeak_stop = (
+                    datetime.strptime(hour.replace("h", ":").replace("H", ":"), "%H:%M").strftime("%H:%M")
+                    for hour in offpeak_hour.split("-")
+                )
+                if is_between(date.strftime("%H:%M"), (offpeak_begin, offpeak_stop)):
+                    measure_type = "HC"
+    return measure_type
+
+
+def test_offpeak_calendar_matches_legacy_classification():
+    from models.offpeak import get_offpeak_calendar
+
+    calendar = get_offpeak_calendar(OFFPEAK_HOURS)
+    monday = datetime(2024, 1, 1)
+    dates = [monday + timedelta(minutes=minute) for minute in range(0, 7 * 1440, 10)]
+    expected = [legacy_measure_type(date) for date in dates]
+
+    assert calendar.classify(dates) == expected
+    assert [calendar.measure_type(date) for date in dates] == expected
+    assert calendar.ranges[0] == [(1320, 360)]
+    assert calendar.ranges[2] == []
+
+
+@pytest.mark.parametrize("offpeak_hours", [("22H00-6H00",) * 7, (None,) * 7])
+def test_offpeak_calendar_is_compiled_once(offpeak_hours):
+    from models.offpeak import get_offpeak_calendar
+
+    assert get_offpeak_calendar(offpeak_hours) is get_offpeak_calendar(tuple(offpeak_hours))
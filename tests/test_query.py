@@ -0,0 +1,48 @@
+import pytest
+
+from const import URL
+
+
+@pytest.fixture
+def sleep(mocker):
+    from config.main import APP_CONFIG
+
+    mocker.patch.object(APP_CONFIG.gateway, "_rate_limit", 0)
+    yield mocker.patch("models.query.time.sleep")
+
+
+def test_get_retries_temporary_errors(requests_mock, sleep):
+    from models.query import Query
+
+    requests_mock.get(f"{URL}/ping", [{"status_code": 503}, {"status_code": 504}, {"status_code": 200, "text": "ok"}])
+    response = Query(endpoint=f"{URL}/ping").get()
+    assert response.status_code == 200
+    assert requests_mock.call_count == 3
+    assert sleep.call_count == 2
+    assert requests_mock.request_history[0].timeout == (10, 10)
+
+
+def test_post_and_gateway_errors_are_not_retried(requests_mock, sleep):
+    from models.query import Query
+
+    requests_mock.post(f"{URL}/cache/pdl1", status_code=503)
+    requests_mock.get(f"{URL}/contracts/pdl1", status_code=500)
+    assert Query(endpoint=f"{URL}/cache/pdl1").post().status_code == 503
+    assert Query(endpoint=f"{URL}/contracts/pdl1").get().status_code == 500
+    assert requests_mock.call_count == 2
+    sleep.assert_not_called()
+
+
+def test_get_gives_up_after_max_retry(requests_mock, sleep):
+    import requests
+
+    from const import GATEWAY_MAX_RETRY
+    from models.query import Query, get_session
+
+    endpoint = f"{URL}/consumption_load_curve/pdl1/start/2024-01-01/end/2024-01-08/"
+    requests_mock.get(endpoint, exc=requests.exceptions.ConnectTimeout)
+    assert Query(endpoint=endpoint).get() == {}
+    assert requests_mock.call_count == GATEWAY_MAX_RETRY + 1
+    assert requests_mock.request_history[0].timeout == (10, 120)
+    # All the queries share the same session
+    assert get_session() is get_session()
@@ -0,0 +1,80 @@
+from datetime import datetime
+
+import pytest
+
+USAGE_POINT_ID = "pdl_plan"
+
+
+@pytest.fixture
+def statements():
+    from sqlalchemy import event
+
+    from database import DB
+
+    captured = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):  # noqa: PLR0913
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    event.listen(DB.engine, "before_cursor_execute", before_cursor_execute)
+    yield captured
+    event.remove(DB.engine, "before_cursor_execute", before_cursor_execute)
+
+
+def explain(statement, parameters):
+    from database import DB
+
+    with DB.engine.connect() as connection:
+        if DB.engine.dialect.name == "postgresql":
+            connection.exec_driver_sql("SET enable_seqscan = off")
+            rows = connection.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+        else:
+            rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return "\n".join(str(row[-1]) for row in rows)
+
+
+def queries(table):
+    from const import TIMEZONE
+    from database.daily import DatabaseDaily
+    from database.detail import DatabaseDetail
+    from database.max_power import DatabaseMaxPower
+
+    begin = TIMEZONE.localize(datetime(2023, 1, 1))
+    end = TIMEZONE.localize(datetime(2023, 1, 31))
+    direction, kind = table.split("_", 1)
+    if kind == "detail":
+        database = DatabaseDetail(USAGE_POINT_ID, direction)
+        return [lambda: database.get_range(begin, end), database.get_last_date, database.get_first_date]
+    if kind == "daily":
+        database = DatabaseDaily(USAGE_POINT_ID, direction)
+        return [lambda: database.get_range(begin, end), database.get_last_date, database.get_first_date]
+    database = DatabaseMaxPower(USAGE_POINT_ID)
+    return [lambda: database.get_range(begin, end), database.get_last_date]
+
+
+@pytest.mark.parametrize(
+    "table",
+    [
+        "consumption_detail",
+        "production_detail",
+        "consumption_daily",
+        "production_daily",
+        "consumption_daily_max_power",
+    ],
+)
+def test_range_queries_use_usage_point_date_index(statements, table):
+    from database import DB
+
+    for query in queries(table):
+        statements.clear()
+        query()
+        statement, parameters = next(
+            (statement, parameters) for statement, parameters in statements if f"{table}.date" in statement
+        )
+        plan = explain(statement, parameters)
+        assert f"ix_{table}_usage_point_id_date" in plan, plan
+        if DB.engine.dialect.name == "postgresql":
+            assert "Sort" not in plan, plan
+        else:
+            assert "TEMP B-TREE" not in plan, plan
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta, timezone
+
+USAGE_POINT_ID = "pdl_quota"
+
+
+def seed(begin):
+    from database.usage_points import DatabaseUsagePoints
+
+    DatabaseUsagePoints(USAGE_POINT_ID).update(
+        call_number=8,
+        quota_limit=20,
+        quota_reached=False,
+        quota_reset_at=datetime.now(tz=timezone.utc) + timedelta(hours=1),
+    )
+
+
+USAGE_POINT = {"id": USAGE_POINT_ID, "seed": seed}
+
+
+def test_quota_keeps_a_reserve_for_fresh_data(usage_point):
+    from const import QUOTA_FRESH_RESERVE
+    from models.quota import Quota
+
+    quota = Quota(USAGE_POINT_ID)
+    # 12 calls left, the last 10 are kept for the fresh data
+    assert [quota.acquire(fresh=False) for _ in range(3)] == [True, True, False]
+    assert [quota.acquire() for _ in range(QUOTA_FRESH_RESERVE + 1)] == [True] * QUOTA_FRESH_RESERVE + [False]
+
+    quota.load()
+    quota.exhaust()
+    assert quota.acquire() is False
+    # Refilled once the reset date is passed
+    quota.reset_at = datetime.now(tz=timezone.utc) - timedelta(seconds=1)
+    assert quota.acquire(fresh=False) is True
+    assert quota.tokens == 19
+
+
+def test_quota_unknown(usage_point):
+    from database.usage_points import DatabaseUsagePoints
+    from models.quota import Quota
+
+    DatabaseUsagePoints(USAGE_POINT_ID).update(quota_limit=0)
+    quota = Quota(USAGE_POINT_ID)
+    assert all(quota.acquire(fresh=False) for _ in range(50))
+
+
+def test_detail_backfill_is_deferred(usage_point, mocker):
+    from config.main import APP_CONFIG
+    from const import TIMEZONE
+    from external_services.myelectricaldata.detail import Detail
+    from models.quota import GATEWAY_QUOTAS
+
+    today = TIMEZONE.localize(datetime.combine(datetime.now(tz=TIMEZONE), datetime.min.time()))
+    detail = Detail(headers="any", usage_point_id=USAGE_POINT_ID)
+    detail.max_days_date = today - timedelta(days=70)
+    mocker.patch.object(APP_CONFIG.gateway, "_workers", 1)
+    mocker.patch.dict(GATEWAY_QUOTAS.quotas, clear=True)
+    import_range = mocker.patch.object(detail, "import_range", return_value=[])
+
+    # 10 windows, 12 calls left: the fresh window, then the backfill down to the reserve
+    assert len(detail.plan()) == 10
+    detail.get()
+    assert [call.args[1].date() for call in import_range.call_args_list] == [
+        today.date(),
+        today.date() - timedelta(days=7),
+    ]
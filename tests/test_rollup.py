@@ -0,0 +1,80 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+USAGE_POINT_ID = "pdl_rollup"
+OFFPEAK_HOURS = {f"offpeak_hours_{weekday}": "22H00-6H00" for weekday in range(7)}
+
+
+def seed(begin):
+    from database.daily import DatabaseDaily
+    from database.detail import DatabaseDetail
+
+    DatabaseDaily(USAGE_POINT_ID).insert_bulk(
+        [{"date": begin + timedelta(days=day), "value": 1000 * (day + 1)} for day in range(4)]
+    )
+    DatabaseDetail(USAGE_POINT_ID).insert_bulk(
+        [{"date": begin + timedelta(minutes=30 * slot), "value": slot, "interval": 30} for slot in range(48 * 4)]
+    )
+
+
+# The year begins on a Monday
+USAGE_POINT = {"id": USAGE_POINT_ID, "settings": OFFPEAK_HOURS, "begin": datetime(2019, 12, 30), "seed": seed}
+
+
+def test_rollup_matches_stat(usage_point, mocker):
+    from database.daily import DatabaseDaily
+    from models.rollup import Rollup
+    from models.stat import Stat
+
+    rollup = Rollup(USAGE_POINT_ID)
+    assert rollup.refresh() == 2
+    sums = rollup.get()
+    stat = Stat(USAGE_POINT_ID, "consumption")
+    for period, begin, end in [
+        ("day", date(2019, 12, 31), date(2019, 12, 31)),
+        ("week", date(2019, 12, 30), date(2020, 1, 5)),
+        ("month", date(2019, 12, 1), date(2019, 12, 31)),
+        ("year", date(2020, 1, 1), date(2020, 12, 31)),
+    ]:
+        window = (datetime.combine(begin, datetime.min.time()), datetime.combine(end, datetime.max.time()))
+        assert sums[(period, begin, "BASE")] == stat.daily_sum(*window)
+        for measure_type in ("HP", "HC"):
+            assert sums[(period, begin, measure_type)] == pytest.approx(stat.detail_sum(*window, measure_type))
+    assert sums[("week", date(2019, 12, 30), "BASE")] == 10000
+
+    # Only the changed month is computed again
+    assert rollup.refresh() == 0
+    refresh_days = mocker.spy(rollup, "refresh_days")
+    DatabaseDaily(USAGE_POINT_ID).insert(usage_point + timedelta(days=4), 5000)
+    assert rollup.refresh() == 1
+    assert [call.args[:2] for call in refresh_days.call_args_list] == [(2020, 1)]
+    sums = rollup.get()
+    assert sums[("week", date(2019, 12, 30), "BASE")] == 15000
+    assert sums[("year", date(2020, 1, 1), "BASE")] == 12000
+    assert sums[("year", date(2019, 1, 1), "BASE")] == 3000
+
+
+def test_mqtt_annual_export_reads_rollup(usage_point, mocker):
+    from external_services.mqtt.main import ExportMqtt
+    from models.rollup import Rollup
+
+    Rollup(USAGE_POINT_ID).refresh()
+    mocker.patch("external_services.mqtt.main.Mqtt")
+    mocker.patch.object(ExportMqtt, "bootstrap")
+    mocker.patch("config.main.APP_CONFIG.myelectricaldata.usage_point_config", {USAGE_POINT_ID: mocker.Mock()})
+    get_rollups = mocker.spy(Rollup, "get")
+
+    export = ExportMqtt(USAGE_POINT_ID)
+    export.daily_annual(0.5)
+    export.detail_annual(0.5, 0.25)
+
+    get_rollups.assert_called_once()
+    published = {}
+    for call in export.mqtt_client.publish_multiple.call_args_list:
+        published.update(call.args[0])
+    assert published[f"{USAGE_POINT_ID}/consumption/annual/2019/month/12/base/Wh"] == 3000
+    assert published[f"{USAGE_POINT_ID}/consumption/annual/2020/thisYear/base/euro"] == 3.5
+    assert published[f"{USAGE_POINT_ID}/consumption/annual/2020/month/1/hc/Wh"] == pytest.approx(
+        sum(slot / 2 for slot in range(96, 192) if slot % 48 < 12 or slot % 48 >= 44)
+    )
@@ -0,0 +1,151 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+USAGE_POINT_ID = "pdl_stat"
+OFFPEAK_HOURS = {
+    "offpeak_hours_0": "22H00-6H00",
+    "offpeak_hours_1": "12h30-14h00;23H00-7H30",
+    "offpeak_hours_2": "",
+}
+
+
+def seed(begin):
+    from database.daily import DatabaseDaily
+    from database.detail import DatabaseDetail
+
+    detail = DatabaseDetail(USAGE_POINT_ID, "consumption")
+    daily = DatabaseDaily(USAGE_POINT_ID, "consumption")
+    for day in range(3):
+        day_date = begin + timedelta(days=day)
+        daily.insert(day_date, 1000 * (day + 1))
+        for slot in range(48):
+            detail.insert(day_date + timedelta(minutes=30 * slot), slot + day, 30)
+
+
+USAGE_POINT = {"id": USAGE_POINT_ID, "settings": OFFPEAK_HOURS, "seed": seed}
+
+
+@pytest.mark.parametrize("measure_type", [None, "HP", "HC"])
+def test_stat_detail_sum_matches_rows(usage_point, measure_type):
+    from database.detail import DatabaseDetail
+    from models.stat import Stat
+
+    stat = Stat(USAGE_POINT_ID, "consumption")
+    begin = datetime(2020, 3, 1)
+    end = datetime(2020, 3, 31, 23, 59, 59)
+    expected = 0
+    for row in DatabaseDetail(USAGE_POINT_ID, "consumption").get_range(begin, end):
+        if measure_type is None or stat.get_mesure_type(row.date) == measure_type:
+            expected += row.value / (60 / row.interval)
+
+    assert stat.detail_sum(begin, end, measure_type) == expected
+    if measure_type is not None:
+        assert stat.get_month(2020, 3, measure_type)["value"] == expected
+
+
+def test_stat_daily_sum(usage_point):
+    from models.stat import Stat
+
+    stat = Stat(USAGE_POINT_ID, "consumption")
+    assert stat.get_month(2020, 3)["value"] == 6000
+    assert stat.get_year(2020)["value"] == 6000
+    assert stat.daily_sum(datetime(2020, 3, 3), datetime(2020, 3, 3, 23, 59, 59)) == 2000
+    assert stat.daily_sum(datetime(2020, 3, 3, 12), datetime(2020, 3, 4, 23, 59, 59)) == 3000
+
+
+def test_stat_windows_are_shared_until_written(usage_point, mocker):
+    from database.daily import DatabaseDaily
+    from database.detail import DatabaseDetail
+    from models.stat import Stat
+
+    daily_sum_by_day = mocker.spy(DatabaseDaily, "get_sum_by_day")
+    detail_sum_by_day = mocker.spy(DatabaseDetail, "get_sum_by_day")
+    for _ in range(2):
+        stat = Stat(USAGE_POINT_ID, "consumption")
+        assert stat.get_month(2020, 3)["value"] == 6000
+        assert stat.get_month(2020, 3, "HC")["value"] == stat.detail_sum(
+            usage_point, usage_point + timedelta(days=3), "HC"
+        )
+    assert daily_sum_by_day.call_count == 1
+    assert detail_sum_by_day.call_count == 1
+
+    DatabaseDaily(USAGE_POINT_ID, "consumption").insert(usage_point + timedelta(days=3), 500)
+    assert Stat(USAGE_POINT_ID, "consumption").get_month(2020, 3)["value"] == 6500
+    assert daily_sum_by_day.call_count == 2
+    assert detail_sum_by_day.call_count == 1
+
+
+def test_stat_windows_are_invalidated_by_reset(usage_point):
+    from database.daily import DatabaseDaily
+    from database.detail import DatabaseDetail
+    from models.stat import Stat
+
+    day = (datetime(2020, 3, 3), datetime(2020, 3, 3, 23, 59, 59))
+    stat = Stat(USAGE_POINT_ID, "consumption")
+    assert stat.daily_sum(*day) == 2000
+    detail_sum = stat.detail_sum(*day)
+    assert detail_sum > 0
+
+    DatabaseDaily(USAGE_POINT_ID, "consumption").reset(usage_point + timedelta(days=1))
+    assert Stat(USAGE_POINT_ID, "consumption").daily_sum(*day) == 0
+    DatabaseDetail(USAGE_POINT_ID, "consumption").reset_range(
+        usage_point + timedelta(days=1), usage_point + timedelta(days=2, seconds=-1)
+    )
+    assert Stat(USAGE_POINT_ID, "consumption").detail_sum(*day) == 0
+
+
+def test_stat_get_daily(usage_point):
+    from models.stat import Stat
+
+    stat = Stat(USAGE_POINT_ID, "consumption")
+    # Monday: off-peak from 00:00 to 06:00 and from 22:00 to midnight, slots 0-11 and 44-47
+    hc = sum(slot / 2 for slot in [*range(12), *range(44, 48)])
+    hp = sum(slot / 2 for slot in range(48)) - hc
+    assert stat.get_daily(usage_point.date(), "hc") == hc
+    assert stat.get_daily(usage_point.date(), "hp") == hp
+
+
+def test_stat_generate_price_is_incremental(usage_point, mocker):
+    import json
+
+    from database.detail import DatabaseDetail
+    from models.stat import Stat
+
+    stat = Stat(USAGE_POINT_ID, "consumption")
+    price = json.loads(stat.generate_price())
+    wh = sum(slot + day for day in range(3) for slot in range(48)) / 2
+    assert price["2020"]["BASE"]["Wh"] == wh
+    assert price["2020"]["month"]["03"]["HC"]["Wh"] == stat.detail_sum(
+        usage_point, usage_point + timedelta(days=3), "HC"
+    )
+
+    # Nothing changed: no month is read again
+    get_range = mocker.spy(DatabaseDetail, "get_range")
+    assert json.loads(stat.generate_price()) == price
+    assert get_range.call_count == 0
+
+    # Appended records are folded on top of the saved month
+    DatabaseDetail(USAGE_POINT_ID, "consumption").insert(usage_point + timedelta(days=3), 100, 30)
+    price = json.loads(stat.generate_price())
+    assert get_range.call_count == 1
+    assert price["2020"]["BASE"]["Wh"] == wh + 50
+    stat.delete()
+    assert json.loads(Stat(USAGE_POINT_ID, "consumption").generate_price()) == price
+
+
+def test_tempo_calendar(mocker):
+    from datetime import date
+
+    from models.tempo_calendar import TempoCalendar
+
+    tempo = mocker.Mock(date=datetime(2020, 3, 2), color="RED")
+    m_db_get_tempo = mocker.patch("database.tempo.DatabaseTempo.get", return_value=[tempo])
+
+    calendar = TempoCalendar()
+    assert calendar.get_color(datetime(2020, 3, 2, 12)) == "RED"
+    assert calendar.get_colors([date(2020, 3, 2), datetime(2020, 3, 3)]) == ["RED", None]
+    calendar.update({datetime(2020, 3, 3): "BLUE"})
+    assert calendar.get_color(date(2020, 3, 3)) == "BLUE"
+    assert list(calendar.get_all()) == [date(2020, 3, 2), date(2020, 3, 3)]
+    assert m_db_get_tempo.call_count == 1